@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from contextlib import nullcontext
+from typing import Any, Coroutine, TypeVar
+
+import httpx
+
+from client.concurrency import AimdConcurrencyController
+
+T = TypeVar("T")
+
+
+class AsyncRpcEngine:
+    """
+    Sends JSON-RPC requests to the node from an asyncio event loop running in a dedicated thread
+    - Url: url of the node
+    - Auth: username and password of the node
+    - Max in flight: maximum number of requests sent to the node at the same time
+    - Timeout: timeout of a single request in seconds
+    - Transport: transport used instead of the network one (for tests)
+    - Controller: adaptive controller that keeps the number of requests in flight below max in flight
+
+    The event loop and its connection pool live as long as the engine, so connections to the node are reused
+    between blocks. Synchronous code submits coroutines with run and waits for their result.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        auth: tuple[str, str],
+        max_in_flight: int,
+        timeout: float = 20,
+        transport: httpx.AsyncBaseTransport | None = None,
+        controller: AimdConcurrencyController | None = None,
+    ) -> None:
+        assert max_in_flight > 0, "Number of requests in flight should be positive"
+        self.url = url
+        self.max_in_flight = max_in_flight
+        self.controller = controller
+        self.in_flight = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-rpc", daemon=True)
+        self._thread.start()
+
+        self._slot_released = asyncio.Condition()
+        self._client = httpx.AsyncClient(
+            auth=auth,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+            transport=transport,
+        )
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Runs the coroutine on the event loop of the engine and returns its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _limit(self) -> int:
+        if self.controller is None:
+            return self.max_in_flight
+        return min(self.controller.limit, self.max_in_flight)
+
+    async def post(self, json: Any) -> bytes:
+        """Sends a JSON-RPC request, waits while the limit of requests in flight is reached"""
+        async with self._slot_released:
+            await self._slot_released.wait_for(lambda: self.in_flight < self._limit())
+            self.in_flight += 1
+        try:
+            with self.controller.track() if self.controller is not None else nullcontext():
+                response = await self._client.post(self.url, json=json)
+                response.raise_for_status()
+        finally:
+            async with self._slot_released:
+                self.in_flight -= 1
+                self._slot_released.notify_all()
+        return response.content
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self.run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -1,7 +1,9 @@
-import cattrs
 from requests.sessions import Session
 
+from client import msgspec_decoder
+from client.errors import rpc_content, rpc_result
 from configuration.config import config
+from utxo_indexer.models.converter import structure_block
 from utxo_indexer.models.types import BlockResponse
 
 
@@ -12,10 +14,12 @@ class BtcClient:
 
     @classmethod
     def default(cls):
-        return cls(config.NODE_RPC_URL)
+        return cls(config.NODE_RPC_URL, config.JSON_DECODER)
 
-    def __init__(self, rpc_url) -> None:
+    def __init__(self, rpc_url, json_decoder: str = "json") -> None:
         self.url = rpc_url
+        # json: responses are decoded to dicts and structured with cattrs, msgspec: decoded directly into types
+        self.json_decoder = json_decoder
 
     def _post(self, session: Session, json=None):
         return session.post(self.url, json=json, timeout=20)
@@ -41,7 +45,11 @@ class BtcClient:
 
     def get_block_by_hash(self, session: Session, block_hash: str) -> BlockResponse:
         """Returns a block presented with class types."""
-        block = self._post(
+        return self.structure_block(self.get_raw_block_by_hash(session, block_hash))
+
+    def get_raw_block_by_hash(self, session: Session, block_hash: str) -> dict | bytes:
+        """Returns a block before it is structured into class types, as decoded json or as undecoded response body."""
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -49,15 +57,22 @@ class BtcClient:
                 "method": "getblock",
                 "params": [block_hash, 3],
             },
-        ).json(parse_float=str)["result"]
+        )
+        if self.json_decoder == "msgspec":
+            return rpc_content(response)
+        return rpc_result(response)
 
+    def structure_block(self, block: dict | bytes) -> BlockResponse:
+        """Structures a block returned by get_raw_block_by_hash into class types."""
+        if isinstance(block, bytes):
+            return msgspec_decoder.decode_block(block)
         # Handle address and reqSigs
         for tx in block["tx"]:
             tx = self._check_address_reqSigs(tx)
-        return cattrs.structure(block, BlockResponse)
+        return structure_block(block)
 
     def get_block_hash_from_height(self, session: Session, block_height: int) -> str:
-        hash = self._post(
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -65,11 +80,12 @@ class BtcClient:
                 "method": "getblockhash",
                 "params": [block_height],
             },
-        ).json(parse_float=str)["result"]
+        )
+        hash = rpc_result(response)
         return hash
 
     def get_block_height(self, session: Session) -> int:
-        height = self._post(
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -77,11 +93,12 @@ class BtcClient:
                 "method": "getblockcount",
                 "params": [],
             },
-        ).json(parse_float=str)["result"]
+        )
+        height = rpc_result(response)
         return height
 
     def get_network_info(self, session: Session) -> str:
-        info = self._post(
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -89,7 +106,8 @@ class BtcClient:
                 "method": "getnetworkinfo",
                 "params": [],
             },
-        ).json(parse_float=str)["result"]
+        )
+        info = rpc_result(response)
         return (
             f"version: {info['version']}, subversion: {info['subversion']}, protocolversion: {info['protocolversion']}"
         )
@@ -0,0 +1,97 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+import requests
+
+# Weight of the latest request in the moving average of request latency
+LATENCY_SMOOTHING = 0.1
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """Timeouts and 5xx responses show that the node can not keep up with the requests"""
+    if isinstance(error, (requests.Timeout, httpx.TimeoutException)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return False
+
+
+class AimdConcurrencyController:
+    """
+    Additive increase, multiplicative decrease controller of the number of requests sent to the node at the same time
+    - Initial: starting number of requests in flight
+    - Maximum: upper bound of the number of requests in flight, lower bound is 1
+    - Latency tolerance: requests slower than the average latency times this factor are not considered stable
+    - Backoff factor: the limit is multiplied by this factor on timeouts and 5xx responses
+
+    The limit is increased by one after a full round (as many successful requests as the limit) with stable latency.
+    A round with a slow request is started again without an increase, so the limit stops growing once the node
+    starts queueing requests. Only one backoff is made for requests that were in flight at the same time.
+    """
+
+    def __init__(self, initial: int, maximum: int, latency_tolerance: float = 1.5, backoff_factor: float = 0.5) -> None:
+        assert maximum > 0, "Maximum number of requests in flight should be positive"
+        assert 0 < backoff_factor < 1, "Backoff factor should be between 0 and 1"
+        self.maximum = maximum
+        self.limit = min(max(initial, 1), maximum)
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+
+        self.average_latency: float | None = None
+        self.increases = 0
+        self.backoffs = 0
+
+        self._stable_in_round = 0
+        self._last_backoff = 0.0
+        self._lock = threading.Lock()
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            if self.average_latency is None:
+                self.average_latency = latency
+            stable = latency <= self.average_latency * self.latency_tolerance
+            self.average_latency += LATENCY_SMOOTHING * (latency - self.average_latency)
+
+            if not stable:
+                self._stable_in_round = 0
+                return
+            self._stable_in_round += 1
+            if self._stable_in_round >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.increases += 1
+                self._stable_in_round = 0
+
+    def on_overload(self, started_at: float) -> None:
+        with self._lock:
+            # Requests sent before the last backoff already count in it
+            if started_at < self._last_backoff:
+                return
+            self.limit = max(1, int(self.limit * self.backoff_factor))
+            self.backoffs += 1
+            self._stable_in_round = 0
+            self._last_backoff = time.monotonic()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Reports latency or overload of the request sent in the block to the controller"""
+        started_at = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_overload_error(e):
+                self.on_overload(started_at)
+            raise
+        self.on_success(time.monotonic() - started_at)
+
+    def stats(self) -> dict[str, float | int | None]:
+        return {
+            "limit": self.limit,
+            "average_latency": self.average_latency,
+            "increases": self.increases,
+            "backoffs": self.backoffs,
+        }
@@ -1,16 +1,14 @@
-import cattrs
+import json
+
 from requests.sessions import Session
 
+from client import msgspec_decoder
+from client.async_rpc import AsyncRpcEngine
+from client.errors import RpcError, rpc_batch_results, rpc_content, rpc_result
+from client.raw_block import DOGE_ADDRESS_VERSIONS, AddressVersions, RawBlockError, decode_block
 from configuration.config import config
-from utxo_indexer.models.types import (
-    BlockResponse,
-    CoinbaseVinResponse,
-    ScriptPubKeyResponse,
-    ScriptSigResponse,
-    TransactionResponse,
-    VinResponse,
-    VoutResponse,
-)
+from utxo_indexer.models.converter import structure_block, structure_transaction
+from utxo_indexer.models.types import BlockResponse, TransactionResponse
 
 
 class DogeClient:
@@ -20,10 +18,15 @@ class DogeClient:
 
     @classmethod
     def default(cls):
-        return cls(config.NODE_RPC_URL)
+        return cls(config.NODE_RPC_URL, config.BLOCK_FORMAT, config.JSON_DECODER)
 
-    def __init__(self, rpc_url) -> None:
+    def __init__(self, rpc_url, block_format: str = "json", json_decoder: str = "json") -> None:
         self.url = rpc_url
+        # json: responses are decoded to dicts and structured with cattrs, msgspec: decoded directly into types
+        self.json_decoder = json_decoder
+        # json: blocks are rendered by the node, raw: serialized blocks are decoded locally
+        self.block_format = block_format
+        self.address_versions: AddressVersions | None = None
 
     def _post(self, session: Session, json=None):
         return session.post(self.url, json=json, timeout=20)
@@ -44,7 +47,7 @@ class DogeClient:
 
     def get_transaction(self, session: Session, txid: str) -> TransactionResponse:
         """Returns a transaction presented with class types."""
-        tx = self._post(
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -52,56 +55,86 @@ class DogeClient:
                 "method": "getrawtransaction",
                 "params": [txid, True],
             },
-        ).json(parse_float=str)["result"]
-
+        )
+        if self.json_decoder == "msgspec":
+            return msgspec_decoder.decode_transaction(rpc_content(response))
+        return self._structure_transaction(rpc_result(response))
+
+    def get_transactions(self, session: Session, txids: list[str]) -> dict[str, TransactionResponse]:
+        """Returns transactions presented with class types, fetched with a single JSON-RPC batch request."""
+        if len(txids) == 0:
+            return {}
+
+        response = self._post(session, self._transactions_request(txids))
+        response.raise_for_status()
+        if self.json_decoder == "msgspec":
+            responses = msgspec_decoder.decode_transactions(response.content)
+        else:
+            responses = self._structure_transaction_responses(response.json(parse_float=str))
+        return self._match_transaction_responses(txids, responses)
+
+    async def get_transactions_async(self, engine: AsyncRpcEngine, txids: list[str]) -> dict[str, TransactionResponse]:
+        """Same as get_transactions, the batch request is sent by the asyncio RPC engine."""
+        if len(txids) == 0:
+            return {}
+
+        content = await engine.post(self._transactions_request(txids))
+        if self.json_decoder == "msgspec":
+            responses = msgspec_decoder.decode_transactions(content)
+        else:
+            responses = self._structure_transaction_responses(json.loads(content, parse_float=str))
+        return self._match_transaction_responses(txids, responses)
+
+    def _transactions_request(self, txids: list[str]) -> list[dict]:
+        return [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "getrawtransaction",
+                "params": [txid, True],
+            }
+            for i, txid in enumerate(txids)
+        ]
+
+    def _structure_transaction_responses(self, responses: list[dict]) -> list[tuple]:
+        return [
+            (
+                r["id"],
+                self._structure_transaction(r["result"]) if r.get("result") is not None else None,
+                r.get("error"),
+            )
+            for r in responses
+        ]
+
+    def _match_transaction_responses(self, txids: list[str], responses: list[tuple]) -> dict[str, TransactionResponse]:
+        # Responses in batch can come in any order, they are matched to requests by id
+        transactions = {}
+        for request_id, transaction, error in responses:
+            txid = txids[request_id]
+            if error is not None:
+                raise RpcError.from_response_error(error)
+            if transaction is None:
+                raise RpcError(None, f"Batch response has no result for transaction {txid}")
+            transactions[txid] = transaction
+
+        if len(transactions) != len(set(txids)):
+            raise Exception("Batch response is missing some of the requested transactions")
+        return transactions
+
+    def _structure_transaction(self, tx) -> TransactionResponse:
         # Handle address, reqSigs and prevout
         tx = self._check_address_reqSigs_prevout(tx)
-
-        vout_list = []
-        for _vout in tx["vout"]:
-            _scriptPubKey = _vout["scriptPubKey"]
-            script_pub_key = ScriptPubKeyResponse(
-                reqSigs=_scriptPubKey["reqSigs"],
-                address=_scriptPubKey["address"],
-                type=_scriptPubKey["type"],
-                asm=_scriptPubKey["asm"],
-                hex=_scriptPubKey["hex"],
-            )
-            vout = VoutResponse(
-                n=_vout["n"],
-                value=_vout["value"],
-                scriptPubKey=script_pub_key,
-            )
-            vout_list.append(vout)
-
-        vin_list = []
-        for _vin in tx["vin"]:
-            if "coinbase" in _vin:
-                coinbase = CoinbaseVinResponse(
-                    coinbase=_vin["coinbase"],
-                    sequence=_vin["sequence"],
-                )
-                vin_list.append(coinbase)
-            else:
-                _scriptSig = _vin["scriptSig"]
-                scriptsig = ScriptSigResponse(
-                    asm=_scriptSig["asm"],
-                    hex=_scriptSig["hex"],
-                )
-                vin = VinResponse(
-                    txid=_vin["txid"],
-                    sequence=_vin["sequence"],
-                    vout=_vin["vout"],
-                    prevout=_vin["prevout"],
-                    scriptSig=scriptsig,
-                )
-                vin_list.append(vin)
-
-        return TransactionResponse(txid=tx["txid"], vout=vout_list, vin=vin_list)
+        return structure_transaction(tx)
 
     def get_block_by_hash(self, session: Session, block_hash: str) -> BlockResponse:
         """Returns a block presented with class types."""
-        block = self._post(
+        return self.structure_block(self.get_raw_block_by_hash(session, block_hash))
+
+    def get_raw_block_by_hash(self, session: Session, block_hash: str) -> dict | bytes:
+        """Returns a block before it is structured into class types, as decoded json or as undecoded response body."""
+        if self.block_format == "raw":
+            return self._get_serialized_block_by_hash(session, block_hash)
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -109,15 +142,75 @@ class DogeClient:
                 "method": "getblock",
                 "params": [block_hash, 2],
             },
-        ).json(parse_float=str)["result"]
+        )
+        if self.json_decoder == "msgspec":
+            return rpc_content(response)
+        return rpc_result(response)
+
+    def _get_serialized_block_by_hash(self, session: Session, block_hash: str) -> dict:
+        """
+        Returns the serialized block with its height and median time, fetched with a single JSON-RPC batch request.
+        """
+        if self.address_versions is None:
+            self.address_versions = self.get_address_versions(session)
+
+        response = self._post(
+            session,
+            [
+                {"jsonrpc": "2.0", "id": 0, "method": "getblock", "params": [block_hash, False]},
+                {"jsonrpc": "2.0", "id": 1, "method": "getblockheader", "params": [block_hash, True]},
+            ],
+        )
+        results = {}
+        for result in rpc_batch_results(response):
+            if result.get("error") is not None:
+                raise RpcError.from_response_error(result["error"])
+            results[result["id"]] = result["result"]
+
+        header = results[1]
+        return {
+            "hash": header["hash"],
+            "height": header["height"],
+            "mediantime": header["mediantime"],
+            "hex": results[0],
+        }
+
+    def get_address_versions(self, session: Session) -> AddressVersions:
+        """Returns base58 address versions of the chain the node is running."""
+        response = self._post(
+            session,
+            {
+                "jsonrpc": "1.0",
+                "id": "rpc",
+                "method": "getblockchaininfo",
+                "params": [],
+            },
+        )
+        info = rpc_result(response)
+        if info["chain"] not in DOGE_ADDRESS_VERSIONS:
+            raise ValueError(f"Unknown chain: {info['chain']}")
+        return DOGE_ADDRESS_VERSIONS[info["chain"]]
+
+    def structure_block(self, block: dict | bytes) -> BlockResponse:
+        """Structures a block returned by get_raw_block_by_hash into class types."""
+        if isinstance(block, bytes):
+            return msgspec_decoder.decode_block(block)
+        if self.block_format == "raw":
+            assert self.address_versions is not None, "Address versions are fetched with the block"
+            res_block = decode_block(
+                bytes.fromhex(block["hex"]), block["height"], block["mediantime"], self.address_versions
+            )
+            if res_block.hash != block["hash"]:
+                raise RawBlockError(f"Decoded block hash {res_block.hash} does not match {block['hash']}")
+            return res_block
 
         # Handle address, reqSigs and prevout
         for tx in block["tx"]:
             tx = self._check_address_reqSigs_prevout(tx)
-        return cattrs.structure(block, BlockResponse)
+        return structure_block(block)
 
     def get_block_hash_from_height(self, session: Session, block_height: int) -> str:
-        hash = self._post(
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -125,11 +218,12 @@ class DogeClient:
                 "method": "getblockhash",
                 "params": [block_height],
             },
-        ).json(parse_float=str)["result"]
+        )
+        hash = rpc_result(response)
         return hash
 
     def get_block_height(self, session: Session) -> int:
-        height = self._post(
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -137,11 +231,12 @@ class DogeClient:
                 "method": "getblockcount",
                 "params": [],
             },
-        ).json(parse_float=str)["result"]
+        )
+        height = rpc_result(response)
         return height
 
     def get_network_info(self, session: Session) -> str:
-        info = self._post(
+        response = self._post(
             session,
             {
                 "jsonrpc": "1.0",
@@ -149,5 +244,6 @@ class DogeClient:
                 "method": "getinfo",
                 "params": [],
             },
-        ).json(parse_float=str)["result"]
+        )
+        info = rpc_result(response)
         return f"version: {info['version']}, protocolversion: {info['protocolversion']}"
@@ -0,0 +1,72 @@
+from typing import Any
+
+from requests.models import Response
+
+# Errors of a node that is starting up or syncing, the same request succeeds later
+RPC_CLIENT_NOT_CONNECTED = -9
+RPC_CLIENT_IN_INITIAL_DOWNLOAD = -10
+RPC_IN_WARMUP = -28
+RETRYABLE_RPC_ERROR_CODES = (RPC_CLIENT_NOT_CONNECTED, RPC_CLIENT_IN_INITIAL_DOWNLOAD, RPC_IN_WARMUP)
+
+
+class RpcError(Exception):
+    """Error returned by the node in a JSON-RPC response"""
+
+    def __init__(self, code: int | None, message: str) -> None:
+        super().__init__(f"RPC error {code}: {message}")
+        self.code = code
+        self.message = message
+
+    @classmethod
+    def from_response_error(cls, error: Any) -> "RpcError":
+        if isinstance(error, dict):
+            return cls(error.get("code"), str(error.get("message")))
+        return cls(None, str(error))
+
+    @property
+    def retryable(self) -> bool:
+        return self.code in RETRYABLE_RPC_ERROR_CODES
+
+
+def rpc_result(response: Response) -> Any:
+    """
+    Returns the result of a single JSON-RPC response
+    Node errors are raised as RpcError, 5xx responses without a JSON-RPC body as HTTPError
+    """
+    try:
+        body = response.json(parse_float=str)
+    except ValueError:
+        response.raise_for_status()
+        raise
+    if body.get("error") is not None:
+        raise RpcError.from_response_error(body["error"])
+    return body["result"]
+
+
+def rpc_content(response: Response) -> bytes:
+    """
+    Returns the undecoded body of a JSON-RPC response, decoded later by the caller
+    Responses without a JSON-RPC body (e.g. 503 "Work queue depth exceeded") are raised as HTTPError, same as rpc_result
+    """
+    content = response.content
+    if not content.lstrip().startswith((b"{", b"[")):
+        response.raise_for_status()
+    return content
+
+
+def rpc_batch_results(response: Response) -> list[dict]:
+    """
+    Returns the responses of a JSON-RPC batch request
+    Error of the whole batch is raised as RpcError, responses without a JSON-RPC body as HTTPError
+    """
+    try:
+        body = response.json(parse_float=str)
+    except ValueError:
+        response.raise_for_status()
+        raise
+    if isinstance(body, list):
+        return body
+    if isinstance(body, dict) and body.get("error") is not None:
+        raise RpcError.from_response_error(body["error"])
+    response.raise_for_status()
+    raise RpcError(None, "Batch response is not a list")
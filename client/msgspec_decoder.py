@@ -0,0 +1,162 @@
+from decimal import Decimal
+from typing import Any
+
+import msgspec
+
+from client.errors import RpcError
+from utxo_indexer.models.types import (
+    BlockResponse,
+    CoinbaseVinResponse,
+    PrevoutResponse,
+    ScriptPubKeyResponse,
+    ScriptSigResponse,
+    TransactionResponse,
+    VinResponse,
+    VoutResponse,
+)
+
+# Node responses are decoded by msgspec into structs shaped like the node json, fields that are not used are skipped
+# while decoding. Amounts are decoded as decimals, so they keep the exact representation sent by the node.
+
+
+class _ScriptPubKey(msgspec.Struct):
+    asm: str
+    hex: str
+    type: str
+    address: str | None = None
+    addresses: list[str] | None = None
+    reqSigs: int | None = None
+
+
+class _ScriptSig(msgspec.Struct):
+    asm: str
+    hex: str
+
+
+class _Prevout(msgspec.Struct):
+    value: Decimal
+    scriptPubKey: _ScriptPubKey
+
+
+class _Vin(msgspec.Struct):
+    sequence: int
+    coinbase: str | None = None
+    txid: str | None = None
+    vout: int | None = None
+    scriptSig: _ScriptSig | None = None
+    prevout: _Prevout | None = None
+
+
+class _Vout(msgspec.Struct):
+    n: int
+    value: Decimal
+    scriptPubKey: _ScriptPubKey
+
+
+class _Transaction(msgspec.Struct):
+    txid: str
+    vin: list[_Vin]
+    vout: list[_Vout]
+
+
+class _Block(msgspec.Struct):
+    hash: str
+    height: int
+    mediantime: int
+    previousblockhash: str
+    tx: list[_Transaction]
+
+
+class _BlockRpcResponse(msgspec.Struct):
+    result: _Block | None = None
+    error: Any = None
+
+
+class _TransactionRpcResponse(msgspec.Struct):
+    id: int | str | None = None
+    result: _Transaction | None = None
+    error: Any = None
+
+
+_block_decoder = msgspec.json.Decoder(_BlockRpcResponse)
+_transaction_decoder = msgspec.json.Decoder(_TransactionRpcResponse)
+_transactions_decoder = msgspec.json.Decoder(list[_TransactionRpcResponse])
+
+
+def _amount(value: Decimal) -> str:
+    return format(value, "f")
+
+
+def _script_pub_key(script_pub_key: _ScriptPubKey) -> ScriptPubKeyResponse:
+    # Older nodes list all addresses of the script, the first one is used as the address
+    if script_pub_key.addresses:
+        address = script_pub_key.addresses[0]
+    else:
+        address = script_pub_key.address or ""
+    return ScriptPubKeyResponse(
+        reqSigs=script_pub_key.reqSigs,
+        address=address,
+        type=script_pub_key.type,
+        asm=script_pub_key.asm,
+        hex=script_pub_key.hex,
+    )
+
+
+def _transaction(tx: _Transaction) -> TransactionResponse:
+    vins: list[VinResponse | CoinbaseVinResponse] = []
+    for vin in tx.vin:
+        if vin.coinbase is not None:
+            vins.append(CoinbaseVinResponse(coinbase=vin.coinbase, sequence=vin.sequence))
+            continue
+        if vin.txid is None or vin.vout is None or vin.scriptSig is None:
+            raise ValueError(f"Input of transaction {tx.txid} is missing txid, vout or scriptSig")
+        prevout = None
+        if vin.prevout is not None:
+            prevout = PrevoutResponse(
+                value=_amount(vin.prevout.value), scriptPubKey=_script_pub_key(vin.prevout.scriptPubKey)
+            )
+        vins.append(
+            VinResponse(
+                txid=vin.txid,
+                sequence=vin.sequence,
+                scriptSig=ScriptSigResponse(asm=vin.scriptSig.asm, hex=vin.scriptSig.hex),
+                vout=vin.vout,
+                prevout=prevout,
+            )
+        )
+    vouts = [
+        VoutResponse(n=vout.n, value=_amount(vout.value), scriptPubKey=_script_pub_key(vout.scriptPubKey))
+        for vout in tx.vout
+    ]
+    return TransactionResponse(txid=tx.txid, vout=vouts, vin=vins)
+
+
+def decode_block(content: bytes) -> BlockResponse:
+    """Decodes a getblock response body into a block response"""
+    response = _block_decoder.decode(content)
+    if response.result is None:
+        raise RpcError.from_response_error(response.error)
+    block = response.result
+    return BlockResponse(
+        hash=block.hash,
+        height=block.height,
+        mediantime=block.mediantime,
+        previousblockhash=block.previousblockhash,
+        tx=[_transaction(tx) for tx in block.tx],
+    )
+
+
+def decode_transaction(content: bytes) -> TransactionResponse:
+    """Decodes a getrawtransaction response body into a transaction response"""
+    response = _transaction_decoder.decode(content)
+    if response.result is None:
+        raise RpcError.from_response_error(response.error)
+    return _transaction(response.result)
+
+
+def decode_transactions(content: bytes) -> list[tuple[Any, TransactionResponse | None, Any]]:
+    """Decodes a batch of getrawtransaction responses into (id, transaction response, error) of every response"""
+    return [
+        (response.id, _transaction(response.result) if response.result is not None else None, response.error)
+        for response in _transactions_decoder.decode(content)
+    ]
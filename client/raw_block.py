@@ -0,0 +1,446 @@
+import hashlib
+import struct
+
+from attrs import frozen
+
+from utxo_indexer.models.types import (
+    BlockResponse,
+    CoinbaseVinResponse,
+    ScriptPubKeyResponse,
+    ScriptSigResponse,
+    TransactionResponse,
+    VinResponse,
+    VoutResponse,
+)
+from utxo_indexer.utils import WordToOpcode
+
+# Serialized blocks are decoded into the same types as getblock json responses, scripts and addresses are rendered
+# the same way as the node (version 1.14) renders them.
+
+OP_0 = WordToOpcode.OP_0.value
+OP_PUSHDATA1 = WordToOpcode.OP_PUSHDATA1.value
+OP_PUSHDATA2 = WordToOpcode.OP_PUSHDATA2.value
+OP_PUSHDATA4 = WordToOpcode.OP_PUSHDATA4.value
+OP_1NEGATE = WordToOpcode.OP_1NEGATE.value
+OP_1 = WordToOpcode.OP_1.value
+OP_16 = WordToOpcode.OP_16.value
+OP_RETURN = WordToOpcode.OP_RETURN.value
+OP_DUP = WordToOpcode.OP_DUP.value
+OP_EQUAL = WordToOpcode.OP_EQUAL.value
+OP_EQUALVERIFY = WordToOpcode.OP_EQUALVERIFY.value
+OP_HASH160 = WordToOpcode.OP_HASH160.value
+OP_CHECKSIG = WordToOpcode.OP_CHECKSIG.value
+OP_CHECKMULTISIG = WordToOpcode.OP_CHECKMULTISIG.value
+
+# Names of opcodes known to the node, everything else is rendered as OP_UNKNOWN
+OPCODE_NAMES = {
+    opcode.value: opcode.name
+    for opcode in WordToOpcode
+    if opcode.value > OP_PUSHDATA4 and opcode != WordToOpcode.OP_CHECKSIGADD
+}
+OPCODE_NAMES[OP_1NEGATE] = "-1"
+for _n in range(1, 17):
+    OPCODE_NAMES[OP_1 + _n - 1] = str(_n)
+
+SIGHASH_ANYONECANPAY = 0x80
+SIGHASH_NAMES = {
+    0x01: "ALL",
+    0x01 | SIGHASH_ANYONECANPAY: "ALL|ANYONECANPAY",
+    0x02: "NONE",
+    0x02 | SIGHASH_ANYONECANPAY: "NONE|ANYONECANPAY",
+    0x03: "SINGLE",
+    0x03 | SIGHASH_ANYONECANPAY: "SINGLE|ANYONECANPAY",
+}
+
+# Blocks merge mined with auxiliary proof of work have this bit set in their version
+BLOCK_VERSION_AUXPOW = 1 << 8
+
+COIN = 100_000_000
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+@frozen
+class AddressVersions:
+    pubkey_hash: int
+    script_hash: int
+
+
+# Base58 address version bytes by chain name as returned by getblockchaininfo
+DOGE_ADDRESS_VERSIONS = {
+    "main": AddressVersions(pubkey_hash=0x1E, script_hash=0x16),
+    "test": AddressVersions(pubkey_hash=0x71, script_hash=0xC4),
+    "regtest": AddressVersions(pubkey_hash=0x6F, script_hash=0xC4),
+}
+
+
+class RawBlockError(ValueError):
+    pass
+
+
+def sha256d(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def hash160(data: bytes) -> bytes:
+    return hashlib.new("ripemd160", hashlib.sha256(data).digest()).digest()
+
+
+def base58check(version: int, payload: bytes) -> str:
+    data = bytes([version]) + payload
+    data += sha256d(data)[:4]
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number > 0:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    leading_zeros = len(data) - len(data.lstrip(b"\x00"))
+    return BASE58_ALPHABET[0] * leading_zeros + encoded
+
+
+def format_amount(satoshis: int) -> str:
+    sign = "-" if satoshis < 0 else ""
+    whole, fraction = divmod(abs(satoshis), COIN)
+    return f"{sign}{whole}.{fraction:08d}"
+
+
+class ByteReader:
+    """Reads bitcoin serialization primitives from a buffer"""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def read(self, n: int) -> bytes:
+        if self.pos + n > len(self.data):
+            raise RawBlockError(f"Unexpected end of data at {self.pos}, reading {n} bytes")
+        chunk = self.data[self.pos : self.pos + n].tobytes()
+        self.pos += n
+        return chunk
+
+    def read_uint8(self) -> int:
+        return self.read(1)[0]
+
+    def read_uint32(self) -> int:
+        return struct.unpack("<I", self.read(4))[0]
+
+    def read_int64(self) -> int:
+        return struct.unpack("<q", self.read(8))[0]
+
+    def read_compact_size(self) -> int:
+        size = self.read_uint8()
+        if size == 0xFD:
+            return struct.unpack("<H", self.read(2))[0]
+        if size == 0xFE:
+            return struct.unpack("<I", self.read(4))[0]
+        if size == 0xFF:
+            return struct.unpack("<Q", self.read(8))[0]
+        return size
+
+    def read_var_bytes(self) -> bytes:
+        return self.read(self.read_compact_size())
+
+    def skip_hashes(self) -> None:
+        self.read(32 * self.read_compact_size())
+
+
+# Scripts
+
+
+def _parse_script(script: bytes) -> tuple[list[tuple[int, bytes | None]], bool]:
+    # Operations up to the first malformed push and whether the whole script was parsed
+    ops: list[tuple[int, bytes | None]] = []
+    pos = 0
+    while pos < len(script):
+        opcode = script[pos]
+        pos += 1
+        if opcode > OP_PUSHDATA4:
+            ops.append((opcode, None))
+            continue
+        if opcode < OP_PUSHDATA1:
+            size = opcode
+        else:
+            width = {OP_PUSHDATA1: 1, OP_PUSHDATA2: 2, OP_PUSHDATA4: 4}[opcode]
+            if pos + width > len(script):
+                return ops, False
+            size = int.from_bytes(script[pos : pos + width], "little")
+            pos += width
+        if pos + size > len(script):
+            return ops, False
+        ops.append((opcode, script[pos : pos + size]))
+        pos += size
+    return ops, True
+
+
+def script_ops(script: bytes) -> list[tuple[int, bytes | None]] | None:
+    """Returns (opcode, pushed data) of all script operations or None if the script can not be parsed"""
+    ops, valid = _parse_script(script)
+    return ops if valid else None
+
+
+def _script_num(data: bytes) -> int:
+    if len(data) == 0:
+        return 0
+    value = int.from_bytes(data, "little")
+    sign_bit = 0x80 << (8 * (len(data) - 1))
+    if value & sign_bit:
+        return -(value & ~sign_bit)
+    return value
+
+
+def _is_valid_signature_encoding(sig: bytes) -> bool:
+    # Strict DER encoding with the sighash byte appended (BIP66)
+    if len(sig) < 9 or len(sig) > 73:
+        return False
+    if sig[0] != 0x30 or sig[1] != len(sig) - 3:
+        return False
+    len_r = sig[3]
+    if 5 + len_r >= len(sig):
+        return False
+    len_s = sig[5 + len_r]
+    if len_r + len_s + 7 != len(sig):
+        return False
+    if sig[2] != 0x02 or len_r == 0 or sig[4] & 0x80:
+        return False
+    if len_r > 1 and sig[4] == 0x00 and not sig[5] & 0x80:
+        return False
+    if sig[len_r + 4] != 0x02 or len_s == 0 or sig[len_r + 6] & 0x80:
+        return False
+    if len_s > 1 and sig[len_r + 6] == 0x00 and not sig[len_r + 7] & 0x80:
+        return False
+    return True
+
+
+def script_to_asm(script: bytes, decode_sighash: bool = False) -> str:
+    """Renders the script as asm, signatures get their sighash type decoded if decode_sighash is set"""
+    decode_sighash = decode_sighash and not (len(script) > 0 and script[0] == OP_RETURN)
+    ops, valid = _parse_script(script)
+    words = []
+    for opcode, data in ops:
+        if data is None:
+            words.append(OPCODE_NAMES.get(opcode, "OP_UNKNOWN"))
+        elif len(data) <= 4:
+            words.append(str(_script_num(data)))
+        elif decode_sighash and _is_valid_signature_encoding(data) and data[-1] & ~SIGHASH_ANYONECANPAY in (1, 2, 3):
+            words.append(data[:-1].hex() + f"[{SIGHASH_NAMES[data[-1]]}]")
+        else:
+            words.append(data.hex())
+    if not valid:
+        words.append("[error]")
+    return " ".join(words)
+
+
+def _small_integer(opcode: int) -> int | None:
+    if opcode == OP_0:
+        return 0
+    if OP_1 <= opcode <= OP_16:
+        return opcode - OP_1 + 1
+    return None
+
+
+def _is_valid_pubkey(pubkey: bytes) -> bool:
+    if len(pubkey) == 33:
+        return pubkey[0] in (0x02, 0x03)
+    if len(pubkey) == 65:
+        return pubkey[0] in (0x04, 0x06, 0x07)
+    return False
+
+
+def _is_pubkey_push(data: bytes | None) -> bool:
+    return data is not None and 33 <= len(data) <= 65
+
+
+def solve_script(script: bytes) -> tuple[str, list[bytes]]:
+    """Returns the standard output type of the script and its solutions (hashes, keys, required signatures)"""
+    if len(script) == 23 and script[0] == OP_HASH160 and script[1] == 0x14 and script[22] == OP_EQUAL:
+        return "scripthash", [script[2:22]]
+
+    # Witness program: version opcode followed by a single 2 to 40 bytes push
+    if 4 <= len(script) <= 42 and (script[0] == OP_0 or OP_1 <= script[0] <= OP_16) and script[1] + 2 == len(script):
+        if script[0] == OP_0 and len(script) == 22:
+            return "witness_v0_keyhash", [script[2:]]
+        if script[0] == OP_0 and len(script) == 34:
+            return "witness_v0_scripthash", [script[2:]]
+        return "nonstandard", []
+
+    if len(script) >= 1 and script[0] == OP_RETURN:
+        ops = script_ops(script[1:])
+        if ops is not None and all(opcode <= OP_16 for opcode, _ in ops):
+            return "nulldata", []
+
+    ops = script_ops(script)
+    if ops is None:
+        return "nonstandard", []
+
+    if len(ops) == 2 and _is_pubkey_push(ops[0][1]) and ops[1][0] == OP_CHECKSIG:
+        return "pubkey", [ops[0][1]]  # type: ignore[list-item]
+
+    if (
+        len(ops) == 5
+        and ops[0][0] == OP_DUP
+        and ops[1][0] == OP_HASH160
+        and ops[2][1] is not None
+        and len(ops[2][1]) == 20
+        and ops[3][0] == OP_EQUALVERIFY
+        and ops[4][0] == OP_CHECKSIG
+    ):
+        return "pubkeyhash", [ops[2][1]]
+
+    if len(ops) >= 3 and ops[-1][0] == OP_CHECKMULTISIG:
+        required = _small_integer(ops[0][0])
+        total = _small_integer(ops[-2][0])
+        keys = [data for _, data in ops[1:-2]]
+        if (
+            required is not None
+            and total is not None
+            and all(_is_pubkey_push(key) for key in keys)
+            and 1 <= required <= total == len(keys)
+        ):
+            return "multisig", [bytes([required]), *keys, bytes([total])]  # type: ignore[list-item]
+
+    return "nonstandard", []
+
+
+def script_pub_key_response(script: bytes, address_versions: AddressVersions) -> ScriptPubKeyResponse:
+    """Builds the script pub key response with type, required signatures and the first address of the script"""
+    script_type, solutions = solve_script(script)
+    req_sigs = None
+    addresses = []
+    if script_type == "pubkey":
+        if _is_valid_pubkey(solutions[0]):
+            addresses = [base58check(address_versions.pubkey_hash, hash160(solutions[0]))]
+    elif script_type == "pubkeyhash":
+        addresses = [base58check(address_versions.pubkey_hash, solutions[0])]
+    elif script_type == "scripthash":
+        addresses = [base58check(address_versions.script_hash, solutions[0])]
+    elif script_type == "multisig":
+        addresses = [
+            base58check(address_versions.pubkey_hash, hash160(key)) for key in solutions[1:-1] if _is_valid_pubkey(key)
+        ]
+    if len(addresses) > 0:
+        req_sigs = solutions[0][0] if script_type == "multisig" else 1
+
+    return ScriptPubKeyResponse(
+        reqSigs=req_sigs,
+        address=addresses[0] if len(addresses) > 0 else "",
+        type=script_type,
+        asm=script_to_asm(script),
+        hex=script.hex(),
+    )
+
+
+# Transactions and blocks
+
+
+def _is_null_outpoint(txid: bytes, vout: int) -> bool:
+    return vout == 0xFFFFFFFF and txid == bytes(32)
+
+
+def read_transaction(reader: ByteReader, address_versions: AddressVersions) -> TransactionResponse:
+    start = reader.pos
+    reader.read(4)  # version
+    inputs_count = reader.read_compact_size()
+    has_witness = False
+    if inputs_count == 0:
+        # Extended serialization: empty inputs marker followed by flags
+        flags = reader.read_uint8()
+        if flags != 0:
+            has_witness = True
+            inputs_count = reader.read_compact_size()
+    inputs_start = reader.pos
+
+    raw_inputs = []
+    for _ in range(inputs_count):
+        txid = reader.read(32)
+        vout = reader.read_uint32()
+        script_sig = reader.read_var_bytes()
+        sequence = reader.read_uint32()
+        raw_inputs.append((txid, vout, script_sig, sequence))
+
+    vouts = []
+    for n in range(reader.read_compact_size()):
+        value = reader.read_int64()
+        script = reader.read_var_bytes()
+        vouts.append(
+            VoutResponse(
+                n=n, value=format_amount(value), scriptPubKey=script_pub_key_response(script, address_versions)
+            )
+        )
+    outputs_end = reader.pos
+
+    if has_witness:
+        for _ in range(inputs_count):
+            for _ in range(reader.read_compact_size()):
+                reader.read_var_bytes()
+    lock_time = reader.read(4)
+
+    if has_witness:
+        serialized = reader.data[start : start + 4].tobytes()
+        serialized += _compact_size(inputs_count) + reader.data[inputs_start:outputs_end].tobytes() + lock_time
+    else:
+        serialized = reader.data[start : reader.pos].tobytes()
+    txid = sha256d(serialized)[::-1].hex()
+
+    is_coinbase = len(raw_inputs) == 1 and _is_null_outpoint(raw_inputs[0][0], raw_inputs[0][1])
+    vins: list[VinResponse | CoinbaseVinResponse] = []
+    for prev_txid, vout, script_sig, sequence in raw_inputs:
+        if is_coinbase:
+            vins.append(CoinbaseVinResponse(coinbase=script_sig.hex(), sequence=sequence))
+        else:
+            vins.append(
+                VinResponse(
+                    txid=prev_txid[::-1].hex(),
+                    sequence=sequence,
+                    scriptSig=ScriptSigResponse(
+                        asm=script_to_asm(script_sig, decode_sighash=True), hex=script_sig.hex()
+                    ),
+                    vout=vout,
+                    prevout=None,
+                )
+            )
+    return TransactionResponse(txid=txid, vout=vouts, vin=vins)
+
+
+def _compact_size(n: int) -> bytes:
+    if n < 0xFD:
+        return bytes([n])
+    if n <= 0xFFFF:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xFFFFFFFF:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def _skip_auxpow(reader: ByteReader, address_versions: AddressVersions) -> None:
+    # Coinbase of the parent chain block with its merkle branch, chain merkle branch and the parent block header
+    read_transaction(reader, address_versions)
+    reader.read(32)
+    reader.skip_hashes()
+    reader.read(4)
+    reader.skip_hashes()
+    reader.read(4)
+    reader.read(80)
+
+
+def decode_block(raw_block: bytes, height: int, mediantime: int, address_versions: AddressVersions) -> BlockResponse:
+    """
+    Decodes a serialized block into a block response
+
+    Height and median time are not part of the serialized block, they come from the block header response.
+    """
+    reader = ByteReader(raw_block)
+    header = reader.read(80)
+    version = struct.unpack("<i", header[:4])[0]
+    if version & BLOCK_VERSION_AUXPOW:
+        _skip_auxpow(reader, address_versions)
+
+    transactions = [read_transaction(reader, address_versions) for _ in range(reader.read_compact_size())]
+    if reader.pos != len(raw_block):
+        raise RawBlockError(f"Unexpected {len(raw_block) - reader.pos} bytes after the last transaction")
+
+    return BlockResponse(
+        hash=sha256d(header)[::-1].hex(),
+        height=height,
+        mediantime=mediantime,
+        previousblockhash=header[4:36][::-1].hex(),
+        tx=transactions,
+    )
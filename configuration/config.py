@@ -3,6 +3,10 @@ import os
 from configuration.types import Config
 
 AVAILABLE_SOURCES = ["doge", "btc"]
+AVAILABLE_DB_WRITERS = ["copy", "bulk_create"]
+AVAILABLE_BLOCK_FORMATS = ["json", "raw"]
+AVAILABLE_JSON_DECODERS = ["json", "msgspec"]
+AVAILABLE_RPC_ENGINES = ["threads", "asyncio"]
 
 
 def get_config() -> Config:
@@ -19,10 +23,39 @@ def get_config() -> Config:
     number_of_workers = int(os.environ.get("NUMBER_OF_WORKERS", "10"))
     prune_keep_days = int(os.environ.get("PRUNE_KEEP_DAYS", "0"))
     prune_interval_seconds = int(os.environ.get("PRUNE_INTERVAL_SECONDS", "60"))
+    prune_chunk_blocks = int(os.environ.get("PRUNE_CHUNK_BLOCKS", "1000"))
+    prune_chunk_pause_seconds = float(os.environ.get("PRUNE_CHUNK_PAUSE_SECONDS", "1.0"))
+    prefetch_depth = int(os.environ.get("PREFETCH_DEPTH", "0"))
+    rpc_batch_size = int(os.environ.get("RPC_BATCH_SIZE", "100"))
+    utxo_cache_size_mb = int(os.environ.get("UTXO_CACHE_SIZE_MB", "128"))
+    address_hash_cache_size = int(os.environ.get("ADDRESS_HASH_CACHE_SIZE", "100000"))
+    db_writer = os.environ.get("DB_WRITER", "copy")
+    block_format = os.environ.get("BLOCK_FORMAT", "json")
+    json_decoder = os.environ.get("JSON_DECODER", "json")
+    rpc_engine = os.environ.get("RPC_ENGINE", "threads")
+    rpc_max_in_flight = int(os.environ.get("RPC_MAX_IN_FLIGHT", "100"))
+    rpc_concurrency_max = int(os.environ.get("RPC_CONCURRENCY_MAX", "0"))
+    partition_size_blocks = int(os.environ.get("PARTITION_SIZE_BLOCKS", "10000"))
+    partitions_ahead = int(os.environ.get("PARTITIONS_AHEAD", "2"))
+    catch_up_lag_blocks = int(os.environ.get("CATCH_UP_LAG_BLOCKS", "100"))
+    catch_up_batch_rows = int(os.environ.get("CATCH_UP_BATCH_ROWS", "50000"))
+    catch_up_batch_seconds = float(os.environ.get("CATCH_UP_BATCH_SECONDS", "5.0"))
+    metrics_port = int(os.environ.get("METRICS_PORT", "0"))
 
     # Health checks
     if source_name.lower() not in AVAILABLE_SOURCES:
         raise ValueError(f"Invalid source name. Available sources are {AVAILABLE_SOURCES}")
+    if db_writer not in AVAILABLE_DB_WRITERS:
+        raise ValueError(f"Invalid db writer. Available db writers are {AVAILABLE_DB_WRITERS}")
+    if block_format not in AVAILABLE_BLOCK_FORMATS:
+        raise ValueError(f"Invalid block format. Available block formats are {AVAILABLE_BLOCK_FORMATS}")
+    if json_decoder not in AVAILABLE_JSON_DECODERS:
+        raise ValueError(f"Invalid json decoder. Available json decoders are {AVAILABLE_JSON_DECODERS}")
+    if rpc_engine not in AVAILABLE_RPC_ENGINES:
+        raise ValueError(f"Invalid rpc engine. Available rpc engines are {AVAILABLE_RPC_ENGINES}")
+    # Bitcoin blocks are requested with prevouts, which are not part of serialized blocks
+    if block_format == "raw" and source_name.lower() != "doge":
+        raise ValueError("Raw block format is only supported for doge")
 
     return Config(
         SOURCE_NAME=source_name,
@@ -35,6 +68,24 @@ def get_config() -> Config:
         NUMBER_OF_WORKERS=number_of_workers,
         PRUNE_KEEP_DAYS=prune_keep_days,
         PRUNE_INTERVAL_SECONDS=prune_interval_seconds,
+        PRUNE_CHUNK_BLOCKS=prune_chunk_blocks,
+        PRUNE_CHUNK_PAUSE_SECONDS=prune_chunk_pause_seconds,
+        PREFETCH_DEPTH=prefetch_depth,
+        RPC_BATCH_SIZE=rpc_batch_size,
+        UTXO_CACHE_SIZE_MB=utxo_cache_size_mb,
+        ADDRESS_HASH_CACHE_SIZE=address_hash_cache_size,
+        DB_WRITER=db_writer,
+        BLOCK_FORMAT=block_format,
+        JSON_DECODER=json_decoder,
+        RPC_ENGINE=rpc_engine,
+        RPC_MAX_IN_FLIGHT=rpc_max_in_flight,
+        RPC_CONCURRENCY_MAX=rpc_concurrency_max,
+        PARTITION_SIZE_BLOCKS=partition_size_blocks,
+        PARTITIONS_AHEAD=partitions_ahead,
+        CATCH_UP_LAG_BLOCKS=catch_up_lag_blocks,
+        CATCH_UP_BATCH_ROWS=catch_up_batch_rows,
+        CATCH_UP_BATCH_SECONDS=catch_up_batch_seconds,
+        METRICS_PORT=metrics_port,
     )
 
 
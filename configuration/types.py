@@ -13,3 +13,40 @@ class Config:
     NUMBER_OF_WORKERS: int
     PRUNE_KEEP_DAYS: int
     PRUNE_INTERVAL_SECONDS: int
+    # Number of blocks that can be fetched ahead of the block being written (0 disables pipelining)
+    PREFETCH_DEPTH: int = 0
+    # Number of transactions requested in a single JSON-RPC batch request
+    RPC_BATCH_SIZE: int = 100
+    # Memory cap of the in-memory cache of unspent outputs (0 disables the cache)
+    UTXO_CACHE_SIZE_MB: int = 128
+    # Number of input addresses whose leaf hashes are cached for source addresses roots (0 disables the cache)
+    ADDRESS_HASH_CACHE_SIZE: int = 100000
+    # Method used to write processed blocks to db: copy | bulk_create
+    DB_WRITER: str = "copy"
+    # Format of blocks requested from the node: json | raw (serialized blocks decoded locally, doge only)
+    BLOCK_FORMAT: str = "json"
+    # Decoder of json node responses: json (standard library) | msgspec (decodes directly into response types)
+    JSON_DECODER: str = "json"
+    # Transport of doge prevout requests: threads (NUMBER_OF_WORKERS blocking sessions) | asyncio (single event loop)
+    RPC_ENGINE: str = "threads"
+    # Maximum number of requests sent to the node at the same time by the asyncio engine
+    RPC_MAX_IN_FLIGHT: int = 100
+    # Upper bound of adaptive prevout request concurrency, which starts at NUMBER_OF_WORKERS or RPC_MAX_IN_FLIGHT
+    # and is raised while node latency is stable and lowered on timeouts and 5xx responses (0 disables it)
+    RPC_CONCURRENCY_MAX: int = 0
+    # Number of blocks in a single partition of block and transaction tables
+    PARTITION_SIZE_BLOCKS: int = 10000
+    # Number of partitions created ahead of the indexed tip
+    PARTITIONS_AHEAD: int = 2
+    # Number of blocks pruned in a single db transaction
+    PRUNE_CHUNK_BLOCKS: int = 1000
+    # Pause between two pruned chunks
+    PRUNE_CHUNK_PAUSE_SECONDS: float = 1.0
+    # Blocks further than this behind the tip are committed in batches (0 commits every block separately)
+    CATCH_UP_LAG_BLOCKS: int = 100
+    # Maximum number of rows committed in a single catch-up batch
+    CATCH_UP_BATCH_ROWS: int = 50000
+    # Maximum time blocks are held in a catch-up batch before it is committed
+    CATCH_UP_BATCH_SECONDS: float = 5.0
+    # Port on which indexer and pruner commands serve prometheus metrics (0 disables the endpoint)
+    METRICS_PORT: int = 0
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Q
 
 from utxo_indexer.models import (
     TipSyncState,
@@ -9,6 +10,23 @@ from utxo_indexer.models import (
     UtxoTransaction,
 )
 from utxo_indexer.models.sync_state import PruneSyncState
+from utxo_indexer.utils import is_valid_bytes_32_hex, un_prefix_0x
+
+
+class HashSearchMixin:
+    """Hashes are stored as bytes, so they can only be searched by their full hex value"""
+
+    hash_search_fields: tuple[str, ...] = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)  # type: ignore[misc]
+        term = un_prefix_0x(search_term.strip()).lower()
+        if is_valid_bytes_32_hex(term):
+            hash_query = Q()
+            for field in self.hash_search_fields:
+                hash_query |= Q(**{field: term})
+            queryset |= self.model.objects.filter(hash_query)  # type: ignore[attr-defined]
+        return queryset, may_have_duplicates
 
 
 class TransactionInputInline(admin.TabularInline):
@@ -35,18 +53,20 @@ class TransactionOutputInline(admin.TabularInline):
 
 
 @admin.register(UtxoTransaction)
-class UtxoTransactionAdmin(admin.ModelAdmin):
+class UtxoTransactionAdmin(HashSearchMixin, admin.ModelAdmin):
     list_display = ("transaction_id", "block_number", "timestamp", "payment_reference")
-    search_fields = ("transaction_id", "block_number")
+    search_fields = ("block_number",)
+    hash_search_fields = ("transaction_id", "payment_reference")
     ordering = ("-timestamp",)
 
     inlines = (TransactionInputCoinbaseInline, TransactionInputInline, TransactionOutputInline)
 
 
 @admin.register(UtxoBlock)
-class UtxoBlockAdmin(admin.ModelAdmin):
+class UtxoBlockAdmin(HashSearchMixin, admin.ModelAdmin):
     list_display = ("block_number", "timestamp", "block_hash", "transactions")
-    search_fields = ("block_number", "block_hash")
+    search_fields = ("block_number",)
+    hash_search_fields = ("block_hash",)
     ordering = ("-timestamp",)
 
 
@@ -0,0 +1,22 @@
+"""
+Initializer of backfill worker processes
+
+Workers are started with spawn, which imports the modules of the initializer and of its arguments before it runs.
+Models can only be imported once django is set up, so this module does not import them (directly or through the
+indexer package) and the indexer factory is passed by its import path.
+"""
+
+import multiprocessing.util
+
+import django
+from django.utils.module_loading import import_string
+
+
+def init_worker(indexer_factory_path: str) -> None:
+    # Nothing is shared with the parent, so django has to be set up again
+    django.setup()
+    from utxo_indexer.indexer import backfill
+
+    backfill._indexer = import_string(indexer_factory_path)()
+    # Run when the worker exits after the pool is closed
+    multiprocessing.util.Finalize(None, backfill._indexer.close, exitpriority=10)
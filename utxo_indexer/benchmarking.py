@@ -0,0 +1,207 @@
+"""Helpers shared by benchmark commands"""
+
+import json
+import math
+import resource
+import statistics
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from attrs import frozen
+
+# Saved benchmark runs, relative to the working directory
+DEFAULT_RESULTS_DIR = "benchmark_results"
+# Smallest number of samples on each side for which a rank test is made
+MIN_TEST_SAMPLES = 3
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile (q from 0 to 100) of sorted values"""
+    if len(sorted_values) == 0:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def latency_summary(values: list[float]) -> dict[str, float]:
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if len(values) > 0 else 0.0,
+        "mean": sum(values) / len(values) if len(values) > 0 else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def relative_spread(samples: list[float]) -> float:
+    """Median absolute deviation relative to the median, a noise estimate that ignores outliers"""
+    if len(samples) < 2:
+        return 0.0
+    median = statistics.median(samples)
+    if median == 0:
+        return 0.0
+    return statistics.median(abs(sample - median) for sample in samples) / abs(median)
+
+
+@lru_cache(maxsize=None)
+def _u_distribution(n1: int, n2: int) -> tuple[int, ...]:
+    """Number of orderings of two samples without ties for every value of the Mann-Whitney U statistic"""
+    if n1 == 0 or n2 == 0:
+        return (1,)
+    # U counts pairs where the sample of the first group is larger, the largest value is either from the first
+    # group (it is larger than all n2 values of the second group) or from the second group
+    first = _u_distribution(n1 - 1, n2)
+    second = _u_distribution(n1, n2 - 1)
+    counts = [0] * (n1 * n2 + 1)
+    for u, count in enumerate(first):
+        counts[u + n2] += count
+    for u, count in enumerate(second):
+        counts[u] += count
+    return tuple(counts)
+
+
+def mann_whitney_greater(base: list[float], head: list[float]) -> float | None:
+    """
+    One-sided p-value of the Mann-Whitney U test that head samples tend to be larger than base samples
+    Exact distribution is used for small samples without ties, normal approximation otherwise.
+    Returns None if there are too few samples to test.
+    """
+    n1, n2 = len(head), len(base)
+    if n1 < MIN_TEST_SAMPLES or n2 < MIN_TEST_SAMPLES:
+        return None
+    # U is the rank sum of head samples (with midranks of ties) less its smallest possible value
+    values = sorted([(value, True) for value in head] + [(value, False) for value in base])
+    rank_sum = 0.0
+    ties = 0
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1][0] == values[i][0]:
+            j += 1
+        midrank = (i + j) / 2 + 1
+        rank_sum += midrank * sum(1 for k in range(i, j + 1) if values[k][1])
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = rank_sum - n1 * (n1 + 1) / 2
+
+    if ties == 0 and n1 + n2 <= 40:
+        counts = _u_distribution(n1, n2)
+        return sum(counts[math.ceil(u) :]) / sum(counts)
+
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n1 + n2 + 1) - ties / ((n1 + n2) * (n1 + n2 - 1)))
+    if variance <= 0:
+        return 1.0
+    # Continuity correction
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+@frozen
+class Comparison:
+    """
+    Change of a measured value between base and head runs
+    - Slowdown: relative change of the median towards worse (positive) or better (negative)
+    - Noise: relative spread of the samples, slowdowns within noise are not flagged
+    - P-value: probability of seeing the slowdown by chance, None if there are too few samples
+    - Tested: whether the samples are enough for the rank test to reach the significance level
+    """
+
+    name: str
+    base: float
+    head: float
+    slowdown: float
+    noise: float
+    p_value: float | None
+    regression: bool
+    tested: bool = True
+
+
+def min_test_samples(alpha: float) -> int:
+    """Smallest number of samples on each side for which the rank test can reach the significance level alpha"""
+    n = MIN_TEST_SAMPLES
+    while 1 / math.comb(2 * n, n) >= alpha:
+        n += 1
+    return n
+
+
+def compare_samples(
+    name: str,
+    base: list[float],
+    head: list[float],
+    higher_is_better: bool = False,
+    threshold: float = 0.05,
+    alpha: float = 0.01,
+    noise_factor: float = 3.0,
+) -> Comparison:
+    """
+    Flags a regression if the slowdown of the median is larger than both the threshold and the noise
+    (noise factor times the relative spread of base or head samples) and the rank test is significant.
+    Without enough samples for a significant rank test, only slowdowns over twice the threshold are flagged.
+    """
+    base_median = statistics.median(base)
+    head_median = statistics.median(head)
+    if higher_is_better:
+        slowdown = base_median / head_median - 1 if head_median > 0 else math.inf
+        p_value = mann_whitney_greater([-value for value in base], [-value for value in head])
+    else:
+        slowdown = head_median / base_median - 1 if base_median > 0 else 0.0
+        p_value = mann_whitney_greater(base, head)
+    noise = noise_factor * max(relative_spread(base), relative_spread(head))
+
+    # Rank test of few samples can not reach the significance level, even if all head samples are worse
+    testable = p_value is not None and 1 / math.comb(len(base) + len(head), len(head)) < alpha
+    if not testable:
+        regression = slowdown > max(2 * threshold, noise)
+    else:
+        regression = slowdown > max(threshold, noise) and p_value < alpha
+    return Comparison(name, base_median, head_median, slowdown, noise, p_value, regression, testable)
+
+
+def write_report(path: str | Path, report: dict[str, Any] | list[dict[str, Any]]) -> None:
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+class BenchmarkStore:
+    """
+    Results of benchmark runs keyed by commit hash, every commit and kind of benchmark (indexer, hot_paths)
+    has a json file with the list of its runs, so noise can be estimated from repeated runs
+    """
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+
+    def path(self, commit: str, kind: str) -> Path:
+        return self.directory / commit / f"{kind}.json"
+
+    def load(self, commit: str, kind: str) -> list[dict[str, Any]]:
+        path = self.path(commit, kind)
+        if not path.exists():
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def save(self, commit: str, kind: str, report: dict[str, Any]) -> Path:
+        runs = self.load(commit, kind)
+        runs.append(report)
+        path = self.path(commit, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_report(path, runs)
+        return path
+
+    def commits(self) -> list[str]:
+        if not self.directory.exists():
+            return []
+        return sorted(path.name for path in self.directory.iterdir() if path.is_dir())
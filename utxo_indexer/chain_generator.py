@@ -0,0 +1,229 @@
+"""
+Generator of synthetic, internally consistent chains for scale tests
+
+Every input spends an existing output of an earlier transaction (of an earlier block or earlier in the same block),
+amounts of inputs and outputs add up, heights, hashes, previous block hashes and mediantimes form a chain.
+Blocks are shaped like getblock results of the node, verbosity 3 for btc (inputs with prevouts)
+and verbosity 2 for doge (prevouts are requested with getrawtransaction).
+"""
+
+import hashlib
+import random
+from typing import Any, Callable, Iterator, Literal
+
+from attrs import frozen
+
+from client.raw_block import base58check, format_amount, sha256d
+from utxo_indexer.mock_node import MockNodeData
+
+# Chain parameters by source
+BLOCK_INTERVAL = {"btc": 600, "doge": 60}
+BLOCK_SUBSIDY = {"btc": 50 * 10**8, "doge": 10_000 * 10**8}
+PUBKEY_HASH_VERSION = {"btc": 0x00, "doge": 0x1E}
+# Outputs of a transaction that funds the pool of spendable outputs
+FUNDING_OUTPUTS = 1000
+
+
+@frozen
+class ChainProfile:
+    """
+    Sizes and distributions of generated blocks, ranges are inclusive and sampled uniformly
+    - Blocks: number of generated blocks, the first one only has a coinbase that funds the rest
+    - Transactions: number of ordinary transactions per block
+    - Inputs, outputs: number of inputs and outputs of an ordinary transaction
+    - Consolidations: number of transactions per block that spend consolidation_inputs outputs into one
+    - Payouts: number of transactions per block that pay to payout_outputs outputs
+    - Spend chain length: number of transactions per block that each spend an output of the previous one
+    - OP_RETURN share: share of ordinary transactions with an OP_RETURN payment reference
+    - Addresses: number of distinct addresses outputs are paid to, fewer addresses mean more reuse
+    """
+
+    blocks: int = 10
+    transactions: tuple[int, int] = (50, 200)
+    inputs: tuple[int, int] = (1, 3)
+    outputs: tuple[int, int] = (1, 3)
+    consolidations: int = 0
+    consolidation_inputs: int = 20_000
+    payouts: int = 0
+    payout_outputs: int = 5_000
+    spend_chain_length: int = 0
+    op_return_share: float = 0.0
+    addresses: int = 10_000
+
+
+class ChainGenerator:
+    """
+    Generates blocks of a synthetic chain
+    - Source: shape of blocks and transactions, btc or doge
+    - Profile: sizes and distributions of blocks
+    - Start height: height of the first generated block
+    - Start time: mediantime of the first generated block
+    - Seed: same seed generates the same chain
+    - Amount: representation of amounts given in satoshis, decimal strings by default
+    """
+
+    def __init__(
+        self,
+        source: Literal["btc", "doge"],
+        profile: ChainProfile,
+        start_height: int = 1,
+        start_time: int = 1_700_000_000,
+        seed: int = 0,
+        amount: Callable[[int], Any] = format_amount,
+    ) -> None:
+        self.source = source
+        self.profile = profile
+        self.start_height = start_height
+        self.start_time = start_time
+        self.amount = amount
+
+        self._random = random.Random(seed)
+        self._seed = seed
+        self._addresses: dict[int, dict] = {}
+        # Spendable outputs as (txid, n, value, scriptPubKey)
+        self._pool: list[tuple[str, int, int, dict]] = []
+        self._tx_counter = 0
+
+    def generate(self) -> Iterator[dict]:
+        previous_hash = sha256d(f"{self._seed}:genesis".encode())[::-1].hex()
+        for i in range(self.profile.blocks):
+            block = self._block(self.start_height + i, previous_hash)
+            previous_hash = block["hash"]
+            yield block
+
+    def generate_data(self) -> MockNodeData:
+        """Generates the whole chain as data of the mock node"""
+        data = MockNodeData()
+        data.chain_info["chain"] = "regtest"
+        for block in self.generate():
+            data.add_block(block)
+        return data
+
+    def _block(self, height: int, previous_hash: str) -> dict:
+        profile = self.profile
+        coinbase, coinbase_outputs = self._new_transaction([self._coinbase_vin(height)], [BLOCK_SUBSIDY[self.source]])
+        txs = [coinbase]
+        # The pool is funded by coinbases of earlier blocks, so the first block only has a coinbase
+        if len(self._pool) > 0:
+            for _ in range(profile.consolidations):
+                txs.extend(self._transaction(profile.consolidation_inputs, 1))
+            for _ in range(profile.payouts):
+                txs.extend(self._transaction(1, profile.payout_outputs))
+            txs.extend(self._spend_chain(profile.spend_chain_length))
+            for _ in range(self._random.randint(*profile.transactions)):
+                n_inputs = self._random.randint(*profile.inputs)
+                n_outputs = self._random.randint(*profile.outputs)
+                txs.extend(self._transaction(n_inputs, n_outputs, self._random.random() < profile.op_return_share))
+        # Coinbase outputs can only be spent in later blocks
+        self._pool.extend(coinbase_outputs)
+
+        block_hash = sha256d(f"{previous_hash}:{height}:{txs[-1]['txid']}".encode())[::-1].hex()
+        mediantime = self.start_time + (height - self.start_height) * BLOCK_INTERVAL[self.source]
+        return {
+            "hash": block_hash,
+            "height": height,
+            "time": mediantime + BLOCK_INTERVAL[self.source],
+            "mediantime": mediantime,
+            "previousblockhash": previous_hash,
+            "nTx": len(txs),
+            "tx": txs,
+        }
+
+    def _transaction(self, n_inputs: int, n_outputs: int, op_return: bool = False) -> list[dict]:
+        """Returns the transaction preceded by the funding transactions it needs"""
+        txs = self._fund(n_inputs)
+        spent = [self._take_output() for _ in range(n_inputs)]
+        tx, outputs = self._new_transaction(
+            [self._vin(output) for output in spent], self._split(sum(output[2] for output in spent), n_outputs)
+        )
+        if op_return:
+            reference = self._random.randbytes(32).hex()
+            script_pub_key = {"asm": f"OP_RETURN {reference}", "hex": f"6a20{reference}", "type": "nulldata"}
+            tx["vout"].append({"value": self.amount(0), "n": len(tx["vout"]), "scriptPubKey": script_pub_key})
+        self._pool.extend(outputs)
+        txs.append(tx)
+        return txs
+
+    def _spend_chain(self, length: int) -> list[dict]:
+        """Returns transactions that each spend the first output of the previous one"""
+        txs = []
+        output = None
+        for _ in range(length):
+            if output is None:
+                txs.extend(self._fund(1))
+                output = self._take_output()
+            tx, outputs = self._new_transaction([self._vin(output)], self._split(output[2], 2))
+            output = outputs[0]
+            self._pool.extend(outputs[1:])
+            txs.append(tx)
+        if output is not None:
+            self._pool.append(output)
+        return txs
+
+    def _fund(self, n_inputs: int) -> list[dict]:
+        """Splits the largest outputs of the pool until it holds enough outputs to be spent"""
+        txs = []
+        while len(self._pool) < n_inputs:
+            output = self._take_output(largest=True)
+            tx, outputs = self._new_transaction([self._vin(output)], self._split(output[2], FUNDING_OUTPUTS))
+            self._pool.extend(outputs)
+            txs.append(tx)
+        return txs
+
+    def _new_transaction(self, vin: list[dict], values: list[int]) -> tuple[dict, list[tuple[str, int, int, dict]]]:
+        """Returns the transaction and its outputs, outputs are not added to the pool"""
+        tx = {"txid": self._txid(), "vin": vin, "vout": []}
+        outputs = []
+        for n, value in enumerate(values):
+            script_pub_key = self._address(self._random.randrange(self.profile.addresses))
+            tx["vout"].append({"value": self.amount(value), "n": n, "scriptPubKey": script_pub_key})
+            outputs.append((tx["txid"], n, value, script_pub_key))
+        return tx, outputs
+
+    def _take_output(self, largest: bool = False) -> tuple[str, int, int, dict]:
+        if largest:
+            index = max(range(len(self._pool)), key=lambda i: self._pool[i][2])
+        else:
+            index = self._random.randrange(len(self._pool))
+        # Swap with the last output, so removing is constant time
+        self._pool[index], self._pool[-1] = self._pool[-1], self._pool[index]
+        return self._pool.pop()
+
+    def _split(self, value: int, n: int) -> list[int]:
+        if n == 1:
+            return [value]
+        cuts = sorted(self._random.randint(0, value) for _ in range(n - 1))
+        return [b - a for a, b in zip([0, *cuts], [*cuts, value], strict=True)]
+
+    def _coinbase_vin(self, height: int) -> dict:
+        return {"coinbase": height.to_bytes(4, "little").hex(), "sequence": 4294967295}
+
+    def _vin(self, output: tuple[str, int, int, dict]) -> dict:
+        txid, n, value, script_pub_key = output
+        vin = {"txid": txid, "vout": n, "scriptSig": {"asm": "", "hex": ""}, "sequence": 4294967293}
+        if self.source == "btc":
+            vin["prevout"] = {"value": self.amount(value), "scriptPubKey": dict(script_pub_key)}
+        return vin
+
+    def _address(self, index: int) -> dict:
+        if index not in self._addresses:
+            pubkey_hash = hashlib.sha256(f"{self._seed}:address:{index}".encode()).digest()[:20].hex()
+            script_pub_key = {
+                "asm": f"OP_DUP OP_HASH160 {pubkey_hash} OP_EQUALVERIFY OP_CHECKSIG",
+                "hex": f"76a914{pubkey_hash}88ac",
+                "type": "pubkeyhash",
+            }
+            address = base58check(PUBKEY_HASH_VERSION[self.source], bytes.fromhex(pubkey_hash))
+            if self.source == "btc":
+                script_pub_key["address"] = address
+            else:
+                # Doge nodes return addresses as a list with the number of required signatures
+                script_pub_key["reqSigs"] = 1
+                script_pub_key["addresses"] = [address]
+            self._addresses[index] = script_pub_key
+        # Clients normalize scriptPubKey in place, so outputs do not share it
+        return dict(self._addresses[index])
+
+    def _txid(self) -> str:
+        self._tx_counter += 1
+        return sha256d(f"{self._seed}:tx:{self._tx_counter}".encode())[::-1].hex()
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Iterable, Sequence
+
+from eth_hash.auto import keccak
+
+from utxo_indexer.utils import ZERO_BYTES_32
+
+ZERO_LEAF = bytes(32)
+
+
+def address_leaf_hash(address: str) -> bytes:
+    """Leaf of an address in the source addresses tree, keccak of keccak of the address ascii bytes"""
+    return keccak(keccak(address.encode("latin-1")))
+
+
+def merkle_root(leaves: Iterable[bytes]) -> bytes | None:
+    """
+    Root of the merkle tree built from 32 byte leaves, same as MerkleTree from py_flare_common
+    - Leaves are sorted and deduplicated, parents are hashes of the sorted pair of children
+    """
+    hashes = sorted(set(leaves))
+    n = len(hashes)
+    if n == 0:
+        return None
+
+    # Tree is stored as an array with the root at index 0 and children of node i at 2i + 1 and 2i + 2
+    tree = [b""] * (n - 1) + hashes
+    for i in range(n - 2, -1, -1):
+        left = tree[2 * i + 1]
+        right = tree[2 * i + 2]
+        tree[i] = keccak(left + right if left <= right else right + left)
+    return tree[0]
+
+
+def root_hex(root: bytes | None) -> str:
+    if root is None:
+        return ZERO_BYTES_32
+    return root.hex()
+
+
+# Source addresses root of coinbase transactions, which have a single input without an address
+COINBASE_SOURCE_ADDRESS_ROOT = root_hex(merkle_root([ZERO_LEAF]))
+
+
+class AddressHasher:
+    """
+    Computes source addresses roots of transactions, with a least recently used cache of address leaf hashes
+    - Max entries: number of cached addresses, cache is disabled if not positive
+
+    Addresses of exchanges and pools are used in many inputs of a block, so their leaves are hashed once and
+    reused. The hasher is not thread safe, it is used by the thread that processes blocks.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def leaf(self, address: str | None) -> bytes:
+        if address is None:
+            return ZERO_LEAF
+        leaf = self._entries.get(address)
+        if leaf is not None:
+            self.hits += 1
+            self._entries.move_to_end(address)
+            return leaf
+
+        self.misses += 1
+        leaf = address_leaf_hash(address)
+        if self.max_entries > 0:
+            self._entries[address] = leaf
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return leaf
+
+    def source_addresses_root(self, addresses: Sequence[str | None]) -> str:
+        """Source addresses root of a transaction with the given input addresses (None for inputs without one)"""
+        return root_hex(merkle_root([self.leaf(address) for address in addresses]))
+
+    def source_addresses_roots(self, transactions_addresses: Iterable[Sequence[str | None]]) -> list[str]:
+        """Source addresses roots of all transactions of a block"""
+        return [self.source_addresses_root(addresses) for addresses in transactions_addresses]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,106 @@
+import logging
+import multiprocessing
+import time
+import typing
+
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from utxo_indexer.backfill_worker import init_worker
+from utxo_indexer.indexer import get_indexer_client
+from utxo_indexer.indexer.indexer_client import IndexerClient
+from utxo_indexer.models import TipSyncState, UtxoBlock
+
+logger = logging.getLogger(__name__)
+
+# Indexer client of the worker process, created once by the pool initializer (see backfill_worker)
+_indexer: IndexerClient | None = None
+
+
+def block_range_shards(first_block_height: int, last_block_height: int, shard_size: int) -> list[tuple[int, int]]:
+    """Splits block heights [first_block_height, last_block_height] into consecutive shards of at most shard_size"""
+    assert shard_size > 0, "Shard size should be positive"
+    return [
+        (first, min(first + shard_size - 1, last_block_height))
+        for first in range(first_block_height, last_block_height + 1, shard_size)
+    ]
+
+
+def _factory_path(indexer_factory: typing.Callable[[], IndexerClient]) -> str:
+    """Import path of the factory, worker processes import it once django is set up"""
+    path = f"{getattr(indexer_factory, '__module__', '')}.{getattr(indexer_factory, '__qualname__', '')}"
+    try:
+        imported = import_string(path)
+    except ImportError:
+        imported = None
+    if imported is not indexer_factory:
+        raise ValueError(
+            f"Indexer factory {indexer_factory!r} can not be imported by worker processes, use a module level function"
+        )
+    return path
+
+
+def _backfill_shard(shard: tuple[int, int]) -> tuple[int, int]:
+    assert _indexer is not None, "Worker indexer is not initialized"
+    first_block_height, last_block_height = shard
+    start = time.time()
+    indexed_heights = UtxoBlock.indexed_heights(first_block_height, last_block_height)
+    for block_height in range(first_block_height, last_block_height + 1):
+        if block_height not in indexed_heights:
+            _indexer.backfill_block(block_height)
+    logger.info("Backfilled blocks %s - %s in: %s", first_block_height, last_block_height, time.time() - start)
+    return shard
+
+
+def backfill_block_range(
+    first_block_height: int,
+    last_block_height: int,
+    processes: int,
+    shard_size: int,
+    indexer_factory: typing.Callable[[], IndexerClient] = get_indexer_client,
+) -> int:
+    """
+    Indexes the block range with a pool of worker processes and returns the latest indexed height afterwards
+
+    The range is split into shards of consecutive blocks, each worker process has its own node sessions and db
+    connection and commits blocks of its shards out of order. Tip state only advances over the contiguous prefix
+    of stored blocks, so an interrupted backfill can be restarted and the indexer never skips a missing block.
+
+    Worker processes are started with spawn and import the indexer factory by its path, so it has to be a module
+    level function (not a lambda or closure). Indexer clients created by the factory are closed once they are done.
+    """
+    global _indexer
+    shards = block_range_shards(first_block_height, last_block_height, shard_size)
+    logger.info(
+        "Backfilling blocks %s - %s in %s shards with %s processes",
+        first_block_height,
+        last_block_height,
+        len(shards),
+        processes,
+    )
+
+    if processes <= 1:
+        _indexer = indexer_factory()
+        try:
+            for shard in shards:
+                _backfill_shard(shard)
+                TipSyncState.advance_indexed_height()
+        finally:
+            _indexer.close()
+            _indexer = None
+        return TipSyncState.advance_indexed_height()
+
+    indexer_factory_path = _factory_path(indexer_factory)
+    # Connections must not be shared with the worker processes
+    connections.close_all()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes, initializer=init_worker, initargs=(indexer_factory_path,)) as pool:
+        # Shards are handed out in order, so the prefix of the range is completed first
+        for first, last in pool.imap_unordered(_backfill_shard, shards):
+            latest_indexed_height = TipSyncState.advance_indexed_height()
+            logger.info("Shard %s - %s done, latest indexed height: %s", first, last, latest_indexed_height)
+        # Workers exit on their own instead of being terminated, so they close their indexer clients
+        pool.close()
+        pool.join()
+
+    return TipSyncState.advance_indexed_height()
@@ -1,7 +1,5 @@
 import logging
 
-from django.db import transaction
-
 from client.btc_client import BtcClient
 from utxo_indexer.models import (
     TransactionInput,
@@ -10,7 +8,7 @@ from utxo_indexer.models import (
     UtxoBlock,
     UtxoTransaction,
 )
-from utxo_indexer.models.types import CoinbaseVinResponse, PrevoutResponse, VoutResponse
+from utxo_indexer.models.types import BlockResponse, CoinbaseVinResponse, PrevoutResponse, VoutResponse
 
 from .indexer_client import IndexerClient
 from .types import BlockInformationPassing, BlockProcessorMemory, PostProcessingMemoryElement
@@ -29,22 +27,27 @@ class BtcIndexerClient(IndexerClient):
     def process_block(self, block_height: int):
         # NOTE: we always assume that block processing is for blocks that are for sure on main branch of the blockchain
 
-        processed_block = BlockProcessorMemory()
-
         assert self.toplevel_worker is not None, "Toplevel worker is not set"
         block_hash = self._get_block_hash_from_height(block_height, self.toplevel_worker)
         res_block = self._get_block_by_hash(block_hash, self.toplevel_worker)
 
-        block_db = UtxoBlock.object_from_node_response(res_block)
+        processed_block = self.process_block_response_timed(res_block)
+        self.save_processed_block(block_height, processed_block)
+
+    def process_block_response(self, res_block: BlockResponse) -> BlockProcessorMemory:
+        processed_block = BlockProcessorMemory()
+        processed_block.block = UtxoBlock.object_from_node_response(res_block)
 
         block_info = BlockInformationPassing(
             block_num=res_block.height,
             block_ts=res_block.mediantime,
         )
+        processed_transactions: list[PostProcessingMemoryElement] = []
         for tx in res_block.tx:
             tx_link = UtxoTransaction.object_from_node_response(tx, block_info.block_num, block_info.block_ts)
             processed_block.tx.append(tx_link)
             processed_transaction = PostProcessingMemoryElement(obj=tx_link, cbi=[], inp=[])
+            processed_transactions.append(processed_transaction)
             for vin_n, vin in enumerate(tx.vin):
                 if isinstance(vin, CoinbaseVinResponse):
                     cb_input = TransactionInputCoinbase.object_from_node_response(vin_n, vin, tx_link)
@@ -62,13 +65,7 @@ class BtcIndexerClient(IndexerClient):
             for vout in tx.vout:
                 processed_block.vouts.append(TransactionOutput.object_from_node_response(vout, tx_link))
 
-            # Adding source_addresses_root to UtxoTransaction
-            self.update_source_addresses_root_from_tx_data(processed_transaction)
+        # Adding source_addresses_root to UtxoTransaction
+        self.update_source_addresses_roots(processed_transactions)
 
-        with transaction.atomic():
-            UtxoTransaction.objects.bulk_create(processed_block.tx, batch_size=999)
-            TransactionInputCoinbase.objects.bulk_create(processed_block.vins_cb, batch_size=999)
-            TransactionInput.objects.bulk_create(processed_block.vins, batch_size=999)
-            TransactionOutput.objects.bulk_create(processed_block.vouts, batch_size=999)
-            UtxoBlock.objects.bulk_create([block_db])
-            self.update_tip_state_done_block_process(block_height)
+        return processed_block
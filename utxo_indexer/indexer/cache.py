@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable
+
+from utxo_indexer.models.types import VoutResponse
+
+# Approximate memory used by a cache entry apart from its strings (key tuple, attrs objects, dict node)
+ENTRY_OVERHEAD_BYTES = 640
+
+
+def _entry_size(vout: VoutResponse) -> int:
+    script_pub_key = vout.scriptPubKey
+    return (
+        ENTRY_OVERHEAD_BYTES
+        + len(vout.value)
+        + len(script_pub_key.address)
+        + len(script_pub_key.type)
+        + len(script_pub_key.asm)
+        + len(script_pub_key.hex)
+    )
+
+
+class OutpointCache:
+    """
+    Least recently used cache of (txid, n) outpoints to vout responses, bounded by estimated memory usage
+    - Max size bytes: memory cap of the cache, cache is disabled if not positive
+
+    Outputs are usually spent soon after they are created, so the cache is populated with outputs of
+    processed blocks and fetched prevout transactions. As an output can only be spent once, entries are
+    removed from the cache when they are taken.
+    """
+
+    def __init__(self, max_size_bytes: int) -> None:
+        self.max_size_bytes = max_size_bytes
+        self.size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: OrderedDict[tuple[str, int], VoutResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, outpoint: tuple[str, int], vout: VoutResponse) -> None:
+        self.put_many([(outpoint, vout)])
+
+    def put_many(self, entries: Iterable[tuple[tuple[str, int], VoutResponse]]) -> None:
+        if self.max_size_bytes <= 0:
+            return
+        with self._lock:
+            for outpoint, vout in entries:
+                previous = self._entries.pop(outpoint, None)
+                if previous is not None:
+                    self.size_bytes -= _entry_size(previous)
+                self._entries[outpoint] = vout
+                self.size_bytes += _entry_size(vout)
+
+            while self.size_bytes > self.max_size_bytes and len(self._entries) > 0:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= _entry_size(evicted)
+                self.evictions += 1
+
+    def take_many(self, outpoints: Iterable[tuple[str, int]]) -> dict[tuple[str, int], VoutResponse]:
+        """Returns cached vouts among the given outpoints and removes them from the cache"""
+        found = {}
+        with self._lock:
+            for outpoint in outpoints:
+                vout = self._entries.pop(outpoint, None)
+                if vout is None:
+                    self.misses += 1
+                    continue
+                self.size_bytes -= _entry_size(vout)
+                self.hits += 1
+                found[outpoint] = vout
+        return found
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -1,19 +1,248 @@
+import asyncio
 import functools
+import json
+import random
+import threading
 import time
 
+import httpx
+import msgspec
+import requests
+from attrs import frozen
+
+from client.errors import RpcError
+from client.raw_block import RawBlockError
+
+
+class RetryError(Exception):
+    """Raised when all attempts of a retried call failed, holds the errors of all attempts"""
+
+    def __init__(self, errors: list[Exception]) -> None:
+        super().__init__(errors)
+        self.errors = errors
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit breaker is open"""
+
+
+# Http statuses of requests that can succeed later besides 5xx, request timeout and too many requests
+RETRYABLE_HTTP_STATUSES = (408, 429)
+
+
+def _http_status(error: Exception) -> int | None:
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    return None
+
+
+def is_transport_error(error: Exception) -> bool:
+    # Invalid json raised by requests is also a request exception
+    if isinstance(error, json.JSONDecodeError):
+        return False
+    status = _http_status(error)
+    if status is not None:
+        return status >= 500 or status in RETRYABLE_HTTP_STATUSES
+    return isinstance(error, (requests.RequestException, httpx.TransportError))
+
+
+def is_client_error(error: Exception) -> bool:
+    """Other 4xx responses, e.g. 401 and 403 of wrong RPC credentials, are returned again for the same request"""
+    status = _http_status(error)
+    return status is not None and not is_transport_error(error)
+
+
+def is_parse_error(error: Exception) -> bool:
+    return isinstance(error, (json.JSONDecodeError, msgspec.DecodeError, RawBlockError))
+
+
+@frozen
+class RetryPolicy:
+    """
+    Decides which errors are retried and how long to wait between attempts
+    - Base delay: delay before the second attempt, doubled for every next attempt
+    - Max delay: upper bound of the delay
+    - Retry parse errors: whether responses that can not be decoded are requested again
+    - Retry unknown errors: whether errors that are not transport, RPC or parse errors are retried
+
+    Transport errors (including 5xx, 408 and 429 responses) are always retried, RPC errors only if the node is
+    starting up or syncing, as other RPC errors (unknown transaction, invalid parameter) and other 4xx responses
+    (wrong credentials) are returned again for the same request.
+    """
+
+    base_delay: float = 0.25
+    max_delay: float = 8.0
+    retry_parse_errors: bool = False
+    retry_unknown_errors: bool = True
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, CircuitOpenError) or is_transport_error(error):
+            return True
+        if is_client_error(error):
+            return False
+        if isinstance(error, RpcError):
+            return error.retryable
+        if is_parse_error(error):
+            return self.retry_parse_errors
+        return self.retry_unknown_errors
+
+    def delay(self, attempt: int) -> float:
+        """Delay after the given failed attempt (starting with 0), exponential with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class CircuitBreaker:
+    """
+    Stops requests to the node after consecutive transport errors, shared by all workers of the process
+    - Failure threshold: number of consecutive transport errors that open the circuit
+    - Reset timeout: time the circuit stays open before a single trial request is let through
+
+    While the circuit is open the node is given time to recover instead of being sent requests that fail.
+    A successful trial request closes the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 10, reset_timeout: float = 2.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def wait_time(self) -> float:
+        """Time until the circuit lets a trial request through"""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            if self._trial_in_progress:
+                return self.reset_timeout
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow_request(self) -> bool:
+        """Whether a request can be sent, reserves the trial request once the reset timeout has passed"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_in_progress or time.monotonic() < self.opened_at + self.reset_timeout:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+
+# Circuit breaker of all requests sent to the node
+NODE_CIRCUIT_BREAKER = CircuitBreaker()
+
+
+def _before_attempt(circuit_breaker: CircuitBreaker | None) -> None:
+    if circuit_breaker is not None and not circuit_breaker.allow_request():
+        raise CircuitOpenError(f"Circuit to the node is open for another {circuit_breaker.wait_time():.1f} s")
+
+
+def _after_error(error: Exception, circuit_breaker: CircuitBreaker | None) -> None:
+    if circuit_breaker is None or isinstance(error, CircuitOpenError):
+        return
+    if is_transport_error(error):
+        circuit_breaker.record_failure()
+    else:
+        # Node has responded, so it is reachable
+        circuit_breaker.record_success()
+
+
+def _delay(error: Exception, attempt: int, policy: RetryPolicy, circuit_breaker: CircuitBreaker | None) -> float:
+    delay = policy.delay(attempt)
+    if isinstance(error, CircuitOpenError) and circuit_breaker is not None:
+        delay = max(delay, circuit_breaker.wait_time())
+    return delay
+
+
+def retry(
+    n: int,
+    exception_type: tuple[type[Exception], ...] | type[Exception] = Exception,
+    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+    circuit_breaker: CircuitBreaker | None = None,
+):
+    """
+    Calls the function up to n times while it raises retryable errors of the exception type
+    Errors that are not retryable are raised immediately, RetryError is raised after n failed attempts
+    """
 
-def retry(n: int, exception_type: tuple[type[Exception], ...] | type[Exception] = Exception):
     def decorator(func):
         @functools.wraps(func)
         def inner(*args, **kwargs):
             errors = []
-            for _ in range(n):
+            for attempt in range(n):
+                try:
+                    _before_attempt(circuit_breaker)
+                    result = func(*args, **kwargs)
+                except exception_type as e:
+                    _after_error(e, circuit_breaker)
+                    if not policy.is_retryable(e):
+                        raise
+                    errors.append(e)
+                    if attempt < n - 1:
+                        time.sleep(_delay(e, attempt, policy, circuit_breaker))
+                    continue
+                if circuit_breaker is not None:
+                    circuit_breaker.record_success()
+                return result
+            raise RetryError(errors)
+
+        return inner
+
+    return decorator
+
+
+def async_retry(
+    n: int,
+    exception_type: tuple[type[Exception], ...] | type[Exception] = Exception,
+    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+    circuit_breaker: CircuitBreaker | None = None,
+):
+    """Same as retry, for coroutine functions"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def inner(*args, **kwargs):
+            errors = []
+            for attempt in range(n):
                 try:
-                    return func(*args, **kwargs)
+                    _before_attempt(circuit_breaker)
+                    result = await func(*args, **kwargs)
                 except exception_type as e:
+                    _after_error(e, circuit_breaker)
+                    if not policy.is_retryable(e):
+                        raise
                     errors.append(e)
-                    time.sleep(0.5)
-            raise Exception(errors)
+                    if attempt < n - 1:
+                        await asyncio.sleep(_delay(e, attempt, policy, circuit_breaker))
+                    continue
+                if circuit_breaker is not None:
+                    circuit_breaker.record_success()
+                return result
+            raise RetryError(errors)
 
         return inner
 
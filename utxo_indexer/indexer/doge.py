@@ -1,12 +1,17 @@
+import asyncio
 import logging
 import threading
+from collections import defaultdict
 from queue import Empty, Queue
 from typing import Callable
 
-from django.db import transaction
 from requests.sessions import Session
 
 from client import DogeClient
+from client.async_rpc import AsyncRpcEngine
+from client.concurrency import AimdConcurrencyController
+from configuration.types import Config
+from utxo_indexer.metrics import RPC_CONCURRENCY_LIMIT
 from utxo_indexer.models import (
     TransactionInput,
     TransactionInputCoinbase,
@@ -14,54 +19,80 @@ from utxo_indexer.models import (
     UtxoBlock,
     UtxoTransaction,
 )
-from utxo_indexer.models.types import CoinbaseVinResponse, TransactionResponse, VinResponse
+from utxo_indexer.models.types import (
+    BlockResponse,
+    CoinbaseVinResponse,
+    TransactionResponse,
+    VinResponse,
+    VoutResponse,
+)
 
-from .decorators import retry
+from .cache import OutpointCache
+from .decorators import NODE_CIRCUIT_BREAKER, async_retry, retry
 from .indexer_client import IndexerClient
 from .types import BlockInformationPassing, BlockProcessorMemory, PostProcessingMemoryElement
 
 logger = logging.getLogger(__name__)
 
 
-def thread_worker(session: Session, process_queue: Queue, processed_block: BlockProcessorMemory):
+def thread_worker(
+    session: Session, process_queue: Queue, processed_block: BlockProcessorMemory, errors: list[Exception]
+):
+    """Processes items until the queue is empty, errors are collected and the remaining items are only drained"""
     while True:
         try:
             item = process_queue.get_nowait()
-            item(session, processed_block)
-            process_queue.task_done()
         except Empty:
             return
+        try:
+            if len(errors) == 0:
+                item(session, processed_block)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            process_queue.task_done()
+
+
+def link_pre_vout_transactions(
+    spending_inputs: dict[str, list[tuple[int, VinResponse, UtxoTransaction]]],
+    transactions: dict[str, TransactionResponse],
+    processed_block: BlockProcessorMemory,
+    utxo_cache: OutpointCache,
+) -> list[TransactionInput]:
+    """Links outputs of fetched prevout transactions to all of the inputs spending them"""
+    input_objects = []
+    for txid, inputs in spending_inputs.items():
+        res = transactions[txid]
+        for vin_n, vin, tx_link in inputs:
+            prevout_res = res.vout[vin.vout]
+            input_objects.append(TransactionInput.object_from_node_response(vin_n, vin, prevout_res, tx_link))
+        # Other outputs of fetched transaction are likely to be spent in one of the next blocks
+        spent = {vin.vout for _, vin, _ in inputs}
+        utxo_cache.put_many(((txid, vout.n), vout) for vout in res.vout if vout.n not in spent)
+    processed_block.vins.extend(input_objects)
+    return input_objects
 
 
-def process_pre_vout_transaction(
-    vin: VinResponse,
-    vin_n: int,
-    tx_link: UtxoTransaction,
-    transaction_getter: Callable[[str, Session], TransactionResponse],
+def process_pre_vout_transactions(
+    spending_inputs: dict[str, list[tuple[int, VinResponse, UtxoTransaction]]],
+    transactions_getter: Callable[[list[str], Session], dict[str, TransactionResponse]],
+    utxo_cache: OutpointCache,
 ):
-    """Return the function that processes the transaction prevouts and link it to the spending transaction
+    """Return the function that fetches prevout transactions with a single batch request and links their outputs
+    to all of the inputs spending them
 
     Args:
-        vin (VinResponse): vin object from spending transaction
-        vin_n (int): index of vin in spending transaction
-        tx_link (UtxoTransaction): transaction object of spending transaction
-        transaction_getter (Callable): function to retrieve transaction details
+        spending_inputs (dict): for every prevout txid, vin index, vin object and transaction object of
+            spending transaction for every input that spends one of its outputs
+        transactions_getter (Callable): function to retrieve details of multiple transactions
+        utxo_cache (OutpointCache): cache for outputs of fetched transactions that are not spent yet
     """
 
-    def _process_pre_vout_transaction(session: Session, processed_block: BlockProcessorMemory):
-        txid, vout_n = vin.txid, vin.vout
-        # Memo:
-        vout = TransactionOutput.objects.filter(transaction_link__transaction_id=txid, n=vout_n).first()
-        if vout is not None:
-            prevout_res = vout.to_vout_response()
-        else:
-            res = transaction_getter(txid, session)
-            prevout_res = res.vout[vout_n]
-        input_object = TransactionInput.object_from_node_response(vin_n, vin, prevout_res, tx_link)
-        processed_block.vins.append(TransactionInput.object_from_node_response(vin_n, vin, prevout_res, tx_link))
-        return input_object
+    def _process_pre_vout_transactions(session: Session, processed_block: BlockProcessorMemory):
+        transactions = transactions_getter(list(spending_inputs.keys()), session)
+        return link_pre_vout_transactions(spending_inputs, transactions, processed_block, utxo_cache)
 
-    return _process_pre_vout_transaction
+    return _process_pre_vout_transactions
 
 
 class DogeIndexerClient(IndexerClient):
@@ -71,31 +102,126 @@ class DogeIndexerClient(IndexerClient):
     def default(cls):
         return cls.new(DogeClient.default(), 60)
 
-    @retry(5)
+    def __init__(self, client: DogeClient, expected_production: int, instance_config: Config) -> None:
+        super().__init__(client, expected_production, instance_config)
+        self.utxo_cache = OutpointCache(instance_config.UTXO_CACHE_SIZE_MB * 1024 * 1024)
+
+        # Number of prevout requests in flight is either static or adapted to node latency and overload
+        concurrency = (
+            instance_config.RPC_MAX_IN_FLIGHT
+            if instance_config.RPC_ENGINE == "asyncio"
+            else instance_config.NUMBER_OF_WORKERS
+        )
+        self.rpc_concurrency: AimdConcurrencyController | None = None
+        if instance_config.RPC_CONCURRENCY_MAX > 0:
+            self.rpc_concurrency = AimdConcurrencyController(concurrency, instance_config.RPC_CONCURRENCY_MAX)
+            concurrency = instance_config.RPC_CONCURRENCY_MAX
+
+        # Prevout transactions are fetched by worker threads, or by the asyncio engine with many requests in flight
+        self.rpc_engine: AsyncRpcEngine | None = None
+        if instance_config.RPC_ENGINE == "asyncio":
+            self.rpc_engine = AsyncRpcEngine(
+                client.url,
+                (instance_config.AUTH_USERNAME, instance_config.AUTH_PASSWORD),
+                concurrency,
+                controller=self.rpc_concurrency,
+            )
+
+    def close(self) -> None:
+        super().close()
+        if self.rpc_engine is not None:
+            self.rpc_engine.close()
+
+    @retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
     def _get_transaction(self, txid: str, worker: Session) -> TransactionResponse:
         return self._client.get_transaction(worker, txid)
 
+    @retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
+    def _get_transactions(self, txids: list[str], worker: Session) -> dict[str, TransactionResponse]:
+        if self.rpc_concurrency is None:
+            return self._client.get_transactions(worker, txids)
+        with self.rpc_concurrency.track():
+            return self._client.get_transactions(worker, txids)
+
+    @async_retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
+    async def _get_transactions_async(self, txids: list[str]) -> dict[str, TransactionResponse]:
+        assert self.rpc_engine is not None, "Asyncio RPC engine is not set"
+        return await self._client.get_transactions_async(self.rpc_engine, txids)
+
+    async def _fetch_pre_vout_transactions(
+        self,
+        batches: list[dict[str, list[tuple[int, VinResponse, UtxoTransaction]]]],
+        processed_block: BlockProcessorMemory,
+    ) -> None:
+        async def fetch(batch: dict[str, list[tuple[int, VinResponse, UtxoTransaction]]]):
+            transactions = await self._get_transactions_async(list(batch.keys()))
+            link_pre_vout_transactions(batch, transactions, processed_block, self.utxo_cache)
+
+        # All batches are sent at once, the engine limits the number of requests in flight
+        async with asyncio.TaskGroup() as task_group:
+            for batch in batches:
+                task_group.create_task(fetch(batch))
+
+    def _fetch_pre_vout_transactions_threaded(
+        self,
+        batches: list[dict[str, list[tuple[int, VinResponse, UtxoTransaction]]]],
+        processed_block: BlockProcessorMemory,
+    ) -> None:
+        process_queue: Queue[Callable[[Session, BlockProcessorMemory], list[TransactionInput]]] = Queue()
+        for batch in batches:
+            process_queue.put(process_pre_vout_transactions(batch, self._get_transactions, self.utxo_cache))
+
+        # Multithreading part of the processing
+        # Launch worker threads, the adaptive limit is applied to the number of threads of every block
+        number_of_threads = len(self.workers)
+        if self.rpc_concurrency is not None:
+            number_of_threads = min(number_of_threads, self.rpc_concurrency.limit)
+        workers: list[threading.Thread] = []
+        errors: list[Exception] = []
+        for worker_index in range(number_of_threads):
+            t = threading.Thread(
+                target=thread_worker, args=(self.workers[worker_index], process_queue, processed_block, errors)
+            )
+            workers.append(t)
+            t.start()
+
+        # Wait for all tasks to be processed and for workers to finnish.
+        process_queue.join()
+        [t.join() for t in workers]
+
+        # Failed batch fails the block, as in the asyncio engine
+        if len(errors) > 0:
+            raise errors[0]
+        if not process_queue.empty():
+            raise Exception("Queue should be empty after processing")
+
     # Block processing part
     def process_block(self, block_height: int):
         # NOTICE: we always assume that block processing is for blocks that are for sure on main branch of the blockchain
 
-        processed_block = BlockProcessorMemory()
-        process_queue: Queue[Callable[[Session, BlockProcessorMemory], TransactionInput]] = Queue()
-
         assert self.toplevel_worker is not None, "Toplevel worker is not set"
         block_hash = self._get_block_hash_from_height(block_height, self.toplevel_worker)
         res_block = self._get_block_by_hash(block_hash, self.toplevel_worker)
 
+        processed_block = self.process_block_response_timed(res_block)
+        self.save_processed_block(block_height, processed_block)
+
+    def process_block_response(self, res_block: BlockResponse) -> BlockProcessorMemory:
+        processed_block = BlockProcessorMemory()
+
         # Update the block info in DB, indicating it has processed transactions once we proceeded them
         # do it within transaction atomic update
-        block_db = UtxoBlock.object_from_node_response(res_block)
+        processed_block.block = UtxoBlock.object_from_node_response(res_block)
 
         block_info = BlockInformationPassing(
             block_num=res_block.height,
             block_ts=res_block.mediantime,
         )
 
-        # Put all of the transaction in block on the processing queue
+        # Collect all of the inputs in block that need their prevouts resolved,
+        # and outputs created in block, as inputs can spend outputs from the same block
+        pending_inputs: list[tuple[int, VinResponse, UtxoTransaction]] = []
+        block_outputs: dict[tuple[str, int], VoutResponse] = {}
         for tx in res_block.tx:
             tx_link = UtxoTransaction.object_from_node_response(tx, block_info.block_num, block_info.block_ts)
             processed_block.tx.append(tx_link)
@@ -105,27 +231,50 @@ class DogeIndexerClient(IndexerClient):
                         TransactionInputCoinbase.object_from_node_response(vin_n, vin, tx_link)
                     )
                 else:
-                    # CONSIDER: consider adding memeo here to not fill the queue
-                    process_queue.put(process_pre_vout_transaction(vin, vin_n, tx_link, self._get_transaction))
+                    pending_inputs.append((vin_n, vin, tx_link))
             for vout in tx.vout:
                 processed_block.vouts.append(TransactionOutput.object_from_node_response(vout, tx_link))
+                block_outputs[(tx.txid, vout.n)] = vout
 
-        # Multithreading part of the processing
-        # Launch worker threads
-        workers: list[threading.Thread] = []
-        for worker_index in range(len(self.workers)):
-            t = threading.Thread(
-                target=thread_worker, args=(self.workers[worker_index], process_queue, processed_block)
+        # Resolve prevouts created in this block and cached prevouts from memory, the ones that are already in db
+        # with a few set based queries, only the rest is put on the processing queue to be fetched from the node
+        spent_outpoints = [(vin.txid, vin.vout) for _, vin, _ in pending_inputs]
+        prevouts = self.utxo_cache.take_many(outpoint for outpoint in spent_outpoints if outpoint not in block_outputs)
+        prevouts.update(
+            TransactionOutput.vout_responses_for_outpoints(
+                [outpoint for outpoint in spent_outpoints if outpoint not in block_outputs and outpoint not in prevouts]
             )
-            workers.append(t)
-            t.start()
+        )
+        prevouts.update(block_outputs)
 
-        # Wait for all tasks to be processed and for workers to finnish.
-        process_queue.join()
-        [t.join() for t in workers]
+        # Outputs of this block that are not spent yet are likely to be spent in one of the next blocks
+        spent_in_block = set(spent_outpoints)
+        self.utxo_cache.put_many(
+            (outpoint, vout) for outpoint, vout in block_outputs.items() if outpoint not in spent_in_block
+        )
 
-        if not process_queue.empty():
-            raise Exception("Queue should be empty after processing")
+        # Missing inputs are grouped by prevout txid, so every prevout transaction is fetched only once
+        missing_inputs: dict[str, list[tuple[int, VinResponse, UtxoTransaction]]] = defaultdict(list)
+        for vin_n, vin, tx_link in pending_inputs:
+            prevout_res = prevouts.get((vin.txid, vin.vout))
+            if prevout_res is not None:
+                processed_block.vins.append(
+                    TransactionInput.object_from_node_response(vin_n, vin, prevout_res, tx_link)
+                )
+            else:
+                missing_inputs[vin.txid].append((vin_n, vin, tx_link))
+
+        # Missing prevout transactions are fetched from the node in JSON-RPC batches
+        batch_size = self.instance_config.RPC_BATCH_SIZE
+        missing_txids = list(missing_inputs.keys())
+        batches = [
+            {txid: missing_inputs[txid] for txid in missing_txids[i : i + batch_size]}
+            for i in range(0, len(missing_txids), batch_size)
+        ]
+        if self.rpc_engine is not None:
+            self.rpc_engine.run(self._fetch_pre_vout_transactions(batches, processed_block))
+        else:
+            self._fetch_pre_vout_transactions_threaded(batches, processed_block)
 
         # Adding source_addresses_root to UtxoTransaction
         postprocess_obj: dict[str, PostProcessingMemoryElement] = {}
@@ -144,13 +293,11 @@ class DogeIndexerClient(IndexerClient):
                 raise Exception("Post processing fail in regular inputs loop")
             postprocess_obj[txid].inp.append(tinp)
 
-        for processed_transaction in postprocess_obj.values():
-            self.update_source_addresses_root_from_tx_data(processed_transaction)
+        self.update_source_addresses_roots(postprocess_obj.values())
 
-        with transaction.atomic():
-            UtxoTransaction.objects.bulk_create(processed_block.tx, batch_size=999)
-            TransactionInputCoinbase.objects.bulk_create(processed_block.vins_cb, batch_size=999)
-            TransactionInput.objects.bulk_create(processed_block.vins, batch_size=999)
-            TransactionOutput.objects.bulk_create(processed_block.vouts, batch_size=999)
-            UtxoBlock.objects.bulk_create([block_db])
-            self.update_tip_state_done_block_process(block_height)
+        logger.debug("Utxo cache stats after block %s: %s", res_block.height, self.utxo_cache.stats())
+        logger.debug("Address hasher stats after block %s: %s", res_block.height, self.address_hasher.stats())
+        if self.rpc_concurrency is not None:
+            RPC_CONCURRENCY_LIMIT.set(self.rpc_concurrency.limit)
+            logger.debug("Rpc concurrency after block %s: %s", res_block.height, self.rpc_concurrency.stats())
+        return processed_block
@@ -2,22 +2,40 @@ import logging
 import time
 import typing
 
+from django.db import connection, transaction
 from requests.models import HTTPBasicAuth
 from requests.sessions import Session
 
 from client import BtcClient, DogeClient
 from configuration.config import config
 from configuration.types import Config
-from utxo_indexer.indexer.types import PostProcessingMemoryElement
+from utxo_indexer.hashing import COINBASE_SOURCE_ADDRESS_ROOT, AddressHasher
+from utxo_indexer.indexer.types import BlockProcessorMemory, PostProcessingMemoryElement
+from utxo_indexer.metrics import (
+    BLOCKS_INDEXED,
+    INDEXED_HEIGHT,
+    INPUTS_INDEXED,
+    LAG_BLOCKS,
+    STAGES,
+    TIP_HEIGHT,
+    TRANSACTIONS_INDEXED,
+)
 from utxo_indexer.models import (
     TipSyncState,
     TipSyncStateChoices,
+    TransactionInput,
+    TransactionInputCoinbase,
+    TransactionOutput,
     UtxoBlock,
+    UtxoTransaction,
 )
+from utxo_indexer.models.partitions import create_block_partitions
 from utxo_indexer.models.sync_state import PruneSyncState
 from utxo_indexer.models.types import BlockResponse
 
-from .decorators import retry
+from .decorators import NODE_CIRCUIT_BREAKER, retry
+from .pipeline import Pipeline
+from .writer import DB_WRITERS
 
 logger = logging.getLogger(__name__)
 
@@ -55,15 +73,34 @@ class IndexerClient:
         self.latest_indexed_block_height = self.extract_initial_block_height()
         self.latest_tip_block_height = 0
 
+        # Block tables have range partitions for all block numbers below this one
+        self.partitioned_up_to_height = 0
+
+        # Leaf hashes of recently seen input addresses, used to compute source addresses roots
+        self.address_hasher = AddressHasher(instance_config.ADDRESS_HASH_CACHE_SIZE)
+        # Time spent computing source addresses roots of the last processed block
+        self.last_hash_seconds = 0.0
+
+        # Processed blocks waiting to be committed together while catching up with the tip
+        self.pending_blocks: list[tuple[int, BlockProcessorMemory]] = []
+        self.pending_rows = 0
+        self.pending_since = 0.0
+
     def connect_workers(self) -> None:
         """
         Connects all workers to the node
         """
-        # BtcClient only needs one worker
-        if isinstance(self._client, BtcClient):
+        # BtcClient only needs one worker, the asyncio engine fetches doge prevouts without worker sessions
+        if isinstance(self._client, BtcClient) or self.instance_config.RPC_ENGINE == "asyncio":
             self.workers = [new_session(self.instance_config)]
         else:
-            self.workers = [new_session(self.instance_config) for _ in range(self.instance_config.NUMBER_OF_WORKERS)]
+            # Adaptive concurrency runs up to its maximum number of worker threads
+            number_of_workers = (
+                self.instance_config.RPC_CONCURRENCY_MAX
+                if self.instance_config.RPC_CONCURRENCY_MAX > 0
+                else self.instance_config.NUMBER_OF_WORKERS
+            )
+            self.workers = [new_session(self.instance_config) for _ in range(number_of_workers)]
         self.toplevel_worker = self.workers[0]
 
     def kill_workers(self) -> None:
@@ -75,6 +112,12 @@ class IndexerClient:
         self.workers = []
         self.toplevel_worker = None
 
+    def close(self) -> None:
+        """
+        Kills all workers and closes all other connections to the node
+        """
+        self.kill_workers()
+
     def ensure_workers(self) -> None:
         """
         Ensures that all workers are connected
@@ -94,15 +137,17 @@ class IndexerClient:
 
         assert self.toplevel_worker is not None, "Toplevel worker should be connected and defined"
 
-        latest_block = UtxoBlock.objects.order_by("block_number").last()
-        if latest_block is not None:
-            if latest_block.block_number < self.instance_config.INITIAL_BLOCK_HEIGHT:
+        bottom_block = UtxoBlock.objects.order_by("block_number").first()
+        if bottom_block is not None:
+            # Backfill can commit blocks out of order, indexing continues after the contiguous prefix of blocks
+            latest_block_number = UtxoBlock.contiguous_height(bottom_block.block_number)
+            if latest_block_number < self.instance_config.INITIAL_BLOCK_HEIGHT:
                 raise Exception(
                     f"Starting processing from block {self.instance_config.INITIAL_BLOCK_HEIGHT}"
-                    f" with latest block in db: {latest_block.block_number} would"
+                    f" with latest block in db: {latest_block_number} would"
                     " create holes in the transaction history"
                 )
-            return latest_block.block_number
+            return latest_block_number
 
         logger.info("No blocks in the database, starting from the initial block height")
 
@@ -145,14 +190,10 @@ class IndexerClient:
                 # We need to update the tip state and process new blocks
                 self.update_tip_state_indexing(height)
                 self.latest_tip_block_height = height
-                for i in range(
+                self.process_block_range(
                     self.latest_indexed_block_height + 1,
-                    height - self.instance_config.NUMBER_OF_BLOCK_CONFIRMATIONS + 1,
-                ):
-                    start = time.time()
-                    self.process_block(i)
-                    logger.info("Processed block: %s in: %s", i, time.time() - start)
-                    self.latest_indexed_block_height = i
+                    height - self.instance_config.NUMBER_OF_BLOCK_CONFIRMATIONS,
+                )
 
                 # TODO: save all blocks up to tip height
             else:
@@ -163,21 +204,103 @@ class IndexerClient:
                 self.kill_workers()
                 time.sleep(self.instance_config.INDEXER_POLL_INTERVAL)
 
+    def process_block_range(self, first_block_height: int, last_block_height: int) -> None:
+        """
+        Processes blocks from first to last block height (both included) in order
+
+        Args:
+            first_block_height (int): height of the first block to process
+            last_block_height (int): height of the last block to process
+        """
+        # Blocks in range could have already been stored by backfill
+        indexed_heights = UtxoBlock.indexed_heights(first_block_height, last_block_height)
+        block_heights = [i for i in range(first_block_height, last_block_height + 1) if i not in indexed_heights]
+        if len(indexed_heights) > 0:
+            logger.info("Skipping %s already indexed blocks", len(indexed_heights))
+
+        if self.instance_config.PREFETCH_DEPTH > 0 and len(block_heights) > 1:
+            self._process_block_range_pipelined(block_heights)
+        else:
+            for i in block_heights:
+                start = time.time()
+                self.write_processed_block(i, self.process_block_response_timed(self._get_block(i)))
+                logger.info("Processed block: %s in: %s", i, time.time() - start)
+        self.flush_processed_blocks()
+
+        if len(indexed_heights) > 0:
+            self.latest_indexed_block_height = TipSyncState.advance_indexed_height()
+            INDEXED_HEIGHT.set(self.latest_indexed_block_height)
+
+    def _process_block_range_pipelined(self, block_heights: list[int]) -> None:
+        """
+        Processes blocks as a pipeline of stages (fetch -> decode -> resolve/hash -> write), so the next blocks
+        are fetched and processed while the current one is written to db. Blocks are still written in order.
+        """
+        logger.info(
+            "Processing blocks %s - %s with prefetch depth %s",
+            block_heights[0],
+            block_heights[-1],
+            self.instance_config.PREFETCH_DEPTH,
+        )
+        # Fetching runs in its own thread, so it gets its own session
+        fetch_worker = new_session(self.instance_config)
+
+        def fetch(block_height: int) -> tuple[int, dict | bytes]:
+            block_hash = self._get_block_hash_from_height(block_height, fetch_worker)
+            return block_height, self._get_raw_block_by_hash(block_hash, fetch_worker)
+
+        def decode(item: tuple[int, dict | bytes]) -> tuple[int, BlockResponse]:
+            block_height, raw_block = item
+            with STAGES.time("structure"):
+                return block_height, self._client.structure_block(raw_block)
+
+        def resolve(item: tuple[int, BlockResponse]) -> tuple[int, BlockProcessorMemory]:
+            block_height, res_block = item
+            return block_height, self.process_block_response_timed(res_block)
+
+        start = time.time()
+
+        def write(item: tuple[int, BlockProcessorMemory]) -> None:
+            nonlocal start
+            block_height, processed_block = item
+            self.write_processed_block(block_height, processed_block)
+            logger.info("Processed block: %s in: %s", block_height, time.time() - start)
+            start = time.time()
+
+        try:
+            pipeline = Pipeline([fetch, decode, resolve], self.instance_config.PREFETCH_DEPTH)
+            pipeline.run(block_heights, write)
+        finally:
+            fetch_worker.close()
+
     # Base methods for interacting with node directly
 
-    @retry(5)
+    @retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
     def _get_current_block_height(self, worker: Session) -> int:
         return self._client.get_block_height(worker)
 
-    @retry(5)
+    @retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
     def _get_block_hash_from_height(self, block_height: int, worker: Session) -> str:
         return self._client.get_block_hash_from_height(worker, block_height)
 
-    @retry(5)
+    def _get_block(self, block_height: int) -> BlockResponse:
+        assert self.toplevel_worker is not None, "Toplevel worker is not set"
+        block_hash = self._get_block_hash_from_height(block_height, self.toplevel_worker)
+        return self._get_block_by_hash(block_hash, self.toplevel_worker)
+
+    @retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
     def _get_block_by_hash(self, block_hash: str, worker: Session) -> BlockResponse:
-        return self._client.get_block_by_hash(worker, block_hash)
+        with STAGES.time("fetch"):
+            raw_block = self._client.get_raw_block_by_hash(worker, block_hash)
+        with STAGES.time("structure"):
+            return self._client.structure_block(raw_block)
 
-    @retry(5)
+    @retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
+    def _get_raw_block_by_hash(self, block_hash: str, worker: Session) -> dict | bytes:
+        with STAGES.time("fetch"):
+            return self._client.get_raw_block_by_hash(worker, block_hash)
+
+    @retry(5, circuit_breaker=NODE_CIRCUIT_BREAKER)
     def _get_network_info(self, worker: Session) -> str:
         return self._client.get_network_info(worker)
 
@@ -197,6 +320,8 @@ class IndexerClient:
         tip_state.sync_state = TipSyncStateChoices.syncing
         tip_state.timestamp = int(time.time())
         tip_state.save()
+        TIP_HEIGHT.set(tip_state.latest_tip_height)
+        LAG_BLOCKS.set(max(tip_state.latest_tip_height - tip_state.latest_indexed_height, 0))
 
     def update_tip_state_idle(self):
         """
@@ -221,6 +346,8 @@ class IndexerClient:
         tip_state.sync_state = TipSyncStateChoices.syncing
         tip_state.timestamp = int(time.time())
         tip_state.save()
+        INDEXED_HEIGHT.set(tip_state.latest_indexed_height)
+        LAG_BLOCKS.set(max(tip_state.latest_tip_height - tip_state.latest_indexed_height, 0))
 
     # Bottom/Prune state managment
     def initialize_bottom_state(self):
@@ -239,13 +366,170 @@ class IndexerClient:
         """
         raise NotImplementedError("Implement the block processing method")
 
+    def process_block_response(self, res_block: BlockResponse) -> BlockProcessorMemory:
+        """
+        Builds the db objects for the block and its transactions, with inputs resolved and
+        source addresses roots calculated
+
+        Args:
+            res_block (BlockResponse): block as returned by the node
+        """
+        raise NotImplementedError("Implement the block response processing method")
+
+    def process_block_response_timed(self, res_block: BlockResponse) -> BlockProcessorMemory:
+        """Same as process_block_response, time of resolving inputs and of hashing is observed separately"""
+        self.last_hash_seconds = 0.0
+        start = time.perf_counter()
+        processed_block = self.process_block_response(res_block)
+        STAGES.observe("resolve", time.perf_counter() - start - self.last_hash_seconds)
+        return processed_block
+
+    def backfill_block(self, block_height: int):
+        """
+        Processes and saves the block without updating the tip state, so blocks can be saved out of order
+
+        Args:
+            block_height (int): height of the block to process
+        """
+        self.save_processed_block(block_height, self.process_block_response_timed(self._get_block(block_height)), False)
+
+    def is_catching_up(self, block_height: int) -> bool:
+        """Whether the block is far enough behind the tip to be committed in a batch with the following blocks"""
+        lag_blocks = self.instance_config.CATCH_UP_LAG_BLOCKS
+        return lag_blocks > 0 and self.latest_tip_block_height - block_height >= lag_blocks
+
+    def write_processed_block(self, block_height: int, processed_block: BlockProcessorMemory):
+        """
+        Saves the processed block, blocks are committed in batches while indexing is far behind the tip
+
+        A batch is committed once it reaches CATCH_UP_BATCH_ROWS rows, it is older than CATCH_UP_BATCH_SECONDS
+        or the lag drops below CATCH_UP_LAG_BLOCKS, from there on every block is committed separately.
+        """
+        if len(self.pending_blocks) == 0:
+            self.pending_since = time.time()
+        self.pending_blocks.append((block_height, processed_block))
+        self.pending_rows += (
+            1
+            + len(processed_block.tx)
+            + len(processed_block.vins_cb)
+            + len(processed_block.vins)
+            + len(processed_block.vouts)
+        )
+        if (
+            not self.is_catching_up(block_height)
+            or self.pending_rows >= self.instance_config.CATCH_UP_BATCH_ROWS
+            or time.time() - self.pending_since >= self.instance_config.CATCH_UP_BATCH_SECONDS
+        ):
+            self.flush_processed_blocks()
+
+    def flush_processed_blocks(self):
+        """Commits pending processed blocks in a single db transaction"""
+        if len(self.pending_blocks) == 0:
+            return
+        pending_blocks = self.pending_blocks
+        self.pending_blocks = []
+        self.pending_rows = 0
+        self.save_processed_blocks(pending_blocks)
+        self.latest_indexed_block_height = pending_blocks[-1][0]
+        if len(pending_blocks) > 1:
+            logger.info("Committed blocks %s - %s in a single transaction", pending_blocks[0][0], pending_blocks[-1][0])
+
+    def save_processed_block(
+        self, block_height: int, processed_block: BlockProcessorMemory, update_tip_state: bool = True
+    ):
+        """
+        Saves the processed block to db and updates the tip state in a single db transaction
+
+        Args:
+            block_height (int): height of the processed block
+            processed_block (BlockProcessorMemory): db objects built by process_block_response
+            update_tip_state (bool): whether to mark the block as latest indexed block in tip state
+        """
+        self.save_processed_blocks([(block_height, processed_block)], update_tip_state)
+
+    def save_processed_blocks(
+        self, processed_blocks: list[tuple[int, BlockProcessorMemory]], update_tip_state: bool = True
+    ):
+        """
+        Saves consecutive processed blocks to db and updates the tip state to the last one in a single db transaction
+
+        Args:
+            processed_blocks (list[tuple[int, BlockProcessorMemory]]): block heights with their processed blocks
+            update_tip_state (bool): whether to mark the last block as latest indexed block in tip state
+        """
+        blocks = []
+        for block_height, processed_block in processed_blocks:
+            assert processed_block.block is not None, "Processed block is missing the block object"
+            blocks.append(processed_block.block)
+            self.ensure_partitions(block_height)
+        write = DB_WRITERS[self.instance_config.DB_WRITER]
+        with STAGES.time("write"), transaction.atomic():
+            write(UtxoTransaction, [tx for _, processed_block in processed_blocks for tx in processed_block.tx])
+            write(
+                TransactionInputCoinbase,
+                [vin for _, processed_block in processed_blocks for vin in processed_block.vins_cb],
+            )
+            write(TransactionInput, [vin for _, processed_block in processed_blocks for vin in processed_block.vins])
+            write(
+                TransactionOutput, [vout for _, processed_block in processed_blocks for vout in processed_block.vouts]
+            )
+            write(UtxoBlock, blocks)
+            if update_tip_state:
+                self.update_tip_state_done_block_process(processed_blocks[-1][0])
+
+        for _, processed_block in processed_blocks:
+            BLOCKS_INDEXED.inc()
+            TRANSACTIONS_INDEXED.inc(len(processed_block.tx))
+            INPUTS_INDEXED.inc(len(processed_block.vins) + len(processed_block.vins_cb))
+
+    def ensure_partitions(self, block_height: int):
+        """
+        Creates partitions of block tables ahead of the given block height
+
+        Partitions for the next PARTITIONS_AHEAD partitions are created once the block height gets within
+        one partition of the last created partition.
+        """
+        partition_size = self.instance_config.PARTITION_SIZE_BLOCKS
+        if block_height + partition_size < self.partitioned_up_to_height:
+            return
+
+        up_to_height = (block_height // partition_size + self.instance_config.PARTITIONS_AHEAD + 1) * partition_size
+        with transaction.atomic():
+            # Backfill processes can create partitions concurrently
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('utxo_indexer_partitions'))")
+            created = create_block_partitions(block_height, up_to_height, partition_size)
+        if len(created) > 0:
+            logger.info("Created partitions: %s", ", ".join(created))
+        self.partitioned_up_to_height = up_to_height
+
     def update_source_addresses_root_from_tx_data(self, processed_transaction: PostProcessingMemoryElement):
-        transaction_id = processed_transaction.obj.transaction_id
-        if len(processed_transaction.cbi) > 0 and len(processed_transaction.inp) > 0:
-            raise Exception(f"Cant have a combination of coinbase and regular inputs on tx {transaction_id}")
-        if len(processed_transaction.cbi) > 0:
-            processed_transaction.obj.update_source_addresses_root_cb(processed_transaction.cbi)
-        elif len(processed_transaction.inp) > 0:
-            processed_transaction.obj.update_source_addresses_root(processed_transaction.inp)
-        else:
-            raise Exception(f"Transaction has no inputs: {transaction_id}")
+        self.update_source_addresses_roots([processed_transaction])
+
+    def update_source_addresses_roots(self, processed_transactions: typing.Iterable[PostProcessingMemoryElement]):
+        """
+        Computes source addresses roots of all processed transactions of a block in one pass
+        - Coinbase transactions get the constant coinbase root
+        - Leaves of input addresses are taken from the address hasher cache
+        """
+        start = time.perf_counter()
+        regular_transactions: list[UtxoTransaction] = []
+        transactions_addresses: list[list[str | None]] = []
+        for processed_transaction in processed_transactions:
+            transaction_id = processed_transaction.obj.transaction_id
+            if len(processed_transaction.cbi) > 0 and len(processed_transaction.inp) > 0:
+                raise Exception(f"Cant have a combination of coinbase and regular inputs on tx {transaction_id}")
+            if len(processed_transaction.cbi) > 0:
+                processed_transaction.obj.source_addresses_root = COINBASE_SOURCE_ADDRESS_ROOT
+            elif len(processed_transaction.inp) > 0:
+                regular_transactions.append(processed_transaction.obj)
+                transactions_addresses.append([tinp.script_key_address or None for tinp in processed_transaction.inp])
+            else:
+                raise Exception(f"Transaction has no inputs: {transaction_id}")
+
+        roots = self.address_hasher.source_addresses_roots(transactions_addresses)
+        for tx, root in zip(regular_transactions, roots):
+            tx.source_addresses_root = root
+
+        self.last_hash_seconds = time.perf_counter() - start
+        STAGES.observe("hash", self.last_hash_seconds)
@@ -0,0 +1,110 @@
+import logging
+import threading
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Iterable, Sequence
+
+from attrs import frozen
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Interval in which blocked stages check whether the pipeline was stopped
+POLL_INTERVAL = 0.1
+
+
+class _Done:
+    """Marks the end of the input stream"""
+
+
+@frozen
+class _Failure:
+    error: Exception
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages, each stage in its own thread, with bounded queues between them.
+    - Stages: functions that transform the output of the previous stage into the input of the next one
+    - Depth: maximum number of items waiting between two consecutive stages
+
+    Every stage is a single thread, so items leave the pipeline in the same order as they entered it.
+    The sink is called in the thread that runs the pipeline. If any stage fails, the pipeline is stopped
+    and the error is reraised in that thread.
+    """
+
+    def __init__(self, stages: Sequence[Callable[[Any], Any]], depth: int) -> None:
+        assert len(stages) > 0, "Pipeline needs at least one stage"
+        assert depth > 0, "Pipeline depth should be positive"
+        self.stages = stages
+        self.depth = depth
+        self._stop = threading.Event()
+
+    def _put(self, queue: Queue, item: Any) -> None:
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=POLL_INTERVAL)
+                return
+            except Full:
+                continue
+        raise PipelineStopped()
+
+    def _get(self, queue: Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+        raise PipelineStopped()
+
+    def _feed(self, items: Iterable[Any], output: Queue) -> None:
+        try:
+            for item in items:
+                self._put(output, item)
+            self._put(output, _Done())
+        except PipelineStopped:
+            pass
+
+    def _work(self, stage: Callable[[Any], Any], input: Queue, output: Queue) -> None:
+        try:
+            while True:
+                item = self._get(input)
+                if isinstance(item, _Done | _Failure):
+                    self._put(output, item)
+                    return
+                try:
+                    result = stage(item)
+                except Exception as e:
+                    self._put(output, _Failure(e))
+                    return
+                self._put(output, result)
+        except PipelineStopped:
+            pass
+        finally:
+            # Stages may use the database, close the connections opened by this thread
+            connections.close_all()
+
+    def run(self, items: Iterable[Any], sink: Callable[[Any], None]) -> None:
+        queues: list[Queue] = [Queue(maxsize=self.depth) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            threads.append(threading.Thread(target=self._work, args=(stage, queues[i], queues[i + 1]), daemon=True))
+
+        self._stop.clear()
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if isinstance(item, _Done):
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                sink(item)
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
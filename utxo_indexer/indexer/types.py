@@ -4,12 +4,14 @@ from utxo_indexer.models import (
     TransactionInput,
     TransactionInputCoinbase,
     TransactionOutput,
+    UtxoBlock,
     UtxoTransaction,
 )
 
 
 @define
 class BlockProcessorMemory:
+    block: UtxoBlock | None = None
     tx: list[UtxoTransaction] = field(factory=list)
     vins: list[TransactionInput] = field(factory=list)
     vins_cb: list[TransactionInputCoinbase] = field(factory=list)
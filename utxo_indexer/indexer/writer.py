@@ -0,0 +1,45 @@
+from typing import Callable, Sequence
+
+from django.db import connection, models
+from django.db.models.fields import AutoFieldMixin
+
+# Writes objects of a single model to db, must be called within an atomic block
+DbWriter = Callable[[type[models.Model], Sequence[models.Model]], None]
+
+
+def bulk_create_writer(model: type[models.Model], objects: Sequence[models.Model]) -> None:
+    model.objects.bulk_create(objects, batch_size=999)
+
+
+def _copy_fields(model: type[models.Model]) -> list[models.Field]:
+    # Auto generated primary keys are left to the db
+    return [field for field in model._meta.concrete_fields if not isinstance(field, AutoFieldMixin)]
+
+
+def _copy_type(field: models.Field) -> str:
+    # Binary copy needs type names without modifiers, e.g. varchar instead of varchar(64)
+    db_type = field.db_type(connection)
+    assert db_type is not None, f"Field {field.name} has no db type"
+    return db_type.split("(")[0]
+
+
+def copy_writer(model: type[models.Model], objects: Sequence[models.Model]) -> None:
+    """Streams objects into the model's table with binary COPY FROM STDIN, without per row INSERT statements"""
+    if len(objects) == 0:
+        return
+
+    fields = _copy_fields(model)
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    statement = f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN (FORMAT BINARY)"
+
+    with connection.cursor() as cursor:
+        with cursor.copy(statement) as copy:
+            copy.set_types([_copy_type(field) for field in fields])
+            for obj in objects:
+                copy.write_row([field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields])
+
+
+DB_WRITERS: dict[str, DbWriter] = {
+    "copy": copy_writer,
+    "bulk_create": bulk_create_writer,
+}
@@ -0,0 +1,28 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from utxo_indexer.indexer.backfill import backfill_block_range
+
+
+class Command(BaseCommand):
+    help = "Indexes a historical block range with a pool of worker processes"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--from-block", "-f", type=int, required=True)
+        parser.add_argument("--to-block", "-t", type=int, required=True)
+        parser.add_argument("--processes", "-p", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--shard-size", "-s", type=int, default=100)
+
+    def handle(self, *args, **options):
+        from_block = options["from_block"]
+        to_block = options["to_block"]
+
+        start = time.time()
+        latest_indexed_height = backfill_block_range(from_block, to_block, options["processes"], options["shard_size"])
+        print(
+            f"Backfilled block range ({from_block} - {to_block}) in: ",
+            time.time() - start,
+            f"latest indexed height: {latest_indexed_height}",
+        )
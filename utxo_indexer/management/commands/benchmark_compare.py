@@ -0,0 +1,144 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from utxo_indexer.benchmarking import (
+    DEFAULT_RESULTS_DIR,
+    BenchmarkStore,
+    Comparison,
+    compare_samples,
+    min_test_samples,
+)
+
+KINDS = ("indexer", "hot_paths")
+
+# Values of indexer runs that are compared, with whether higher is better
+INDEXER_RUN_VALUES = {
+    "blocks_per_second": True,
+    "transactions_per_second": True,
+    "inputs_per_second": True,
+    "peak_rss_mb": False,
+}
+
+
+def _run_kind(run: dict) -> str:
+    return "hot_paths" if "benchmarks" in run else "indexer"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares benchmark runs of two commits (saved with --save of benchmark_indexer and benchmark_hot_paths) "
+        "or two result files, and exits with an error if any value is significantly worse in head. "
+        "A slowdown is flagged if it is larger than the threshold and the noise of the runs and the rank test "
+        "of the samples is significant. Throughput and memory are sampled once per run, the rank test of the "
+        "default alpha needs at least 5 runs of each commit, with fewer runs only slowdowns over twice the "
+        "threshold are flagged."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("base", help="Commit hash of saved runs or path of a result file")
+        parser.add_argument("head", help="Commit hash of saved runs or path of a result file")
+        parser.add_argument("--kind", choices=KINDS, help="Compare only runs of one benchmark")
+        parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR, help="Directory of saved runs")
+        parser.add_argument("--threshold", type=float, default=0.05, help="Smallest relative slowdown that is flagged")
+        parser.add_argument("--alpha", type=float, default=0.01, help="Significance level of the rank test")
+        parser.add_argument(
+            "--noise-factor", type=float, default=3.0, help="Slowdowns within this many relative spreads are noise"
+        )
+
+    def handle(self, *args, **options):
+        store = BenchmarkStore(options["results_dir"])
+        kinds = [options["kind"]] if options["kind"] is not None else list(KINDS)
+
+        comparisons: list[Comparison] = []
+        for kind in kinds:
+            base_runs = self.load_runs(store, options["base"], kind)
+            head_runs = self.load_runs(store, options["head"], kind)
+            if len(base_runs) == 0 or len(head_runs) == 0:
+                continue
+            print(f"{kind}: {len(base_runs)} base runs, {len(head_runs)} head runs")
+            if kind == "hot_paths":
+                pairs = self.hot_path_samples(base_runs, head_runs)
+            else:
+                pairs = self.indexer_samples(base_runs, head_runs)
+            for name, (base, head, higher_is_better) in pairs.items():
+                comparison = compare_samples(
+                    f"{kind}.{name}",
+                    base,
+                    head,
+                    higher_is_better,
+                    options["threshold"],
+                    options["alpha"],
+                    options["noise_factor"],
+                )
+                comparisons.append(comparison)
+                self.print_comparison(comparison)
+
+        if len(comparisons) == 0:
+            raise CommandError(f"No runs of the same benchmark found for {options['base']} and {options['head']}")
+        untested = [comparison.name for comparison in comparisons if not comparison.tested]
+        if len(untested) > 0:
+            print(
+                f"Warning: {len(untested)} values have too few samples for the rank test at alpha {options['alpha']} "
+                f"(at least {min_test_samples(options['alpha'])} samples of base and head are needed), "
+                f"only slowdowns over twice the threshold are flagged: {', '.join(untested)}"
+            )
+        regressions = [comparison for comparison in comparisons if comparison.regression]
+        if len(regressions) > 0:
+            raise CommandError(
+                f"{len(regressions)} regressions: " + ", ".join(comparison.name for comparison in regressions)
+            )
+        print(f"No regressions in {len(comparisons)} compared values, {len(untested)} of them untested")
+
+    def load_runs(self, store: BenchmarkStore, ref: str, kind: str) -> list[dict]:
+        if Path(ref).is_file():
+            with open(ref) as f:
+                data = json.load(f)
+            runs = data if isinstance(data, list) else [data]
+            return [run for run in runs if _run_kind(run) == kind]
+        return store.load(ref, kind)
+
+    def hot_path_samples(self, base_runs: list[dict], head_runs: list[dict]) -> dict:
+        if base_runs[0]["inputs"] != head_runs[0]["inputs"]:
+            print(f"Warning: inputs differ, base {base_runs[0]['inputs']}, head {head_runs[0]['inputs']}")
+        samples = {}
+        for name in base_runs[0]["benchmarks"]:
+            base = [s for run in base_runs if name in run["benchmarks"] for s in run["benchmarks"][name]["samples_ns"]]
+            head = [s for run in head_runs if name in run["benchmarks"] for s in run["benchmarks"][name]["samples_ns"]]
+            if len(base) > 0 and len(head) > 0:
+                samples[name] = (base, head, False)
+        return samples
+
+    def indexer_samples(self, base_runs: list[dict], head_runs: list[dict]) -> dict:
+        if (base_runs[0]["from_block"], base_runs[0]["to_block"]) != (
+            head_runs[0]["from_block"],
+            head_runs[0]["to_block"],
+        ):
+            print("Warning: runs indexed different block ranges")
+        # Every block is a sample of latency, throughput is only sampled once per run
+        samples = {
+            "block_latency": (
+                [latency for run in base_runs for latency in run["block_latencies_seconds"]],
+                [latency for run in head_runs for latency in run["block_latencies_seconds"]],
+                False,
+            )
+        }
+        for name, higher_is_better in INDEXER_RUN_VALUES.items():
+            samples[name] = ([run[name] for run in base_runs], [run[name] for run in head_runs], higher_is_better)
+        for stage in base_runs[0]["stage_seconds"]:
+            base = [run["stage_seconds"][stage] for run in base_runs if stage in run["stage_seconds"]]
+            head = [run["stage_seconds"][stage] for run in head_runs if stage in run["stage_seconds"]]
+            if len(base) > 0 and len(head) > 0:
+                samples[f"stage_seconds.{stage}"] = (base, head, False)
+        return samples
+
+    def print_comparison(self, comparison: Comparison) -> None:
+        p_value = "n/a" if comparison.p_value is None else f"{comparison.p_value:.4f}"
+        status = "REGRESSION" if comparison.regression else "ok"
+        if not comparison.tested:
+            status += " (untested)"
+        print(
+            f"  {comparison.name}: {comparison.base:.6g} -> {comparison.head:.6g} "
+            f"(slowdown {comparison.slowdown:+.1%}, noise {comparison.noise:.1%}, p {p_value}) {status}"
+        )
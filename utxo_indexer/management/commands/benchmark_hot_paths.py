@@ -0,0 +1,63 @@
+import logging
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from utxo_indexer.benchmarking import DEFAULT_RESULTS_DIR, BenchmarkStore, write_report
+from utxo_indexer.microbenchmarks import MICROBENCHMARKS, HotPathInputs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures functions that run once per transaction, input or output (payment reference extraction, "
+        "source addresses roots, model objects from node responses, client normalizers). "
+        "Inputs are the blocks recorded for tests, or all transactions of a mock node fixture directory."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--fixture-dir", help="Fixture directory of the mock node to draw inputs from")
+        parser.add_argument("--repeat", "-r", type=int, default=7, help="Number of measurements of every function")
+        parser.add_argument("--scale", type=float, default=1.0, help="Multiplier of the number of calls")
+        parser.add_argument("--filter", "-k", default="", help="Only run benchmarks with this text in the name")
+        parser.add_argument("--output", "-o", help="Path of the json results")
+        parser.add_argument("--save", action="store_true", help="Save the results with runs of the current commit")
+        parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR, help="Directory of saved runs")
+
+    def handle(self, *args, **options):
+        if options["fixture_dir"] is not None:
+            inputs = HotPathInputs.from_fixture_dir(options["fixture_dir"])
+        else:
+            inputs = HotPathInputs.recorded()
+
+        results = {}
+        for benchmark in MICROBENCHMARKS:
+            if options["filter"] not in benchmark.name:
+                continue
+            result = benchmark.run(inputs, options["repeat"], options["scale"])
+            if result is None:
+                print(f"{benchmark.name}: skipped, no inputs")
+                continue
+            results[benchmark.name] = result
+            print(
+                f"{benchmark.name}: {result['median_ns'] / 1000:.2f} us per call "
+                f"(best {result['best_ns'] / 1000:.2f} us, stdev {result['stdev_ns'] / 1000:.2f} us, "
+                f"{result['calls']} calls x {options['repeat']})"
+            )
+
+        report = {
+            "commit": settings.PROJECT_COMMIT_HASH,
+            "python": platform.python_version(),
+            "repeat": options["repeat"],
+            "scale": options["scale"],
+            "inputs": inputs.sizes(),
+            "benchmarks": results,
+        }
+        if options["output"] is not None:
+            write_report(options["output"], report)
+            logger.info("Results written to %s", options["output"])
+        if options["save"]:
+            path = BenchmarkStore(options["results_dir"]).save(settings.PROJECT_COMMIT_HASH, "hot_paths", report)
+            logger.info("Run saved to %s", path)
@@ -0,0 +1,217 @@
+import logging
+import time
+
+import attrs
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from client.btc_client import BtcClient
+from client.doge_client import DogeClient
+from configuration.config import config
+from configuration.types import Config
+from utxo_indexer.benchmarking import (
+    DEFAULT_RESULTS_DIR,
+    BenchmarkStore,
+    latency_summary,
+    peak_rss_mb,
+    write_report,
+)
+from utxo_indexer.indexer.bitcoin import BtcIndexerClient
+from utxo_indexer.indexer.doge import DogeIndexerClient
+from utxo_indexer.indexer.indexer_client import IndexerClient
+from utxo_indexer.indexer.types import BlockProcessorMemory
+from utxo_indexer.metrics import STAGES
+from utxo_indexer.mock_node import MockNode, MockNodeData, MockNodeServer
+from utxo_indexer.models import UtxoBlock
+
+logger = logging.getLogger(__name__)
+
+# Config values that change indexing throughput, reported with the results
+REPORTED_CONFIG = (
+    "NUMBER_OF_WORKERS",
+    "PREFETCH_DEPTH",
+    "RPC_BATCH_SIZE",
+    "UTXO_CACHE_SIZE_MB",
+    "ADDRESS_HASH_CACHE_SIZE",
+    "DB_WRITER",
+    "BLOCK_FORMAT",
+    "JSON_DECODER",
+    "RPC_ENGINE",
+    "RPC_MAX_IN_FLIGHT",
+    "RPC_CONCURRENCY_MAX",
+    "CATCH_UP_LAG_BLOCKS",
+    "CATCH_UP_BATCH_ROWS",
+)
+
+
+def node_client(instance_config: Config) -> BtcClient | DogeClient:
+    """Node client of the benchmarked source, configured the same way as the indexer's default client"""
+    if instance_config.SOURCE_NAME == "btc":
+        return BtcClient(instance_config.NODE_RPC_URL, json_decoder=instance_config.JSON_DECODER)
+    return DogeClient(
+        instance_config.NODE_RPC_URL,
+        block_format=instance_config.BLOCK_FORMAT,
+        json_decoder=instance_config.JSON_DECODER,
+    )
+
+
+class BlockRecorder:
+    """Records time between written blocks and sizes of written blocks"""
+
+    def __init__(self, indexer: IndexerClient) -> None:
+        self.latencies: list[float] = []
+        self.transactions = 0
+        self.inputs = 0
+        self._write_processed_block = indexer.write_processed_block
+        self._last = time.perf_counter()
+        indexer.write_processed_block = self.write_processed_block
+
+    def write_processed_block(self, block_height: int, processed_block: BlockProcessorMemory) -> None:
+        self._write_processed_block(block_height, processed_block)
+        now = time.perf_counter()
+        self.latencies.append(now - self._last)
+        self._last = now
+        self.transactions += len(processed_block.tx)
+        self.inputs += len(processed_block.vins) + len(processed_block.vins_cb)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures end-to-end indexing throughput of the configured indexer against a local fixture source. "
+        "Blocks are served by a mock node started in process from a fixture directory (see mock_node and "
+        "generate_chain), or by a node at --node-url. Indexed blocks are written to db, so run it against "
+        "an empty database (e.g. after manage.py flush on a local db)."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        node = parser.add_mutually_exclusive_group(required=True)
+        node.add_argument("--fixture-dir", help="Fixture directory served by an in-process mock node")
+        node.add_argument("--node-url", help="Url of a running (mock) node, e.g. started with manage.py mock_node")
+        parser.add_argument("--source", choices=["btc", "doge"], default=config.SOURCE_NAME)
+        parser.add_argument("--from-block", "-f", type=int, help="Defaults to the lowest fixture block")
+        parser.add_argument("--to-block", "-t", type=int, help="Defaults to the node tip")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency injected by the mock node")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Jitter injected by the mock node")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="503 rate injected by the mock node")
+        parser.add_argument("--output", "-o", help="Path of the json report")
+        parser.add_argument("--save", action="store_true", help="Save the report with runs of the current commit")
+        parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR, help="Directory of saved runs")
+
+    def handle(self, *args, **options):
+        if UtxoBlock.objects.exists():
+            raise CommandError("Database already has indexed blocks, benchmark needs an empty database")
+
+        server = None
+        node_url = options["node_url"]
+        from_block = options["from_block"]
+        if options["fixture_dir"] is not None:
+            data = MockNodeData.from_directory(options["fixture_dir"])
+            node = MockNode(
+                data,
+                latency=options["latency_ms"] / 1000,
+                jitter=options["jitter_ms"] / 1000,
+                error_rate=options["error_rate"],
+                seed=0,
+            )
+            server = MockNodeServer(node)
+            node_url = server.start()
+            if from_block is None:
+                from_block = min(data.blocks)
+        elif from_block is None:
+            raise CommandError("--from-block is required with --node-url")
+
+        try:
+            report = self.benchmark(options["source"], node_url, from_block, options["to_block"])
+        finally:
+            if server is not None:
+                server.stop()
+        if server is not None:
+            report["node"] = server.node.stats()
+
+        self.print_report(report)
+        if options["output"] is not None:
+            write_report(options["output"], report)
+            logger.info("Report written to %s", options["output"])
+        if options["save"]:
+            path = BenchmarkStore(options["results_dir"]).save(settings.PROJECT_COMMIT_HASH, "indexer", report)
+            logger.info("Run saved to %s", path)
+
+    def benchmark(self, source: str, node_url: str, from_block: int, to_block: int | None) -> dict:
+        instance_config = attrs.evolve(
+            config,
+            SOURCE_NAME=source,
+            NODE_RPC_URL=node_url,
+            INITIAL_BLOCK_HEIGHT=from_block - 1,
+            NUMBER_OF_BLOCK_CONFIRMATIONS=0,
+            PRUNE_KEEP_DAYS=0,
+        )
+        client = node_client(instance_config)
+        indexer: IndexerClient
+        if isinstance(client, BtcClient):
+            indexer = BtcIndexerClient(client, 600, instance_config)
+        else:
+            indexer = DogeIndexerClient(client, 60, instance_config)
+
+        assert indexer.toplevel_worker is not None, "Toplevel worker should be connected"
+        tip = indexer._get_current_block_height(indexer.toplevel_worker)
+        to_block = tip if to_block is None else to_block
+        # Same state as in the indexing loop, so blocks far from the tip are committed in batches
+        indexer.update_tip_state_indexing(tip)
+        indexer.latest_tip_block_height = tip
+
+        recorder = BlockRecorder(indexer)
+        stages_before = STAGES.snapshot()
+        start = time.perf_counter()
+        indexer.process_block_range(from_block, to_block)
+        seconds = time.perf_counter() - start
+        stages = {
+            stage: total - stages_before.get(stage, 0.0)
+            for stage, total in STAGES.snapshot().items()
+            if total > stages_before.get(stage, 0.0)
+        }
+        indexer.close()
+
+        blocks = len(recorder.latencies)
+        return {
+            "commit": settings.PROJECT_COMMIT_HASH,
+            "source": source,
+            "from_block": from_block,
+            "to_block": to_block,
+            "blocks": blocks,
+            "transactions": recorder.transactions,
+            "inputs": recorder.inputs,
+            "seconds": seconds,
+            "blocks_per_second": blocks / seconds,
+            "transactions_per_second": recorder.transactions / seconds,
+            "inputs_per_second": recorder.inputs / seconds,
+            "block_latency_seconds": latency_summary(recorder.latencies),
+            "block_latencies_seconds": recorder.latencies,
+            "stage_seconds": stages,
+            "peak_rss_mb": peak_rss_mb(),
+            "config": {name: getattr(instance_config, name) for name in REPORTED_CONFIG},
+        }
+
+    def print_report(self, report: dict) -> None:
+        latency = report["block_latency_seconds"]
+        print(
+            f"Indexed {report['blocks']} {report['source']} blocks ({report['from_block']} - {report['to_block']}) "
+            f"in {report['seconds']:.2f} s"
+        )
+        print(
+            f"Throughput: {report['blocks_per_second']:.2f} blocks/s, "
+            f"{report['transactions_per_second']:.1f} tx/s, {report['inputs_per_second']:.1f} inputs/s"
+        )
+        print(
+            f"Block latency: p50 {latency['p50'] * 1000:.1f} ms, p95 {latency['p95'] * 1000:.1f} ms, "
+            f"p99 {latency['p99'] * 1000:.1f} ms, max {latency['max'] * 1000:.1f} ms"
+        )
+        # Stages overlap when blocks are pipelined, so shares are of the total stage time
+        total = sum(report["stage_seconds"].values()) or 1.0
+        print(
+            "Stages: "
+            + ", ".join(
+                f"{stage} {seconds:.2f} s ({seconds / total:.0%})"
+                for stage, seconds in sorted(report["stage_seconds"].items(), key=lambda item: -item[1])
+            )
+        )
+        print(f"Peak RSS: {report['peak_rss_mb']:.1f} MB")
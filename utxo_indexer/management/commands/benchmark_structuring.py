@@ -0,0 +1,53 @@
+import json
+import timeit
+from functools import partial
+
+import cattrs
+from django.core.management.base import BaseCommand, CommandParser
+
+from client.btc_client import BtcClient
+from client.doge_client import DogeClient
+from utxo_indexer.models.converter import structure_block
+from utxo_indexer.models.types import BlockResponse
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares structuring of recorded blocks with the generic cattrs.structure and with the precompiled converter. "
+        "Blocks are recorded as the result of getblock (verbosity 3 for btc, 2 for doge) saved to a json file."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("block_files", nargs="+")
+        parser.add_argument("--source", choices=["btc", "doge"], default="btc")
+        parser.add_argument("--number", "-n", type=int, default=5, help="Number of runs in a single measurement")
+        parser.add_argument("--repeat", "-r", type=int, default=5, help="Number of measurements, best one is reported")
+
+    def handle(self, *args, **options):
+        client = BtcClient("") if options["source"] == "btc" else DogeClient("")
+        number = options["number"]
+        repeat = options["repeat"]
+
+        for block_file in options["block_files"]:
+            with open(block_file) as f:
+                block = json.load(f, parse_float=str)
+            # Recorded blocks can be saved as a whole json-rpc response
+            block = block.get("result", block)
+            # Both paths structure the same normalized block
+            for tx in block["tx"]:
+                if isinstance(client, BtcClient):
+                    client._check_address_reqSigs(tx)
+                else:
+                    client._check_address_reqSigs_prevout(tx)
+
+            if structure_block(block) != cattrs.structure(block, BlockResponse):
+                raise Exception(f"Converters returned different blocks for {block_file}")
+
+            generic = min(timeit.repeat(partial(cattrs.structure, block, BlockResponse), number=number, repeat=repeat))
+            precompiled = min(timeit.repeat(partial(structure_block, block), number=number, repeat=repeat))
+            print(
+                f"{block_file} ({len(block['tx'])} transactions): "
+                f"cattrs.structure {generic / number * 1000:.2f} ms, "
+                f"precompiled {precompiled / number * 1000:.2f} ms, "
+                f"speedup {generic / precompiled:.2f}x"
+            )
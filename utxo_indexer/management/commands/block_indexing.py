@@ -1,9 +1,15 @@
 from django.core.management.base import BaseCommand
 
+from configuration.config import config
 from utxo_indexer.indexer import get_indexer_client
+from utxo_indexer.metrics import start_metrics_server
 
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
+        start_metrics_server(config.METRICS_PORT)
         indexer = get_indexer_client()
-        indexer.run()
+        try:
+            indexer.run()
+        finally:
+            indexer.close()
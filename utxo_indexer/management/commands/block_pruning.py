@@ -5,13 +5,9 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 
 from configuration.config import config
-from utxo_indexer.models import (
-    TransactionInput,
-    TransactionInputCoinbase,
-    TransactionOutput,
-    UtxoBlock,
-    UtxoTransaction,
-)
+from utxo_indexer.metrics import PRUNE_CHUNK_SECONDS, PRUNE_CHUNKS, PRUNED_HEIGHT, start_metrics_server
+from utxo_indexer.models import UtxoBlock, UtxoTransaction
+from utxo_indexer.models.partitions import delete_blocks_below, drop_block_partitions_below
 from utxo_indexer.models.sync_state import PruneSyncState
 
 logger = logging.getLogger(__name__)
@@ -19,6 +15,7 @@ logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
+        start_metrics_server(config.METRICS_PORT)
         prune_state = PruneSyncState.instance()
         while True:
             if not config.PRUNE_KEEP_DAYS or config.PRUNE_KEEP_DAYS <= 0:
@@ -38,27 +35,68 @@ class Command(BaseCommand):
                     config.PRUNE_KEEP_DAYS,
                 )
             else:
-                with transaction.atomic():
-                    # objects with fk to transaction first
-                    TransactionInput.objects.filter(transaction_link__timestamp__lt=cutoff).delete()
-                    TransactionInputCoinbase.objects.filter(transaction_link__timestamp__lt=cutoff).delete()
-                    TransactionOutput.objects.filter(transaction_link__timestamp__lt=cutoff).delete()
+                # Median time of blocks never decreases, so all blocks below the first block after cutoff are pruned
+                first_kept_block = UtxoBlock.objects.filter(timestamp__gte=cutoff).order_by("block_number").first()
+                assert first_kept_block is not None, "Latest block is after cutoff"
 
-                    # then others
-                    UtxoBlock.objects.filter(timestamp__lt=cutoff).delete()
-                    UtxoTransaction.objects.filter(timestamp__lt=cutoff).delete()
+                self.prune_below(
+                    prune_state,
+                    first_kept_block.block_number,
+                    config.PRUNE_CHUNK_BLOCKS,
+                    config.PRUNE_CHUNK_PAUSE_SECONDS,
+                )
 
-                    bottom_block = UtxoBlock.objects.order_by("block_number").first()
-                    bottom_block_transaction = UtxoTransaction.objects.order_by("block_number").first()
+                logger.info("Prune finished, sleeping for %s sec", config.PRUNE_INTERVAL_SECONDS)
 
-                    if bottom_block is not None and bottom_block_transaction is not None:
-                        if bottom_block.block_number != bottom_block_transaction.block_number:
-                            raise Exception("Bottom block and bottom transaction block number mismatch while pruning")
+            time.sleep(config.PRUNE_INTERVAL_SECONDS)
 
-                        prune_state.latest_indexed_tail_height = bottom_block.block_number
-                        prune_state.timestamp = now_ts
-                        prune_state.save()
+    def prune_below(self, prune_state: PruneSyncState, block_number: int, chunk_blocks: int, pause_seconds: float):
+        """
+        Prunes all blocks below block_number, walking forward chunk_blocks blocks at a time
 
-                logger.info("Prune finished, sleeping for %s sec", config.PRUNE_INTERVAL_SECONDS)
+        Expired partitions are dropped one transaction at a time, the remaining rows of every chunk are deleted in
+        their own db transaction and the tail height is advanced once it is committed, so locks are held only
+        briefly and progress survives restarts. Partitions left behind by lock timeouts are dropped at the end.
+        """
+        bottom_block = UtxoBlock.objects.order_by("block_number").first()
+        chunk_start = block_number if bottom_block is None else bottom_block.block_number
+        while chunk_start < block_number:
+            chunk_end = min(chunk_start + chunk_blocks, block_number)
+            start_time = time.perf_counter()
+            # Whole partitions below the chunk end are dropped, each in its own short transaction
+            dropped = drop_block_partitions_below(chunk_end)
+            with transaction.atomic():
+                # Rows of the chunk in the partition containing its end and in default partitions are deleted
+                deleted = delete_blocks_below(chunk_end)
+                self.update_prune_state(prune_state)
 
-            time.sleep(config.PRUNE_INTERVAL_SECONDS)
+            if len(dropped) > 0 or deleted > 0:
+                PRUNE_CHUNKS.inc()
+                PRUNE_CHUNK_SECONDS.observe(time.perf_counter() - start_time)
+                logger.info(
+                    "Pruned blocks below %s: dropped partitions: %s, deleted %s rows",
+                    chunk_end,
+                    ", ".join(dropped),
+                    deleted,
+                )
+                if chunk_end < block_number:
+                    time.sleep(pause_seconds)
+            chunk_start = chunk_end
+
+        # Partitions that were not dropped in time for their chunk hold no rows anymore
+        dropped = drop_block_partitions_below(block_number)
+        if len(dropped) > 0:
+            logger.info("Pruned blocks below %s: dropped partitions: %s", block_number, ", ".join(dropped))
+
+    def update_prune_state(self, prune_state: PruneSyncState):
+        bottom_block = UtxoBlock.objects.order_by("block_number").first()
+        bottom_block_transaction = UtxoTransaction.objects.order_by("block_number").first()
+
+        if bottom_block is not None and bottom_block_transaction is not None:
+            if bottom_block.block_number != bottom_block_transaction.block_number:
+                raise Exception("Bottom block and bottom transaction block number mismatch while pruning")
+
+            prune_state.latest_indexed_tail_height = bottom_block.block_number
+            prune_state.timestamp = int(time.time())
+            prune_state.save()
+            PRUNED_HEIGHT.set(bottom_block.block_number)
@@ -0,0 +1,69 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from utxo_indexer.chain_generator import ChainGenerator, ChainProfile
+from utxo_indexer.mock_node import json_amount
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a synthetic chain with configurable block sizes and writes it as fixtures of the mock node. "
+        "Worst case blocks are made with consolidations, payouts, spend chains and OP_RETURN payment references."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        defaults = ChainProfile()
+        parser.add_argument("fixture_dir")
+        parser.add_argument("--source", choices=["btc", "doge"], default="btc")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--start-height", type=int, default=1)
+        parser.add_argument("--blocks", type=int, default=defaults.blocks)
+        parser.add_argument(
+            "--transactions", type=int, nargs=2, default=defaults.transactions, help="Ordinary transactions per block"
+        )
+        parser.add_argument("--inputs", type=int, nargs=2, default=defaults.inputs)
+        parser.add_argument("--outputs", type=int, nargs=2, default=defaults.outputs)
+        parser.add_argument("--consolidations", type=int, default=defaults.consolidations)
+        parser.add_argument("--consolidation-inputs", type=int, default=defaults.consolidation_inputs)
+        parser.add_argument("--payouts", type=int, default=defaults.payouts)
+        parser.add_argument("--payout-outputs", type=int, default=defaults.payout_outputs)
+        parser.add_argument("--spend-chain-length", type=int, default=defaults.spend_chain_length)
+        parser.add_argument("--op-return-share", type=float, default=defaults.op_return_share)
+        parser.add_argument("--addresses", type=int, default=defaults.addresses)
+
+    def handle(self, *args, **options):
+        profile = ChainProfile(
+            blocks=options["blocks"],
+            transactions=tuple(options["transactions"]),
+            inputs=tuple(options["inputs"]),
+            outputs=tuple(options["outputs"]),
+            consolidations=options["consolidations"],
+            consolidation_inputs=options["consolidation_inputs"],
+            payouts=options["payouts"],
+            payout_outputs=options["payout_outputs"],
+            spend_chain_length=options["spend_chain_length"],
+            op_return_share=options["op_return_share"],
+            addresses=options["addresses"],
+        )
+        generator = ChainGenerator(
+            options["source"],
+            profile,
+            start_height=options["start_height"],
+            seed=options["seed"],
+            amount=json_amount,
+        )
+
+        start = time.perf_counter()
+        data = generator.generate_data()
+        data.save(options["fixture_dir"])
+        logger.info(
+            "Generated %s blocks with %s transactions to %s in %.1f s",
+            len(data.blocks),
+            len(data.transactions),
+            options["fixture_dir"],
+            time.perf_counter() - start,
+        )
@@ -0,0 +1,51 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from utxo_indexer.mock_node import MockNode, MockNodeData, MockNodeServer
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves recorded blocks and transactions over JSON-RPC, so clients and indexers can be run offline. "
+        "See utxo_indexer/mock_node.py for the layout of the fixture directory."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("fixture_dir")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8332)
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay of every http request")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random delay added to the latency")
+        parser.add_argument(
+            "--error-rate", type=float, default=0.0, help="Share of http requests answered with 503 (0 to 1)"
+        )
+        parser.add_argument("--seed", type=int, default=None, help="Seed of random latency and errors")
+
+    def handle(self, *args, **options):
+        data = MockNodeData.from_directory(options["fixture_dir"])
+        node = MockNode(
+            data,
+            latency=options["latency_ms"] / 1000,
+            jitter=options["jitter_ms"] / 1000,
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        server = MockNodeServer(node, options["host"], options["port"])
+        logger.info(
+            "Serving %s blocks (heights %s-%s) and %s transactions on %s",
+            len(data.blocks),
+            min(data.blocks),
+            data.tip_height,
+            len(data.transactions),
+            server.url,
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            logger.info("Mock node stopped, %s", node.stats())
@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Iterator
+
+try:
+    import prometheus_client
+except ImportError:  # prometheus_client is only installed with remote requirements
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Block processing stages take from milliseconds (small blocks) up to minutes (catch-up batches)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class NoopMetric:
+    """Stands in for prometheus metrics when prometheus_client is not installed"""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "NoopMetric":
+        return self
+
+    def set(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def time(self) -> ContextManager:
+        return nullcontext()
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Any:
+    if prometheus_client is None:
+        return NoopMetric()
+    return prometheus_client.Gauge(name, documentation, labelnames)
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Any:
+    if prometheus_client is None:
+        return NoopMetric()
+    return prometheus_client.Counter(name, documentation, labelnames)
+
+
+def histogram(
+    name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = STAGE_BUCKETS
+) -> Any:
+    if prometheus_client is None:
+        return NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+class StageTimer:
+    """
+    Observes time spent in block processing stages in the stage histogram
+    Totals per stage are also kept in the process, so benchmarks can report them without prometheus_client
+    """
+
+    def __init__(self, stage_histogram: Any) -> None:
+        self.histogram = stage_histogram
+        self.totals: dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.histogram.labels(stage=stage).observe(seconds)
+        with self._lock:
+            self.totals[stage] += seconds
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self.totals)
+
+
+def start_metrics_server(port: int) -> None:
+    """Serves metrics of the process on the given port, does nothing if the port is 0"""
+    if port <= 0:
+        return
+    if prometheus_client is None:
+        logger.warning("Metrics port is set but prometheus_client is not installed, metrics are not served")
+        return
+    prometheus_client.start_http_server(port)
+    logger.info("Serving metrics on port %s", port)
+
+
+# Indexer, rates (blocks/s, transactions/s, inputs/s) are computed from counters by prometheus
+BLOCKS_INDEXED = counter("utxo_indexer_blocks", "Number of blocks written to db")
+TRANSACTIONS_INDEXED = counter("utxo_indexer_transactions", "Number of transactions written to db")
+INPUTS_INDEXED = counter("utxo_indexer_inputs", "Number of transaction inputs written to db")
+STAGE_SECONDS = histogram(
+    "utxo_indexer_stage_seconds",
+    "Time spent in a block processing stage (fetch, structure, resolve, hash, write)",
+    ("stage",),
+)
+STAGES = StageTimer(STAGE_SECONDS)
+INDEXED_HEIGHT = gauge("utxo_indexer_indexed_height", "Height of the latest indexed block")
+TIP_HEIGHT = gauge("utxo_indexer_tip_height", "Height of the latest block on the node")
+LAG_BLOCKS = gauge("utxo_indexer_lag_blocks", "Number of blocks between the node tip and the latest indexed block")
+RPC_CONCURRENCY_LIMIT = gauge(
+    "utxo_indexer_rpc_concurrency_limit", "Number of prevout requests the adaptive controller allows in flight"
+)
+
+# Pruner
+PRUNED_HEIGHT = gauge("utxo_indexer_pruned_height", "Height of the lowest block kept in db")
+PRUNE_CHUNKS = counter("utxo_indexer_prune_chunks", "Number of pruned chunks of blocks")
+PRUNE_CHUNK_SECONDS = histogram("utxo_indexer_prune_chunk_seconds", "Time spent pruning a chunk of blocks")
@@ -0,0 +1,211 @@
+"""
+Microbenchmarks of functions that run once per transaction, input or output of every indexed block
+
+Inputs are drawn from recorded blocks, so measured functions see realistic scripts, addresses and amounts.
+Number of calls in a measurement depends only on the inputs and the scale, never on the machine,
+so results of different runs on the same inputs are comparable.
+"""
+
+import copy
+import math
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from attrs import define, field, frozen
+
+from client.btc_client import BtcClient
+from client.doge_client import DogeClient
+from utxo_indexer.hashing import address_leaf_hash, merkle_root
+from utxo_indexer.mock_node import MockNodeData
+from utxo_indexer.models import TransactionInput, TransactionOutput, UtxoTransaction
+from utxo_indexer.models.converter import structure_transaction
+from utxo_indexer.models.types import CoinbaseVinResponse, TransactionResponse, VinResponse, VoutResponse
+from utxo_indexer.utils import is_valid_bytes_32_hex, merkle_tree_from_address_strings
+
+_btc_client = BtcClient("")
+_doge_client = DogeClient("")
+
+
+def _has_prevouts(tx: dict) -> bool:
+    return any(vin.get("prevout") is not None for vin in tx["vin"])
+
+
+@define
+class HotPathInputs:
+    """Arguments of the measured functions, drawn from node responses"""
+
+    raw_btc_transactions: list[dict] = field(factory=list)
+    raw_doge_transactions: list[dict] = field(factory=list)
+    transactions: list[TransactionResponse] = field(factory=list)
+    inputs: list[tuple[int, VinResponse, VoutResponse, UtxoTransaction]] = field(factory=list)
+    outputs: list[tuple[VoutResponse, UtxoTransaction]] = field(factory=list)
+    address_lists: list[list[str | None]] = field(factory=list)
+    hex_candidates: list[str] = field(factory=list)
+
+    @classmethod
+    def from_transactions(cls, raw_transactions: list[dict]) -> "HotPathInputs":
+        """
+        Btc shaped transactions (inputs with prevouts) are normalized by the btc client, the rest by the doge client.
+        Prevouts of doge inputs are resolved from the given transactions, unresolved inputs are left out.
+        """
+        inputs = cls()
+        structured: list[tuple[TransactionResponse, dict]] = []
+        for raw_tx in raw_transactions:
+            if _has_prevouts(raw_tx):
+                inputs.raw_btc_transactions.append(raw_tx)
+                tx = structure_transaction(_btc_client._check_address_reqSigs(copy.deepcopy(raw_tx)))
+            else:
+                inputs.raw_doge_transactions.append(raw_tx)
+                tx = structure_transaction(_doge_client._check_address_reqSigs_prevout(copy.deepcopy(raw_tx)))
+            structured.append((tx, raw_tx))
+
+        outputs_by_outpoint = {(tx.txid, vout.n): vout for tx, _ in structured for vout in tx.vout}
+        for tx, _ in structured:
+            inputs.transactions.append(tx)
+            tx_link = UtxoTransaction.object_from_node_response(tx, 0, 0)
+            addresses: list[str | None] = []
+            for vin_n, vin in enumerate(tx.vin):
+                if isinstance(vin, CoinbaseVinResponse):
+                    continue
+                if vin.prevout is not None:
+                    vout = VoutResponse(n=vin.vout, value=vin.prevout.value, scriptPubKey=vin.prevout.scriptPubKey)
+                elif (vin.txid, vin.vout) in outputs_by_outpoint:
+                    vout = outputs_by_outpoint[(vin.txid, vin.vout)]
+                else:
+                    continue
+                inputs.inputs.append((vin_n, vin, vout, tx_link))
+                addresses.append(vout.scriptPubKey.address or None)
+            if len(addresses) > 0:
+                inputs.address_lists.append(addresses)
+            for vout in tx.vout:
+                inputs.outputs.append((vout, tx_link))
+                # Payment references are searched for in OP_RETURN outputs
+                if vout.scriptPubKey.asm.startswith("OP_RETURN"):
+                    inputs.hex_candidates.append(vout.scriptPubKey.hex[4:])
+            inputs.hex_candidates.append(tx.txid)
+        return inputs
+
+    @classmethod
+    def from_fixture_dir(cls, directory: str | Path) -> "HotPathInputs":
+        data = MockNodeData.from_directory(directory)
+        return cls.from_transactions(list(data.transactions.values()))
+
+    @classmethod
+    def recorded(cls) -> "HotPathInputs":
+        """Blocks and transactions recorded from btc and doge nodes for tests"""
+        from utxo_indexer.tests.data_for_testing.testing_process_block_bitcoin_data import block_example_bitcoin_dict
+        from utxo_indexer.tests.data_for_testing.testing_process_block_doge_data import (
+            block_example_doge_dict,
+            tx_example1_doge_dict,
+            tx_example2_doge_dict,
+        )
+
+        return cls.from_transactions(
+            [
+                *block_example_bitcoin_dict["tx"],
+                *block_example_doge_dict["tx"],
+                tx_example1_doge_dict,
+                tx_example2_doge_dict,
+            ]
+        )
+
+    def sizes(self) -> dict[str, int]:
+        return {"transactions": len(self.transactions), "inputs": len(self.inputs), "outputs": len(self.outputs)}
+
+
+@frozen
+class Microbenchmark:
+    """
+    Function measured over a list of argument tuples
+    - Calls: number of calls in a measurement at scale 1, rounded up to whole passes over the arguments
+    - Fresh: arguments are copied before every pass, for functions that normalize their arguments in place
+    """
+
+    name: str
+    func: Callable[..., Any]
+    arguments: Callable[[HotPathInputs], list[tuple]]
+    calls: int = 20_000
+    fresh: bool = False
+
+    def run(self, inputs: HotPathInputs, repeat: int, scale: float = 1.0) -> dict[str, Any] | None:
+        """Returns time per call of every measurement in nanoseconds, None if inputs have no arguments"""
+        arguments = self.arguments(inputs)
+        if len(arguments) == 0:
+            return None
+        passes = max(math.ceil(self.calls * scale / len(arguments)), 1)
+        func = self.func
+
+        samples = []
+        for _ in range(repeat):
+            rounds = [copy.deepcopy(arguments) for _ in range(passes)] if self.fresh else [arguments] * passes
+            start = time.perf_counter()
+            for round_arguments in rounds:
+                for args in round_arguments:
+                    func(*args)
+            samples.append((time.perf_counter() - start) / (passes * len(arguments)) * 1e9)
+
+        return {
+            "calls": passes * len(arguments),
+            "best_ns": min(samples),
+            "median_ns": statistics.median(samples),
+            "stdev_ns": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            "samples_ns": samples,
+        }
+
+
+def _source_addresses_root(addresses: list[str | None]) -> bytes | None:
+    return merkle_root([bytes(32) if address is None else address_leaf_hash(address) for address in addresses])
+
+
+MICROBENCHMARKS = [
+    Microbenchmark(
+        "extract_payment_reference",
+        UtxoTransaction._extract_payment_reference,
+        lambda inputs: [(tx,) for tx in inputs.transactions],
+    ),
+    Microbenchmark(
+        "merkle_tree_from_address_strings",
+        merkle_tree_from_address_strings,
+        lambda inputs: [(addresses,) for addresses in inputs.address_lists],
+        calls=2_000,
+    ),
+    # Engine that computes source addresses roots while indexing, uncached
+    Microbenchmark(
+        "source_addresses_root",
+        _source_addresses_root,
+        lambda inputs: [(addresses,) for addresses in inputs.address_lists],
+        calls=2_000,
+    ),
+    Microbenchmark(
+        "is_valid_bytes_32_hex",
+        is_valid_bytes_32_hex,
+        lambda inputs: [(candidate,) for candidate in inputs.hex_candidates],
+        calls=100_000,
+    ),
+    Microbenchmark(
+        "transaction_input_from_node_response",
+        TransactionInput.object_from_node_response,
+        lambda inputs: inputs.inputs,
+    ),
+    Microbenchmark(
+        "transaction_output_from_node_response",
+        TransactionOutput.object_from_node_response,
+        lambda inputs: inputs.outputs,
+    ),
+    Microbenchmark(
+        "btc_check_address_reqSigs",
+        _btc_client._check_address_reqSigs,
+        lambda inputs: [(tx,) for tx in inputs.raw_btc_transactions],
+        calls=5_000,
+        fresh=True,
+    ),
+    Microbenchmark(
+        "doge_check_address_reqSigs_prevout",
+        _doge_client._check_address_reqSigs_prevout,
+        lambda inputs: [(tx,) for tx in inputs.raw_doge_transactions],
+        calls=5_000,
+        fresh=True,
+    ),
+]
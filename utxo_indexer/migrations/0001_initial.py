@@ -34,10 +34,10 @@ class Migration(migrations.Migration):
         migrations.CreateModel(
             name='UtxoBlock',
             fields=[
-                ('block_hash', utxo_indexer.models.model_utils.HexString32ByteField(max_length=64, primary_key=True, serialize=False)),
+                ('block_hash', utxo_indexer.models.model_utils.HexString32ByteFieldLegacy(max_length=64, primary_key=True, serialize=False)),
                 ('block_number', models.PositiveIntegerField()),
                 ('timestamp', models.PositiveBigIntegerField()),
-                ('previous_block_hash', utxo_indexer.models.model_utils.HexString32ByteField(max_length=64)),
+                ('previous_block_hash', utxo_indexer.models.model_utils.HexString32ByteFieldLegacy(max_length=64)),
                 ('transactions', models.PositiveIntegerField()),
                 ('confirmed', models.BooleanField(default=False)),
             ],
@@ -48,11 +48,11 @@ class Migration(migrations.Migration):
         migrations.CreateModel(
             name='UtxoTransaction',
             fields=[
-                ('transaction_id', utxo_indexer.models.model_utils.HexString32ByteField(max_length=64, primary_key=True, serialize=False)),
+                ('transaction_id', utxo_indexer.models.model_utils.HexString32ByteFieldLegacy(max_length=64, primary_key=True, serialize=False)),
                 ('block_number', models.PositiveIntegerField()),
                 ('timestamp', models.PositiveBigIntegerField()),
-                ('payment_reference', utxo_indexer.models.model_utils.HexString32ByteField(max_length=64, null=True)),
-                ('source_addresses_root', utxo_indexer.models.model_utils.HexString32ByteField(max_length=64)),
+                ('payment_reference', utxo_indexer.models.model_utils.HexString32ByteFieldLegacy(max_length=64, null=True)),
+                ('source_addresses_root', utxo_indexer.models.model_utils.HexString32ByteFieldLegacy(max_length=64)),
                 ('is_native_payment', models.BooleanField(default=False)),
                 ('transaction_type', models.CharField()),
             ],
@@ -99,7 +99,7 @@ class Migration(migrations.Migration):
                 ('script_key_type', models.CharField()),
                 ('script_key_address', models.CharField(max_length=128)),
                 ('vin_n', models.PositiveIntegerField()),
-                ('vin_previous_txid', utxo_indexer.models.model_utils.HexString32ByteField(max_length=64)),
+                ('vin_previous_txid', utxo_indexer.models.model_utils.HexString32ByteFieldLegacy(max_length=64)),
                 ('vin_vout_index', models.PositiveIntegerField()),
                 ('vin_sequence', models.PositiveBigIntegerField()),
                 ('vin_script_sig_asm', models.CharField()),
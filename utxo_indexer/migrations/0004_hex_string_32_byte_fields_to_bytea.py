@@ -0,0 +1,288 @@
+from django.db import migrations
+
+import utxo_indexer.models.model_utils
+
+# Rows updated per statement while copying hashes into the new columns
+BACKFILL_BATCH_ROWS = 10000
+
+# Hash columns of every table, with the primary key the table is walked by
+HASH_COLUMNS = (
+    ("utxo_indexer_utxoblock", "block_hash", ("block_hash", "previous_block_hash")),
+    (
+        "utxo_indexer_utxotransaction",
+        "transaction_id",
+        ("transaction_id", "payment_reference", "source_addresses_root"),
+    ),
+    ("utxo_indexer_transactioninputcoinbase", "id", ("transaction_link_id",)),
+    ("utxo_indexer_transactioninput", "id", ("transaction_link_id", "vin_previous_txid")),
+    ("utxo_indexer_transactionoutput", "id", ("transaction_link_id",)),
+)
+
+ADD_COLUMNS = [
+    f"ALTER TABLE {table} " + ", ".join(f"ADD COLUMN IF NOT EXISTS {column}_bytes bytea" for column in columns)
+    for table, _, columns in HASH_COLUMNS
+]
+
+DROP_COLUMNS = [
+    f"ALTER TABLE {table} " + ", ".join(f"DROP COLUMN IF EXISTS {column}_bytes" for column in columns)
+    for table, _, columns in HASH_COLUMNS
+]
+
+# Indexes of the new columns are built without blocking writes and become the keys and indexes of the
+# swapped columns, index builds that failed half way are dropped first so the migration can be rerun
+NEW_INDEXES = (
+    ("utxo_indexer_utxoblock_block_hash_bytes", "UNIQUE", "utxo_indexer_utxoblock (block_hash_bytes)"),
+    ("utxo_indexer_utxoblock_previous_block_hash_bytes", "", "utxo_indexer_utxoblock (previous_block_hash_bytes)"),
+    (
+        "utxo_indexer_utxotransaction_transaction_id_bytes",
+        "UNIQUE",
+        "utxo_indexer_utxotransaction (transaction_id_bytes)",
+    ),
+    (
+        "utxo_indexer_utxotransaction_payment_reference_bytes",
+        "",
+        "utxo_indexer_utxotransaction (payment_reference_bytes)",
+    ),
+    (
+        "utxo_indexer_utxotransaction_source_addresses_root_bytes",
+        "",
+        "utxo_indexer_utxotransaction (source_addresses_root_bytes)",
+    ),
+    (
+        "utxo_indexer_transactioninputcoinbase_link_bytes",
+        "",
+        "utxo_indexer_transactioninputcoinbase (transaction_link_id_bytes)",
+    ),
+    (
+        "utxo_indexer_transactioninput_link_vin_n_bytes",
+        "UNIQUE",
+        "utxo_indexer_transactioninput (transaction_link_id_bytes, vin_n)",
+    ),
+    ("utxo_indexer_transactioninput_link_bytes", "", "utxo_indexer_transactioninput (transaction_link_id_bytes)"),
+    (
+        "utxo_indexer_transactionoutput_link_n_bytes",
+        "UNIQUE",
+        "utxo_indexer_transactionoutput (transaction_link_id_bytes, n)",
+    ),
+    ("utxo_indexer_transactionoutput_link_bytes", "", "utxo_indexer_transactionoutput (transaction_link_id_bytes)"),
+)
+
+CREATE_INDEXES = [
+    statement
+    for name, unique, definition in NEW_INDEXES
+    for statement in (
+        f"DROP INDEX CONCURRENTLY IF EXISTS {name}",
+        f"CREATE {unique} INDEX CONCURRENTLY {name} ON {definition}",
+    )
+]
+
+DROP_INDEXES = [f"DROP INDEX IF EXISTS {name}" for name, _, _ in NEW_INDEXES]
+
+# Rows written since the backfill are copied, old columns with their keys, foreign keys and indexes are dropped
+# and the new columns take their place. Tables are locked only for the time of the catalog changes and of a scan
+# for the not null columns. Passed as one statement, so it runs in a single transaction.
+SWAP_COLUMNS = """
+UPDATE utxo_indexer_utxoblock
+SET block_hash_bytes = decode(block_hash, 'hex'), previous_block_hash_bytes = decode(previous_block_hash, 'hex')
+WHERE block_hash_bytes IS NULL;
+UPDATE utxo_indexer_utxotransaction
+SET transaction_id_bytes = decode(transaction_id, 'hex'),
+    payment_reference_bytes = decode(payment_reference, 'hex'),
+    source_addresses_root_bytes = decode(source_addresses_root, 'hex')
+WHERE transaction_id_bytes IS NULL;
+UPDATE utxo_indexer_transactioninputcoinbase SET transaction_link_id_bytes = decode(transaction_link_id, 'hex')
+WHERE transaction_link_id_bytes IS NULL;
+UPDATE utxo_indexer_transactioninput
+SET transaction_link_id_bytes = decode(transaction_link_id, 'hex'),
+    vin_previous_txid_bytes = decode(vin_previous_txid, 'hex')
+WHERE transaction_link_id_bytes IS NULL;
+UPDATE utxo_indexer_transactionoutput SET transaction_link_id_bytes = decode(transaction_link_id, 'hex')
+WHERE transaction_link_id_bytes IS NULL;
+
+ALTER TABLE utxo_indexer_transactioninputcoinbase DROP COLUMN transaction_link_id;
+ALTER TABLE utxo_indexer_transactioninput DROP COLUMN transaction_link_id, DROP COLUMN vin_previous_txid;
+ALTER TABLE utxo_indexer_transactionoutput DROP COLUMN transaction_link_id;
+ALTER TABLE utxo_indexer_utxotransaction
+    DROP COLUMN transaction_id, DROP COLUMN payment_reference, DROP COLUMN source_addresses_root;
+ALTER TABLE utxo_indexer_utxoblock DROP COLUMN block_hash, DROP COLUMN previous_block_hash;
+
+ALTER TABLE utxo_indexer_utxoblock RENAME COLUMN block_hash_bytes TO block_hash;
+ALTER TABLE utxo_indexer_utxoblock RENAME COLUMN previous_block_hash_bytes TO previous_block_hash;
+ALTER TABLE utxo_indexer_utxotransaction RENAME COLUMN transaction_id_bytes TO transaction_id;
+ALTER TABLE utxo_indexer_utxotransaction RENAME COLUMN payment_reference_bytes TO payment_reference;
+ALTER TABLE utxo_indexer_utxotransaction RENAME COLUMN source_addresses_root_bytes TO source_addresses_root;
+ALTER TABLE utxo_indexer_transactioninputcoinbase RENAME COLUMN transaction_link_id_bytes TO transaction_link_id;
+ALTER TABLE utxo_indexer_transactioninput RENAME COLUMN transaction_link_id_bytes TO transaction_link_id;
+ALTER TABLE utxo_indexer_transactioninput RENAME COLUMN vin_previous_txid_bytes TO vin_previous_txid;
+ALTER TABLE utxo_indexer_transactionoutput RENAME COLUMN transaction_link_id_bytes TO transaction_link_id;
+
+ALTER TABLE utxo_indexer_utxoblock
+    ADD CONSTRAINT utxo_indexer_utxoblock_pkey PRIMARY KEY USING INDEX utxo_indexer_utxoblock_block_hash_bytes,
+    ALTER COLUMN previous_block_hash SET NOT NULL;
+ALTER TABLE utxo_indexer_utxotransaction
+    ADD CONSTRAINT utxo_indexer_utxotransaction_pkey
+        PRIMARY KEY USING INDEX utxo_indexer_utxotransaction_transaction_id_bytes,
+    ALTER COLUMN source_addresses_root SET NOT NULL;
+ALTER TABLE utxo_indexer_transactioninputcoinbase ALTER COLUMN transaction_link_id SET NOT NULL;
+ALTER TABLE utxo_indexer_transactioninput
+    ADD CONSTRAINT utxo_indexer_transaction_transaction_link_id_vin__76fa36e5_uniq
+        UNIQUE USING INDEX utxo_indexer_transactioninput_link_vin_n_bytes,
+    ALTER COLUMN transaction_link_id SET NOT NULL,
+    ALTER COLUMN vin_previous_txid SET NOT NULL;
+ALTER TABLE utxo_indexer_transactionoutput
+    ADD CONSTRAINT utxo_indexer_transaction_transaction_link_id_n_9c3a0bee_uniq
+        UNIQUE USING INDEX utxo_indexer_transactionoutput_link_n_bytes,
+    ALTER COLUMN transaction_link_id SET NOT NULL;
+
+ALTER INDEX utxo_indexer_utxoblock_previous_block_hash_bytes RENAME TO utxo_indexe_previou_58894c_idx;
+ALTER INDEX utxo_indexer_utxotransaction_payment_reference_bytes RENAME TO utxo_indexe_payment_b900d6_idx;
+ALTER INDEX utxo_indexer_utxotransaction_source_addresses_root_bytes RENAME TO utxo_indexe_source__3782c2_idx;
+ALTER INDEX utxo_indexer_transactioninputcoinbase_link_bytes
+    RENAME TO utxo_indexer_transactionin_transaction_link_id_f4e70dc4;
+ALTER INDEX utxo_indexer_transactioninput_link_bytes
+    RENAME TO utxo_indexer_transactioninput_transaction_link_id_d7290af9;
+ALTER INDEX utxo_indexer_transactionoutput_link_bytes
+    RENAME TO utxo_indexer_transactionoutput_transaction_link_id_84665e8c;
+
+ALTER TABLE utxo_indexer_transactioninputcoinbase
+    ADD CONSTRAINT utxo_indexer_transactioni_transaction_link_id_f4e70dc4_fk FOREIGN KEY (transaction_link_id)
+    REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED NOT VALID;
+ALTER TABLE utxo_indexer_transactioninput
+    ADD CONSTRAINT utxo_indexer_transactioninput_transaction_link_id_d7290af9_fk FOREIGN KEY (transaction_link_id)
+    REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED NOT VALID;
+ALTER TABLE utxo_indexer_transactionoutput
+    ADD CONSTRAINT utxo_indexer_transactionoutput_transaction_link_id_84665e8c_fk FOREIGN KEY (transaction_link_id)
+    REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED NOT VALID;
+"""
+
+# Rolling back converts the columns in place, which rewrites the tables under an exclusive lock
+UNSWAP_COLUMNS = """
+ALTER TABLE utxo_indexer_transactioninputcoinbase
+    DROP CONSTRAINT utxo_indexer_transactioni_transaction_link_id_f4e70dc4_fk;
+ALTER TABLE utxo_indexer_transactioninput
+    DROP CONSTRAINT utxo_indexer_transactioninput_transaction_link_id_d7290af9_fk;
+ALTER TABLE utxo_indexer_transactionoutput
+    DROP CONSTRAINT utxo_indexer_transactionoutput_transaction_link_id_84665e8c_fk;
+
+ALTER TABLE utxo_indexer_utxoblock
+    ALTER COLUMN block_hash TYPE varchar(64) USING encode(block_hash, 'hex'),
+    ALTER COLUMN previous_block_hash TYPE varchar(64) USING encode(previous_block_hash, 'hex');
+ALTER TABLE utxo_indexer_utxotransaction
+    ALTER COLUMN transaction_id TYPE varchar(64) USING encode(transaction_id, 'hex'),
+    ALTER COLUMN payment_reference TYPE varchar(64) USING encode(payment_reference, 'hex'),
+    ALTER COLUMN source_addresses_root TYPE varchar(64) USING encode(source_addresses_root, 'hex');
+ALTER TABLE utxo_indexer_transactioninputcoinbase
+    ALTER COLUMN transaction_link_id TYPE varchar(64) USING encode(transaction_link_id, 'hex');
+ALTER TABLE utxo_indexer_transactioninput
+    ALTER COLUMN transaction_link_id TYPE varchar(64) USING encode(transaction_link_id, 'hex'),
+    ALTER COLUMN vin_previous_txid TYPE varchar(64) USING encode(vin_previous_txid, 'hex');
+ALTER TABLE utxo_indexer_transactionoutput
+    ALTER COLUMN transaction_link_id TYPE varchar(64) USING encode(transaction_link_id, 'hex');
+
+CREATE INDEX utxo_indexer_utxoblock_block_hash_aabce920_like
+    ON utxo_indexer_utxoblock (block_hash varchar_pattern_ops);
+CREATE INDEX utxo_indexer_utxotransaction_transaction_id_7687a44e_like
+    ON utxo_indexer_utxotransaction (transaction_id varchar_pattern_ops);
+CREATE INDEX utxo_indexer_transaction_transaction_link_id_f4e70dc4_like
+    ON utxo_indexer_transactioninputcoinbase (transaction_link_id varchar_pattern_ops);
+CREATE INDEX utxo_indexer_transactioninput_transaction_link_id_d7290af9_like
+    ON utxo_indexer_transactioninput (transaction_link_id varchar_pattern_ops);
+CREATE INDEX utxo_indexer_transaction_transaction_link_id_84665e8c_like
+    ON utxo_indexer_transactionoutput (transaction_link_id varchar_pattern_ops);
+
+ALTER TABLE utxo_indexer_transactioninputcoinbase
+    ADD CONSTRAINT utxo_indexer_transac_transaction_link_id_f4e70dc4_fk_utxo_inde FOREIGN KEY (transaction_link_id)
+    REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE utxo_indexer_transactioninput
+    ADD CONSTRAINT utxo_indexer_transac_transaction_link_id_d7290af9_fk_utxo_inde FOREIGN KEY (transaction_link_id)
+    REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE utxo_indexer_transactionoutput
+    ADD CONSTRAINT utxo_indexer_transac_transaction_link_id_84665e8c_fk_utxo_inde FOREIGN KEY (transaction_link_id)
+    REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+# Validation only locks out schema changes, reads and writes continue
+VALIDATE_FOREIGN_KEYS = [
+    "ALTER TABLE utxo_indexer_transactioninputcoinbase "
+    "VALIDATE CONSTRAINT utxo_indexer_transactioni_transaction_link_id_f4e70dc4_fk",
+    "ALTER TABLE utxo_indexer_transactioninput "
+    "VALIDATE CONSTRAINT utxo_indexer_transactioninput_transaction_link_id_d7290af9_fk",
+    "ALTER TABLE utxo_indexer_transactionoutput "
+    "VALIDATE CONSTRAINT utxo_indexer_transactionoutput_transaction_link_id_84665e8c_fk",
+]
+
+
+def backfill_hash_columns(apps, schema_editor):
+    """Copies decoded hashes into the new columns, walking every table by its primary key in short batches"""
+    with schema_editor.connection.cursor() as cursor:
+        for table, key, columns in HASH_COLUMNS:
+            assignments = ", ".join(f"{column}_bytes = decode({column}, 'hex')" for column in columns)
+            last_key = "" if key != "id" else 0
+            while True:
+                cursor.execute(
+                    f"UPDATE {table} SET {assignments} WHERE {key} IN "
+                    f"(SELECT {key} FROM {table} WHERE {key} > %s ORDER BY {key} LIMIT %s) RETURNING {key}",
+                    [last_key, BACKFILL_BATCH_ROWS],
+                )
+                keys = [row[0] for row in cursor.fetchall()]
+                if len(keys) == 0:
+                    break
+                last_key = max(keys)
+
+
+class Migration(migrations.Migration):
+    """
+    Converts 64 char hex string columns to bytea without rewriting the tables under an exclusive lock
+
+    Decoded hashes are written to new columns in batches that are committed one by one, then the new columns
+    replace the old ones. Foreign keys to transaction_id are converted with it.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("utxo_indexer", "0003_version_delete_config"),
+    ]
+
+    operations = [
+        migrations.RunSQL(ADD_COLUMNS, DROP_COLUMNS),
+        migrations.RunPython(backfill_hash_columns, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_INDEXES, DROP_INDEXES),
+        migrations.SeparateDatabaseAndState(
+            # New columns are already renamed when rolling back, dropping their indexes and columns is a no-op
+            database_operations=[migrations.RunSQL([SWAP_COLUMNS], [UNSWAP_COLUMNS])],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="utxoblock",
+                    name="block_hash",
+                    field=utxo_indexer.models.model_utils.HexString32ByteField(primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name="utxoblock",
+                    name="previous_block_hash",
+                    field=utxo_indexer.models.model_utils.HexString32ByteField(),
+                ),
+                migrations.AlterField(
+                    model_name="utxotransaction",
+                    name="transaction_id",
+                    field=utxo_indexer.models.model_utils.HexString32ByteField(primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name="utxotransaction",
+                    name="payment_reference",
+                    field=utxo_indexer.models.model_utils.HexString32ByteField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name="utxotransaction",
+                    name="source_addresses_root",
+                    field=utxo_indexer.models.model_utils.HexString32ByteField(),
+                ),
+                migrations.AlterField(
+                    model_name="transactioninput",
+                    name="vin_previous_txid",
+                    field=utxo_indexer.models.model_utils.HexString32ByteField(),
+                ),
+            ],
+        ),
+        migrations.RunSQL(VALIDATE_FOREIGN_KEYS, migrations.RunSQL.noop),
+    ]
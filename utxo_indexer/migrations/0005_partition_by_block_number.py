@@ -0,0 +1,259 @@
+import os
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Size of range partitions created for existing rows, read from the same setting as the indexer's partitions
+PARTITION_SIZE_BLOCKS = int(os.environ.get("PARTITION_SIZE_BLOCKS", "10000"))
+
+# Parents first, children are copied with block numbers of their transactions
+TABLES = (
+    "utxo_indexer_utxoblock",
+    "utxo_indexer_utxotransaction",
+    "utxo_indexer_transactioninputcoinbase",
+    "utxo_indexer_transactioninput",
+    "utxo_indexer_transactionoutput",
+)
+TRANSACTION_TABLE = "utxo_indexer_utxotransaction"
+CHILD_TABLES = (
+    "utxo_indexer_transactioninputcoinbase",
+    "utxo_indexer_transactioninput",
+    "utxo_indexer_transactionoutput",
+)
+
+# Indexes of both schemas
+INDEXES = (
+    "CREATE INDEX utxo_indexe_block_n_7be93d_idx ON utxo_indexer_utxoblock (block_number)",
+    "CREATE INDEX utxo_indexe_previou_58894c_idx ON utxo_indexer_utxoblock (previous_block_hash)",
+    'CREATE INDEX utxo_indexe_timesta_7390df_idx ON utxo_indexer_utxoblock ("timestamp")',
+    "CREATE INDEX utxo_indexe_block_n_2a386e_idx ON utxo_indexer_utxotransaction (block_number)",
+    "CREATE INDEX utxo_indexe_payment_b900d6_idx ON utxo_indexer_utxotransaction (payment_reference)",
+    "CREATE INDEX utxo_indexe_source__3782c2_idx ON utxo_indexer_utxotransaction (source_addresses_root)",
+    'CREATE INDEX utxo_indexe_timesta_4e0245_idx ON utxo_indexer_utxotransaction ("timestamp")',
+    "CREATE INDEX utxo_indexe_transac_0b109b_idx ON utxo_indexer_utxotransaction (transaction_type)",
+    "CREATE INDEX utxo_indexer_transactionin_transaction_link_id_f4e70dc4 "
+    "ON utxo_indexer_transactioninputcoinbase (transaction_link_id)",
+    "CREATE INDEX utxo_indexer_transactioninput_transaction_link_id_d7290af9 "
+    "ON utxo_indexer_transactioninput (transaction_link_id)",
+    "CREATE INDEX utxo_indexer_transactionoutput_transaction_link_id_84665e8c "
+    "ON utxo_indexer_transactionoutput (transaction_link_id)",
+)
+
+# Keys of partitioned tables have to include block_number, foreign keys to transactions are not enforced
+PARTITIONED_CONSTRAINTS = (
+    "ALTER TABLE utxo_indexer_utxoblock ADD CONSTRAINT utxo_indexer_utxoblock_pkey "
+    "PRIMARY KEY (block_hash, block_number)",
+    "ALTER TABLE utxo_indexer_utxotransaction ADD CONSTRAINT utxo_indexer_utxotransaction_pkey "
+    "PRIMARY KEY (transaction_id, block_number)",
+    "ALTER TABLE utxo_indexer_transactioninputcoinbase ADD CONSTRAINT utxo_indexer_transactioninputcoinbase_pkey "
+    "PRIMARY KEY (id, block_number)",
+    "ALTER TABLE utxo_indexer_transactioninput ADD CONSTRAINT utxo_indexer_transactioninput_pkey "
+    "PRIMARY KEY (id, block_number)",
+    "ALTER TABLE utxo_indexer_transactioninput ADD CONSTRAINT "
+    "utxo_indexer_transaction_transaction_link_id_vin__c8387a01_uniq UNIQUE (transaction_link_id, vin_n, block_number)",
+    "ALTER TABLE utxo_indexer_transactionoutput ADD CONSTRAINT utxo_indexer_transactionoutput_pkey "
+    "PRIMARY KEY (id, block_number)",
+    "ALTER TABLE utxo_indexer_transactionoutput ADD CONSTRAINT "
+    "utxo_indexer_transaction_transaction_link_id_n_bl_3d0bc959_uniq UNIQUE (transaction_link_id, n, block_number)",
+)
+
+UNPARTITIONED_CONSTRAINTS = (
+    "ALTER TABLE utxo_indexer_utxoblock ADD CONSTRAINT utxo_indexer_utxoblock_pkey PRIMARY KEY (block_hash)",
+    "ALTER TABLE utxo_indexer_utxotransaction ADD CONSTRAINT utxo_indexer_utxotransaction_pkey "
+    "PRIMARY KEY (transaction_id)",
+    "ALTER TABLE utxo_indexer_transactioninputcoinbase ADD CONSTRAINT utxo_indexer_transactioninputcoinbase_pkey "
+    "PRIMARY KEY (id)",
+    "ALTER TABLE utxo_indexer_transactioninputcoinbase ADD CONSTRAINT "
+    "utxo_indexer_transactioni_transaction_link_id_f4e70dc4_fk FOREIGN KEY (transaction_link_id) "
+    "REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED",
+    "ALTER TABLE utxo_indexer_transactioninput ADD CONSTRAINT utxo_indexer_transactioninput_pkey PRIMARY KEY (id)",
+    "ALTER TABLE utxo_indexer_transactioninput ADD CONSTRAINT "
+    "utxo_indexer_transaction_transaction_link_id_vin__76fa36e5_uniq UNIQUE (transaction_link_id, vin_n)",
+    "ALTER TABLE utxo_indexer_transactioninput ADD CONSTRAINT "
+    "utxo_indexer_transactioninput_transaction_link_id_d7290af9_fk FOREIGN KEY (transaction_link_id) "
+    "REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED",
+    "ALTER TABLE utxo_indexer_transactionoutput ADD CONSTRAINT utxo_indexer_transactionoutput_pkey PRIMARY KEY (id)",
+    "ALTER TABLE utxo_indexer_transactionoutput ADD CONSTRAINT "
+    "utxo_indexer_transaction_transaction_link_id_n_9c3a0bee_uniq UNIQUE (transaction_link_id, n)",
+    "ALTER TABLE utxo_indexer_transactionoutput ADD CONSTRAINT "
+    "utxo_indexer_transactionoutput_transaction_link_id_84665e8c_fk FOREIGN KEY (transaction_link_id) "
+    "REFERENCES utxo_indexer_utxotransaction (transaction_id) DEFERRABLE INITIALLY DEFERRED",
+)
+
+
+def _columns(cursor, table):
+    cursor.execute(
+        "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped "
+        "ORDER BY attnum",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _rename_tables(cursor, suffix):
+    # Keys and indexes are dropped to free their names, checks are copied to the new tables
+    for table in reversed(TABLES):
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('f', 'p', 'u')",
+            [table],
+        )
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"')
+    for table in TABLES:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+        for (index,) in cursor.fetchall():
+            cursor.execute(f'DROP INDEX "{index}"')
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}{suffix}")
+        if table in CHILD_TABLES:
+            cursor.execute(f"ALTER SEQUENCE {table}_id_seq RENAME TO {table}{suffix}_id_seq")
+
+
+def _copy_rows(cursor, table, old_table, with_block_number):
+    columns = _columns(cursor, old_table)
+    if table not in CHILD_TABLES:
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {old_table}")
+        return
+    columns = [column for column in columns if column != "block_number"]
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    old_column_list = ", ".join(f'o."{column}"' for column in columns)
+    # Rows of children without a transaction are dropped
+    if with_block_number:
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}, block_number) SELECT {old_column_list}, t.block_number "
+            f"FROM {old_table} o JOIN {TRANSACTION_TABLE} t ON t.transaction_id = o.transaction_link_id"
+        )
+    else:
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {old_column_list} FROM {old_table} o "
+            f"WHERE EXISTS (SELECT FROM {TRANSACTION_TABLE} t WHERE t.transaction_id = o.transaction_link_id)"
+        )
+    cursor.execute(f"SELECT setval('{table}_id_seq', coalesce(max(id), 0) + 1, false) FROM {table}")
+
+
+def partition_tables(apps, schema_editor):
+    """
+    Recreates block and transaction tables as tables range partitioned by block_number and copies existing rows
+
+    Primary keys and unique constraints of partitioned tables have to include block_number, so the db primary keys
+    are (key, block_number) and foreign keys to transactions are not enforced by the db. The db no longer rejects
+    a transaction id that is already stored at another block number, uniqueness of transactions relies on the
+    indexer writing every block once. Rows outside of range partitions end up in the default partition of each table.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        _rename_tables(cursor, "_unpartitioned")
+
+        # Partitioned tables with the same columns, children get the block_number column
+        for table in TABLES:
+            block_number_column = (
+                ", block_number integer NOT NULL CHECK (block_number >= 0)" if table in CHILD_TABLES else ""
+            )
+            cursor.execute(
+                f"CREATE TABLE {table} (LIKE {table}_unpartitioned "
+                f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY{block_number_column}) "
+                "PARTITION BY RANGE (block_number)"
+            )
+            cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        for statement in PARTITIONED_CONSTRAINTS + INDEXES:
+            cursor.execute(statement)
+
+        # Range partitions for existing rows, new ones are created ahead of the tip by the indexer
+        cursor.execute(
+            "SELECT min(block_number), max(block_number) FROM ("
+            "SELECT block_number FROM utxo_indexer_utxoblock_unpartitioned UNION ALL "
+            "SELECT block_number FROM utxo_indexer_utxotransaction_unpartitioned) heights"
+        )
+        first_height, last_height = cursor.fetchone()
+        if first_height is not None:
+            for first in range(
+                first_height - first_height % PARTITION_SIZE_BLOCKS, last_height + 1, PARTITION_SIZE_BLOCKS
+            ):
+                for table in TABLES:
+                    cursor.execute(
+                        f"CREATE TABLE {table}_p{first:d} PARTITION OF {table} "
+                        f"FOR VALUES FROM ({first:d}) TO ({first + PARTITION_SIZE_BLOCKS:d})"
+                    )
+
+        # Transactions are copied before their children, which get block numbers from the partitioned table
+        for table in TABLES:
+            _copy_rows(cursor, table, f"{table}_unpartitioned", with_block_number=True)
+        for table in reversed(TABLES):
+            cursor.execute(f"DROP TABLE {table}_unpartitioned")
+
+
+def unpartition_tables(apps, schema_editor):
+    """
+    Recreates block and transaction tables as plain tables with the keys of migration 0004 and copies existing rows
+
+    Children of transactions, which are not linked by a foreign key in partitioned tables, are only copied if
+    their transaction exists.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        _rename_tables(cursor, "_partitioned")
+
+        for table in TABLES:
+            cursor.execute(
+                f"CREATE TABLE {table} (LIKE {table}_partitioned "
+                "INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY)"
+            )
+            if table in CHILD_TABLES:
+                cursor.execute(f"ALTER TABLE {table} DROP COLUMN block_number")
+
+        for table in TABLES:
+            _copy_rows(cursor, table, f"{table}_partitioned", with_block_number=False)
+        for table in reversed(TABLES):
+            cursor.execute(f"DROP TABLE {table}_partitioned")
+        for statement in UNPARTITIONED_CONSTRAINTS + INDEXES:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    """
+    Partitions block and transaction tables by block_number, see partition_tables
+
+    All rows are copied in one transaction that locks the tables exclusively, so the indexer and the api have to be
+    stopped while it runs and it takes about as long as a full copy of the db. Requires PostgreSQL 13 or later,
+    like Django 5.1 (primary keys and default partitions of partitioned tables need 11, identity columns copied
+    into partitioned tables with LIKE need 10).
+    """
+
+    dependencies = [
+        ("utxo_indexer", "0004_hex_string_32_byte_fields_to_bytea"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name=model_name,
+                    name="block_number",
+                    field=models.PositiveIntegerField(default=0),
+                    preserve_default=False,
+                )
+                for model_name in ("transactioninputcoinbase", "transactioninput", "transactionoutput")
+            ]
+            + [
+                migrations.AlterField(
+                    model_name=model_name,
+                    name="transaction_link",
+                    field=models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="utxo_indexer.utxotransaction",
+                    ),
+                )
+                for model_name in ("transactioninputcoinbase", "transactioninput", "transactionoutput")
+            ]
+            + [
+                migrations.AlterUniqueTogether(
+                    name="transactioninput",
+                    unique_together={("transaction_link", "vin_n", "block_number")},
+                ),
+                migrations.AlterUniqueTogether(
+                    name="transactionoutput",
+                    unique_together={("transaction_link", "n", "block_number")},
+                ),
+            ],
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
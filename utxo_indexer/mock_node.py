@@ -0,0 +1,333 @@
+"""
+Stand-in JSON-RPC node that serves recorded blocks and transactions, used to run clients and indexers offline
+
+Fixture directory layout:
+- blocks/*.json: getblock results with the highest verbosity that was recorded (3 for btc, 2 for doge),
+  optionally wrapped in a json-rpc response ({"result": ...})
+- blocks/<hash>.hex: serialized blocks served for verbosity 0 (optional)
+- transactions/*.json: getrawtransaction results of transactions that are not part of recorded blocks,
+  usually prevout transactions of doge blocks (optional)
+- chain.json: chain name and node version fields returned by info methods (optional)
+"""
+
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import msgspec
+from attrs import define, field
+
+from client.raw_block import format_amount
+
+logger = logging.getLogger(__name__)
+
+# Amounts are kept as raw json, so they are served with the exact representation they were recorded with
+_decoder = msgspec.json.Decoder(float_hook=lambda number: msgspec.Raw(number.encode()))
+_encoder = msgspec.json.Encoder()
+
+DEFAULT_CHAIN_INFO = {
+    "chain": "main",
+    "version": 270000,
+    "subversion": "/Satoshi:27.0.0/",
+    "protocolversion": 70016,
+}
+
+# JSON-RPC error codes used by the node
+RPC_MISC_ERROR = -1
+RPC_INVALID_ADDRESS_OR_KEY = -5
+RPC_INVALID_PARAMETER = -8
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_REQUEST = -32600
+
+
+class MockRpcError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def json_amount(satoshis: int) -> msgspec.Raw:
+    """Amount in satoshis as the json number the node sends, with all 8 decimals"""
+    return msgspec.Raw(format_amount(satoshis).encode())
+
+
+def _load_json(path: Path) -> Any:
+    data = _decoder.decode(path.read_bytes())
+    if isinstance(data, dict) and "result" in data and "error" in data:
+        return data["result"]
+    return data
+
+
+def _without_prevouts(tx: dict) -> dict:
+    return {**tx, "vin": [{k: v for k, v in vin.items() if k != "prevout"} for vin in tx["vin"]]}
+
+
+@define
+class MockNodeData:
+    """Recorded blocks and transactions indexed by height, hash and txid"""
+
+    blocks: dict[int, dict] = field(factory=dict)
+    heights: dict[str, int] = field(factory=dict)
+    transactions: dict[str, dict] = field(factory=dict)
+    serialized_blocks: dict[str, str] = field(factory=dict)
+    chain_info: dict[str, Any] = field(factory=lambda: dict(DEFAULT_CHAIN_INFO))
+
+    @classmethod
+    def from_directory(cls, directory: str | Path) -> "MockNodeData":
+        directory = Path(directory)
+        data = cls()
+        for path in sorted((directory / "blocks").glob("*.json")):
+            data.add_block(_load_json(path))
+        for path in sorted((directory / "blocks").glob("*.hex")):
+            data.serialized_blocks[path.stem] = path.read_text().strip()
+        for path in sorted((directory / "transactions").glob("*.json")):
+            data.add_transaction(_load_json(path))
+        if (directory / "chain.json").exists():
+            data.chain_info.update(_load_json(directory / "chain.json"))
+        if len(data.blocks) == 0:
+            raise ValueError(f"No recorded blocks in {directory / 'blocks'}")
+        return data
+
+    def save(self, directory: str | Path) -> None:
+        """Writes blocks, transactions that are not part of blocks and chain info in the fixture layout"""
+        directory = Path(directory)
+        (directory / "blocks").mkdir(parents=True, exist_ok=True)
+        (directory / "transactions").mkdir(exist_ok=True)
+        in_blocks = set()
+        for height, block in self.blocks.items():
+            (directory / "blocks" / f"{height}.json").write_bytes(_encoder.encode(block))
+            in_blocks.update(tx["txid"] for tx in block["tx"])
+        for block_hash, serialized in self.serialized_blocks.items():
+            (directory / "blocks" / f"{block_hash}.hex").write_text(serialized)
+        for txid, tx in self.transactions.items():
+            if txid not in in_blocks:
+                (directory / "transactions" / f"{txid}.json").write_bytes(_encoder.encode(tx))
+        (directory / "chain.json").write_bytes(_encoder.encode(self.chain_info))
+
+    def add_block(self, block: dict) -> None:
+        self.blocks[block["height"]] = block
+        self.heights[block["hash"]] = block["height"]
+        for tx in block["tx"]:
+            self.transactions[tx["txid"]] = tx
+
+    def add_transaction(self, tx: dict) -> None:
+        self.transactions[tx["txid"]] = tx
+
+    @property
+    def tip_height(self) -> int:
+        return max(self.blocks)
+
+
+class MockNode:
+    """
+    JSON-RPC methods of the node, answered from recorded data
+    - Data: recorded blocks and transactions
+    - Latency: delay of every http request in seconds
+    - Jitter: random delay up to this many seconds added to the latency
+    - Error rate: share of http requests answered with 503 (work queue depth exceeded)
+    - Seed: seed of random latency and errors, so load tests are reproducible
+    """
+
+    def __init__(
+        self,
+        data: MockNodeData,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+        self.requests = 0
+        self.calls = 0
+        self.injected_errors = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_request(self) -> tuple[float, bool]:
+        """Delay and whether an error is injected for the next http request"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        return delay, fail
+
+    def handle(self, request: Any) -> tuple[int, Any]:
+        """Returns http status and body of the response to a single or a batch JSON-RPC request"""
+        if isinstance(request, list):
+            return 200, [self._handle_call(call) for call in request]
+        response = self._handle_call(request)
+        if response["error"] is None:
+            return 200, response
+        return 404 if response["error"]["code"] == RPC_METHOD_NOT_FOUND else 500, response
+
+    def _handle_call(self, call: Any) -> dict:
+        with self._lock:
+            self.calls += 1
+        request_id = call.get("id") if isinstance(call, dict) else None
+        try:
+            if not isinstance(call, dict) or not isinstance(call.get("method"), str):
+                raise MockRpcError(RPC_INVALID_REQUEST, "Invalid Request object")
+            method = getattr(self, f"rpc_{call['method']}", None)
+            if method is None:
+                raise MockRpcError(RPC_METHOD_NOT_FOUND, "Method not found")
+            result = method(*call.get("params", []))
+        except MockRpcError as e:
+            return {"result": None, "error": {"code": e.code, "message": e.message}, "id": request_id}
+        except TypeError:
+            return {
+                "result": None,
+                "error": {"code": RPC_MISC_ERROR, "message": f"Invalid params of {call['method']}"},
+                "id": request_id,
+            }
+        return {"result": result, "error": None, "id": request_id}
+
+    def _block_by_hash(self, block_hash: str) -> dict:
+        height = self.data.heights.get(block_hash)
+        if height is None:
+            raise MockRpcError(RPC_INVALID_ADDRESS_OR_KEY, "Block not found")
+        return self.data.blocks[height]
+
+    def rpc_getblockcount(self) -> int:
+        return self.data.tip_height
+
+    def rpc_getblockhash(self, height: int) -> str:
+        block = self.data.blocks.get(height)
+        if block is None:
+            raise MockRpcError(RPC_INVALID_PARAMETER, "Block height out of range")
+        return block["hash"]
+
+    def rpc_getblock(self, block_hash: str, verbosity: int | bool = 1) -> Any:
+        block = self._block_by_hash(block_hash)
+        verbosity = int(verbosity)
+        if verbosity == 0:
+            if block_hash not in self.data.serialized_blocks:
+                raise MockRpcError(RPC_MISC_ERROR, "Block not available in serialized form")
+            return self.data.serialized_blocks[block_hash]
+        if verbosity == 1:
+            return {**block, "tx": [tx["txid"] for tx in block["tx"]]}
+        if verbosity == 2:
+            return {**block, "tx": [_without_prevouts(tx) for tx in block["tx"]]}
+        if verbosity == 3:
+            return block
+        raise MockRpcError(RPC_INVALID_PARAMETER, "Verbosity must be in range 0..3")
+
+    def rpc_getblockheader(self, block_hash: str, verbose: bool = True) -> Any:
+        block = self._block_by_hash(block_hash)
+        if not verbose:
+            raise MockRpcError(RPC_MISC_ERROR, "Block header not available in serialized form")
+        header = {k: v for k, v in block.items() if k != "tx"}
+        header["nTx"] = len(block["tx"])
+        return header
+
+    def rpc_getrawtransaction(self, txid: str, verbose: int | bool = False, block_hash: str | None = None) -> Any:
+        tx = self.data.transactions.get(txid)
+        if tx is None:
+            raise MockRpcError(
+                RPC_INVALID_ADDRESS_OR_KEY,
+                "No such mempool or blockchain transaction. Use gettransaction for wallet transactions.",
+            )
+        if not verbose:
+            if "hex" not in tx:
+                raise MockRpcError(RPC_MISC_ERROR, "Transaction not available in serialized form")
+            return tx["hex"]
+        return _without_prevouts(tx)
+
+    def rpc_getblockchaininfo(self) -> dict:
+        tip = self.data.blocks[self.data.tip_height]
+        return {
+            "chain": self.data.chain_info["chain"],
+            "blocks": tip["height"],
+            "headers": tip["height"],
+            "bestblockhash": tip["hash"],
+            "mediantime": tip["mediantime"],
+        }
+
+    def rpc_getnetworkinfo(self) -> dict:
+        return {
+            "version": self.data.chain_info["version"],
+            "subversion": self.data.chain_info["subversion"],
+            "protocolversion": self.data.chain_info["protocolversion"],
+        }
+
+    def rpc_getinfo(self) -> dict:
+        return {
+            "version": self.data.chain_info["version"],
+            "protocolversion": self.data.chain_info["protocolversion"],
+            "blocks": self.data.tip_height,
+        }
+
+    def stats(self) -> dict[str, int]:
+        return {"requests": self.requests, "calls": self.calls, "injected_errors": self.injected_errors}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # Keep connections open, clients reuse them for all requests
+    protocol_version = "HTTP/1.1"
+    server: "MockNodeServer"
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        delay, fail = self.server.node.next_request()
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            self._respond(503, b"Work queue depth exceeded", "text/plain")
+            return
+        try:
+            request = _decoder.decode(body)
+        except msgspec.DecodeError:
+            error = {"result": None, "error": {"code": -32700, "message": "Parse error"}, "id": None}
+            self._respond(500, _encoder.encode(error))
+            return
+        status, response = self.server.node.handle(request)
+        self._respond(status, _encoder.encode(response))
+
+    def _respond(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format, *args)
+
+
+class MockNodeServer(ThreadingHTTPServer):
+    """Http server of the mock node, every connection is handled in its own thread"""
+
+    daemon_threads = True
+
+    def __init__(self, node: MockNode, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _RequestHandler)
+        self.node = node
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> str:
+        """Serves requests in a background thread and returns the url of the node"""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-node", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
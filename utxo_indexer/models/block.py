@@ -1,10 +1,11 @@
-from django.db import models
+from django.db import connection, models
 
 from utxo_indexer.models.model_utils import HexString32ByteField
 from utxo_indexer.models.types import BlockResponse
 
 
 class UtxoBlock(models.Model):
+    # Table is partitioned by block_number, db primary key also includes block_number
     block_hash = HexString32ByteField(primary_key=True)
 
     block_number = models.PositiveIntegerField()
@@ -36,3 +37,31 @@ class UtxoBlock(models.Model):
             transactions=len(response.tx),
             confirmed=True,
         )
+
+    @classmethod
+    def contiguous_height(cls, from_height: int) -> int:
+        """Returns the highest block number such that all blocks from from_height up to it are stored
+
+        Blocks can be committed out of order (backfill), so the latest stored block is not necessarily
+        the end of the indexed history. Returns from_height - 1 if block at from_height is not stored.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT min(block_number), min(block_number) FILTER (WHERE next IS NULL OR next > block_number + 1) "
+                "FROM (SELECT block_number, lead(block_number) OVER (ORDER BY block_number) AS next "
+                f"FROM {cls._meta.db_table} WHERE block_number >= %s) blocks",
+                [from_height],
+            )
+            first, last = cursor.fetchone()
+        if first != from_height:
+            return from_height - 1
+        return last
+
+    @classmethod
+    def indexed_heights(cls, first_height: int, last_height: int) -> set[int]:
+        """Returns block numbers of stored blocks between first and last height (both included)"""
+        return set(
+            cls.objects.filter(block_number__gte=first_height, block_number__lte=last_height).values_list(
+                "block_number", flat=True
+            )
+        )
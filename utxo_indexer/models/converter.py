@@ -0,0 +1,71 @@
+from collections.abc import Callable
+from typing import Any, List
+
+import cattrs
+from cattrs.gen import make_dict_structure_fn
+
+from utxo_indexer.models.types import (
+    BlockResponse,
+    CoinbaseVinResponse,
+    PrevoutResponse,
+    ScriptPubKeyResponse,
+    ScriptSigResponse,
+    TransactionResponse,
+    VinResponse,
+    VoutResponse,
+)
+
+# Converter with structuring functions generated upfront for all response types. Detailed validation is turned off,
+# so the generated functions do not collect errors of every field. Optional fields, lists and inputs get dedicated
+# hooks instead of the generic dispatch, inputs are discriminated on the presence of the coinbase key.
+converter = cattrs.Converter(detailed_validation=False)
+
+
+def _optional(structure: Callable[[Any], Any]) -> Callable[[Any, Any], Any]:
+    return lambda value, _: None if value is None else structure(value)
+
+
+def _register_list_of(cls: Any, structure: Callable[[Any], Any]):
+    list_type = List[cls]
+    converter.register_structure_hook_func(
+        lambda type_: type_ == list_type, lambda values, _: [structure(value) for value in values]
+    )
+
+
+def _register(cls: type) -> Callable[[Any], Any]:
+    structure_fn = make_dict_structure_fn(cls, converter)
+    converter.register_structure_hook(cls, structure_fn)
+    return lambda value: structure_fn(value, cls)
+
+
+converter.register_structure_hook(int | None, _optional(int))
+_register(ScriptSigResponse)
+_register(ScriptPubKeyResponse)
+converter.register_structure_hook(PrevoutResponse | None, _optional(_register(PrevoutResponse)))
+_structure_vout = _register(VoutResponse)
+_structure_coinbase_vin = _register(CoinbaseVinResponse)
+_structure_vin = _register(VinResponse)
+
+
+def _structure_any_vin(vin: dict[str, Any]) -> VinResponse | CoinbaseVinResponse:
+    if "coinbase" in vin:
+        return _structure_coinbase_vin(vin)
+    return _structure_vin(vin)
+
+
+converter.register_structure_hook(VinResponse | CoinbaseVinResponse, lambda vin, _: _structure_any_vin(vin))
+_register_list_of(VinResponse | CoinbaseVinResponse, _structure_any_vin)
+_register_list_of(VoutResponse, _structure_vout)
+_structure_transaction = _register(TransactionResponse)
+_register_list_of(TransactionResponse, _structure_transaction)
+_structure_block = _register(BlockResponse)
+
+
+def structure_block(block: dict[str, Any]) -> BlockResponse:
+    """Structures a decoded getblock response into a block response"""
+    return _structure_block(block)
+
+
+def structure_transaction(tx: dict[str, Any]) -> TransactionResponse:
+    """Structures a decoded getrawtransaction response into a transaction response"""
+    return _structure_transaction(tx)
@@ -2,8 +2,50 @@ from typing import Any
 
 from django.db import models
 
+from utxo_indexer.utils import un_prefix_0x
+
+
+class HexString32ByteField(models.Field):
+    """
+    Up to 32 bytes value (hash, txid, ...) stored as bytea and represented as a hex string in python
+    """
+
+    description = "32 byte value stored as bytes, represented as hex string"
+
+    def db_type(self, connection: Any) -> str:
+        return "bytea"
+
+    def from_db_value(self, value: Any, expression: Any, connection: Any) -> str | None:
+        if value is None:
+            return value
+        return bytes(value).hex()
+
+    def to_python(self, value: Any) -> str | None:
+        if isinstance(value, bytes | memoryview):
+            return bytes(value).hex()
+        return value
+
+    def get_prep_value(self, value: Any) -> bytes | None:
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, bytes):
+            return value
+        if isinstance(value, memoryview):
+            return bytes(value)
+        try:
+            prep_value = bytes.fromhex(un_prefix_0x(value))
+        except (TypeError, ValueError) as e:
+            raise e.__class__(f"Field '{self.name}' expected a hex string but got {value!r}.") from e
+        if len(prep_value) > 32:
+            raise ValueError(f"Field '{self.name}' expected at most 32 bytes but got {len(prep_value)}.")
+        return prep_value
+
+
+class HexString32ByteFieldLegacy(models.CharField):
+    """
+    Hex string stored as a 64 character varchar, frozen for migrations that created the columns before they were
+    converted to bytea
+    """
 
-class HexString32ByteField(models.CharField):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         kwargs["max_length"] = 64
         super().__init__(*args, **kwargs)
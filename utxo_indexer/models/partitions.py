@@ -0,0 +1,175 @@
+import logging
+import re
+
+from django.db import OperationalError, connection, transaction
+
+from utxo_indexer.models.block import UtxoBlock
+from utxo_indexer.models.transaction import UtxoTransaction
+from utxo_indexer.models.transaction_outputs import TransactionInput, TransactionInputCoinbase, TransactionOutput
+
+# Tables of all of these models are range partitioned by block_number
+PARTITIONED_MODELS = (TransactionInputCoinbase, TransactionInput, TransactionOutput, UtxoTransaction, UtxoBlock)
+
+PARTITION_BOUND_RE = re.compile(r"FROM \('?(\d+)'?\) TO \('?(\d+)'?\)")
+
+# Longest wait for the lock of a parent table when detaching a partition, reads and writes queue behind the wait
+DETACH_LOCK_TIMEOUT_MS = 2000
+# SQLSTATE of lock_timeout errors
+LOCK_NOT_AVAILABLE = "55P03"
+
+logger = logging.getLogger(__name__)
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def partition_name(table: str, start: int) -> str:
+    return f"{table}_p{start}"
+
+
+def range_partitions(table: str) -> list[tuple[str, int, int]]:
+    """Returns name, first and (exclusive) last block number of every range partition of the table, ordered by range"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+            [table],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = PARTITION_BOUND_RE.search(bound)
+        # default partition has no range
+        if match is not None:
+            partitions.append((name, int(match.group(1)), int(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _missing_ranges(start: int, end: int, size: int, partitions: list[tuple[str, int, int]]) -> list[tuple[int, int]]:
+    # Parts of [start, end) not covered by the partitions, split at multiples of size
+    uncovered = []
+    current = start
+    for _, first, last in partitions:
+        if last <= current:
+            continue
+        if first >= end:
+            break
+        if first > current:
+            uncovered.append((current, first))
+        current = max(current, last)
+    if current < end:
+        uncovered.append((current, end))
+
+    ranges = []
+    for first, last in uncovered:
+        while first < last:
+            boundary = min(last, (first // size + 1) * size)
+            ranges.append((first, boundary))
+            first = boundary
+    return ranges
+
+
+def create_partitions(table: str, start: int, end: int, size: int) -> list[str]:
+    """
+    Creates range partitions of `size` blocks, aligned to multiples of size, covering at least block numbers
+    [start, end)
+
+    Ranges that are already covered are skipped. Rows that were written into the default partition before
+    their partition existed are moved into the new partition.
+    """
+    quote_name = connection.ops.quote_name
+    created = []
+    aligned_start = start - start % size
+    aligned_end = end + (-end) % size
+    for first, last in _missing_ranges(aligned_start, aligned_end, size, range_partitions(table)):
+        name = partition_name(table, first)
+        bound_check = quote_name(f"{name}_bound_check")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {quote_name(name)} (LIKE {quote_name(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {quote_name(default_partition_name(table))} "
+                f"WHERE block_number >= {first:d} AND block_number < {last:d} RETURNING *) "
+                f"INSERT INTO {quote_name(name)} SELECT * FROM moved"
+            )
+            # ATTACH locks the parent in SHARE UPDATE EXCLUSIVE mode, so other partitions stay readable and
+            # writable, while the new and the default partition are locked exclusively until commit. The check
+            # constraint implies the range, so ATTACH skips scanning the new partition for rows outside of it.
+            cursor.execute(
+                f"ALTER TABLE {quote_name(name)} ADD CONSTRAINT {bound_check} "
+                f"CHECK (block_number >= {first:d} AND block_number < {last:d})"
+            )
+            cursor.execute(
+                f"ALTER TABLE {quote_name(table)} ATTACH PARTITION {quote_name(name)} "
+                f"FOR VALUES FROM ({first:d}) TO ({last:d})"
+            )
+            cursor.execute(f"ALTER TABLE {quote_name(name)} DROP CONSTRAINT {bound_check}")
+        created.append(name)
+    return created
+
+
+def create_block_partitions(start: int, end: int, size: int) -> list[str]:
+    """Creates partitions covering block numbers [start, end) for all partitioned tables"""
+    created = []
+    for model in PARTITIONED_MODELS:
+        created.extend(create_partitions(model._meta.db_table, start, end, size))
+    return created
+
+
+def drop_block_partitions_below(block_number: int, lock_timeout_ms: int = DETACH_LOCK_TIMEOUT_MS) -> list[str]:
+    """
+    Detaches and drops partitions of all partitioned tables that only contain blocks below block_number
+
+    Detaching locks the parent tables exclusively, so the partitions of every block range are detached and dropped
+    together in their own short transaction that gives up after waiting lock_timeout_ms for a lock. All tables are
+    pruned to the same height, a range left after a timeout is dropped by a later call. Must not be called inside
+    of a transaction, which would hold the locks.
+    """
+    quote_name = connection.ops.quote_name
+    partitions_by_range: dict[tuple[int, int], list[tuple[str, str]]] = {}
+    for model in PARTITIONED_MODELS:
+        table = model._meta.db_table
+        for name, first, last in range_partitions(table):
+            if last > block_number:
+                break
+            partitions_by_range.setdefault((first, last), []).append((table, name))
+
+    dropped = []
+    for block_range in sorted(partitions_by_range):
+        partitions = partitions_by_range[block_range]
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = {lock_timeout_ms:d}")
+                for table, name in partitions:
+                    cursor.execute(f"ALTER TABLE {quote_name(table)} DETACH PARTITION {quote_name(name)}")
+                for _, name in partitions:
+                    cursor.execute(f"DROP TABLE {quote_name(name)}")
+        except OperationalError as e:
+            if getattr(e.__cause__, "sqlstate", None) != LOCK_NOT_AVAILABLE:
+                raise
+            logger.warning("Partitions of blocks %s - %s not dropped, retrying later: %s", *block_range, e)
+            return dropped
+        dropped.extend(name for _, name in partitions)
+    return dropped
+
+
+def delete_blocks_below(block_number: int) -> int:
+    """
+    Deletes rows below block_number from all partitioned tables, returns number of rows
+
+    Only partitions holding blocks below block_number are scanned, so deleting the rows of a chunk of blocks from
+    a partition that is not yet expired does not touch the newer partitions.
+    """
+    quote_name = connection.ops.quote_name
+    deleted = 0
+    with connection.cursor() as cursor:
+        for model in PARTITIONED_MODELS:
+            cursor.execute(
+                f"DELETE FROM {quote_name(model._meta.db_table)} WHERE block_number < %s",
+                [block_number],
+            )
+            deleted += cursor.rowcount
+    return deleted
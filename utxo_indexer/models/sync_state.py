@@ -1,6 +1,8 @@
 import time
 
-from django.db import models
+from django.db import models, transaction
+
+from utxo_indexer.models.block import UtxoBlock
 
 
 class TipSyncStateChoices(models.TextChoices):
@@ -36,6 +38,30 @@ class TipSyncState(models.Model):
         )
         return _instance
 
+    @classmethod
+    def advance_indexed_height(cls) -> int:
+        """
+        Advances latest indexed height to the end of the contiguous prefix of stored blocks and returns it
+
+        Used when blocks are committed out of order, the indexed height never moves past a missing block.
+        """
+        with transaction.atomic():
+            cls.instance()
+            tip_state = cls.objects.select_for_update().get(pk=cls.TIP_STATE_ID)
+            bottom_block = UtxoBlock.objects.order_by("block_number").first()
+            if bottom_block is None:
+                return tip_state.latest_indexed_height
+
+            indexed_height = UtxoBlock.contiguous_height(
+                max(tip_state.latest_indexed_height, bottom_block.block_number)
+            )
+            if indexed_height > tip_state.latest_indexed_height:
+                tip_state.latest_indexed_height = indexed_height
+                tip_state.sync_state = TipSyncStateChoices.syncing
+                tip_state.timestamp = int(time.time())
+                tip_state.save()
+            return tip_state.latest_indexed_height
+
 
 class PruneSyncState(models.Model):
     TIP_STATE_ID = 1
@@ -2,14 +2,13 @@ from typing import TYPE_CHECKING, List, Sequence
 
 from django.db import models
 
+from utxo_indexer.hashing import COINBASE_SOURCE_ADDRESS_ROOT, address_leaf_hash, merkle_root, root_hex
 from utxo_indexer.models.model_utils import HexString32ByteField
 from utxo_indexer.models.types import CoinbaseVinResponse, TransactionResponse, VoutResponse
 from utxo_indexer.utils import (
     ZERO_BYTES_32,
     WordToOpcode,
     is_valid_bytes_32_hex,
-    merkle_tree_from_address_strings,
-    un_prefix_0x,
 )
 
 if TYPE_CHECKING:
@@ -28,6 +27,7 @@ class UtxoTransaction(models.Model):
     transactioninputcoinbase_set: models.Manager["TransactionInputCoinbase"]
     transactionoutput_set: models.Manager["TransactionOutput"]
 
+    # Table is partitioned by block_number, db primary key also includes block_number
     transaction_id = HexString32ByteField(primary_key=True)
 
     block_number = models.PositiveIntegerField()
@@ -67,14 +67,12 @@ class UtxoTransaction(models.Model):
         self.source_addresses_root = self._construct_address_root(addresses)
 
     def update_source_addresses_root_cb(self, inputs: List["TransactionInputCoinbase"]):
-        addresses = [None]
-        self.source_addresses_root = self._construct_address_root(addresses)
+        self.source_addresses_root = COINBASE_SOURCE_ADDRESS_ROOT
 
     def _construct_address_root(self, addresses: Sequence[str | None]) -> str:
-        tree = merkle_tree_from_address_strings(addresses)
-        if tree.root is None:
-            return ZERO_SOURCE_ADDRESS_ROOT
-        return un_prefix_0x(tree.root).lower()
+        return root_hex(
+            merkle_root([bytes(32) if address is None else address_leaf_hash(address) for address in addresses])
+        )
 
     @classmethod
     def object_from_node_response(cls, response: TransactionResponse, block_number: int, timestamp: int):
@@ -1,4 +1,6 @@
-from django.db import models
+from typing import Sequence
+
+from django.db import connection, models
 
 from utxo_indexer.models.model_utils import HexString32ByteField
 from utxo_indexer.models.transaction import UtxoTransaction
@@ -26,10 +28,13 @@ class AbstractTransactionOutput(models.Model):
 
 
 class TransactionOutput(AbstractTransactionOutput):
-    transaction_link = models.ForeignKey("UtxoTransaction", on_delete=models.CASCADE)
+    # Transactions are partitioned by block number, so the link is not enforced by a db foreign key
+    transaction_link = models.ForeignKey("UtxoTransaction", on_delete=models.CASCADE, db_constraint=False)
+    # Partitioning key, same as block number of the linked transaction
+    block_number = models.PositiveIntegerField()
 
     class Meta:
-        unique_together = (("transaction_link", "n"),)
+        unique_together = (("transaction_link", "n", "block_number"),)
 
     def __str__(self) -> str:
         return super().__str__()
@@ -39,6 +44,7 @@ class TransactionOutput(AbstractTransactionOutput):
         script_pub_key = response.scriptPubKey
         return cls(
             transaction_link=transaction_link,
+            block_number=transaction_link.block_number,
             n=response.n,
             value=response.value,
             script_key_asm=script_pub_key.asm,
@@ -48,6 +54,32 @@ class TransactionOutput(AbstractTransactionOutput):
             script_key_address=script_pub_key.address,
         )
 
+    @classmethod
+    def vout_responses_for_outpoints(
+        cls, outpoints: Sequence[tuple[str, int]], batch_size: int = 5000
+    ) -> dict[tuple[str, int], VoutResponse]:
+        """Returns vout responses of all stored outputs among the given (txid, n) outpoints
+
+        Outpoints are resolved with a join against unnested arrays, one query per batch of outpoints
+        """
+        link_field = cls._meta.get_field("transaction_link")
+        txid_field = link_field.target_field  # type: ignore[union-attr]
+        txid_type = txid_field.db_type(connection)
+        sql = (
+            f"SELECT o.* FROM {cls._meta.db_table} o "
+            f"JOIN unnest(%s::{txid_type}[], %s::integer[]) AS q(txid, n) "
+            f"ON o.{link_field.column} = q.txid AND o.n = q.n"
+        )
+
+        resolved = {}
+        for i in range(0, len(outpoints), batch_size):
+            batch = outpoints[i : i + batch_size]
+            txids = [txid_field.get_db_prep_value(txid, connection) for txid, _ in batch]
+            ns = [n for _, n in batch]
+            for output in cls.objects.raw(sql, [txids, ns]):
+                resolved[(output.transaction_link_id, output.n)] = output.to_vout_response()
+        return resolved
+
     def to_vout_response(self) -> VoutResponse:
         return VoutResponse(
             n=self.n,
@@ -63,7 +95,10 @@ class TransactionOutput(AbstractTransactionOutput):
 
 
 class TransactionInputCoinbase(models.Model):
-    transaction_link = models.ForeignKey("UtxoTransaction", on_delete=models.CASCADE)
+    # Transactions are partitioned by block number, so the link is not enforced by a db foreign key
+    transaction_link = models.ForeignKey("UtxoTransaction", on_delete=models.CASCADE, db_constraint=False)
+    # Partitioning key, same as block number of the linked transaction
+    block_number = models.PositiveIntegerField()
 
     # Position in vin array of transaction (always 0 for coinbase)
     vin_n = models.PositiveIntegerField()
@@ -81,6 +116,7 @@ class TransactionInputCoinbase(models.Model):
         assert vin_n == 0, "Coinbase transaction should always be first in vin array"
         return cls(
             transaction_link=transaction_link,
+            block_number=transaction_link.block_number,
             vin_n=vin_n,
             vin_coinbase=vin_response.coinbase.lower(),
             vin_sequence=vin_response.sequence,
@@ -88,7 +124,10 @@ class TransactionInputCoinbase(models.Model):
 
 
 class TransactionInput(AbstractTransactionOutput):
-    transaction_link = models.ForeignKey("UtxoTransaction", on_delete=models.CASCADE)
+    # Transactions are partitioned by block number, so the link is not enforced by a db foreign key
+    transaction_link = models.ForeignKey("UtxoTransaction", on_delete=models.CASCADE, db_constraint=False)
+    # Partitioning key, same as block number of the linked transaction
+    block_number = models.PositiveIntegerField()
 
     # Position in vin array of transaction
     vin_n = models.PositiveIntegerField()
@@ -104,7 +143,7 @@ class TransactionInput(AbstractTransactionOutput):
     # TODO: Add witness data to db if needed
 
     class Meta:
-        unique_together = (("transaction_link", "vin_n"),)
+        unique_together = (("transaction_link", "vin_n", "block_number"),)
         # TODO: n and vin_vout_index should be the same
 
     def __str__(self) -> str:
@@ -121,6 +160,7 @@ class TransactionInput(AbstractTransactionOutput):
         vout_script_pub_key = vout_response.scriptPubKey
         return cls(
             transaction_link=transaction_link,
+            block_number=transaction_link.block_number,
             vin_n=vin_n,
             # (pre)vout part
             n=vout_response.n,
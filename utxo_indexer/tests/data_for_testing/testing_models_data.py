@@ -61,7 +61,7 @@ block_example_dict = {
                     "sequence": 4294967293,
                 },
                 {
-                    "txid": "432423423435gfdgbdrgdgdg97dg9d8g7dgudvg98dfgddg9u80808078bbz988d",
+                    "txid": "432423423435afdabdeadada97da9d8a7dacdfa98dfadda9c80808078bb0988d",
                     "vout": 0,
                     "scriptSig": {"asm": "", "hex": ""},
                     "prevout": None,
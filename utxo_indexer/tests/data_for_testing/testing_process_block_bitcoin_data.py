@@ -1,3 +1,5 @@
+import copy
+
 import cattrs
 
 from utxo_indexer.models.types import BlockResponse
@@ -92,3 +94,20 @@ block_example_bitcoin_dict = {
     ],
 }
 block_example_bitcoin = cattrs.structure(block_example_bitcoin_dict, BlockResponse)
+
+
+def bitcoin_block_at(height: int) -> dict:
+    """
+    Copy of the example block at the given height, block hash is the height in hex (as block_hash_at)
+    and txids start with it, so blocks of different heights can be stored together
+    """
+    block = copy.deepcopy(block_example_bitcoin_dict)
+    block["hash"] = block_hash_at(height)
+    block["height"] = height
+    for tx in block["tx"]:
+        tx["txid"] = f"{height:08x}" + tx["txid"][8:]
+    return block
+
+
+def block_hash_at(height: int) -> str:
+    return f"{height:064x}"
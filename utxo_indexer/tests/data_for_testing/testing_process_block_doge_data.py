@@ -55,7 +55,7 @@ block_example_doge_dict = {
                     "sequence": 4294967293,
                 },
                 {
-                    "txid": "432423423435gfdgbdrgdgdg97dg9d8g7dgudvg98dfgddg9u80808078bbz988d",
+                    "txid": "432423423435afdabdeadada97da9d8a7dacdfa98dfadda9c80808078bb0988d",
                     "vout": 0,
                     "scriptSig": {"asm": "", "hex": ""},
                     "prevout": None,
@@ -164,7 +164,7 @@ tx_example1_doge = cattrs.structure(tx_example1_doge_dict, TransactionResponse)
 
 
 tx_example2_doge_dict = {
-    "txid": "432423423435gfdgbdrgdgdg97dg9d8g7dgudvg98dfgddg9u80808078bbz988d",
+    "txid": "432423423435afdabdeadada97da9d8a7dacdfa98dfadda9c80808078bb0988d",
     "vin": [
         {
             "txid": "fde8896126ed1f46fac9c6761e08fdcfb3455a7a6c474e6a3d147096e84bd705",
@@ -0,0 +1,216 @@
+import io
+import json
+import logging
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import attrs
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from client.btc_client import BtcClient
+from client.doge_client import DogeClient
+from configuration.config import get_testing_config
+from utxo_indexer.benchmarking import (
+    BenchmarkStore,
+    compare_samples,
+    latency_summary,
+    mann_whitney_greater,
+    min_test_samples,
+    percentile,
+)
+from utxo_indexer.chain_generator import ChainGenerator, ChainProfile
+from utxo_indexer.management.commands.benchmark_indexer import node_client
+from utxo_indexer.microbenchmarks import MICROBENCHMARKS, HotPathInputs
+from utxo_indexer.mock_node import json_amount
+from utxo_indexer.models import TransactionInput, UtxoBlock, UtxoTransaction
+from utxo_indexer.tests.data_for_testing.testing_process_block_bitcoin_data import (
+    block_example_bitcoin,
+    block_example_bitcoin_dict,
+)
+
+# DISABLE LOGGING
+logging.disable(logging.CRITICAL)
+
+
+class BenchmarkingTest(SimpleTestCase):
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile(values, 100), 100.0)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(latency_summary([2.0, 1.0, 3.0])["p50"], 2.0)
+
+
+class BenchmarkIndexerTest(TestCase):
+    def run_benchmark(self, source: str) -> dict:
+        profile = ChainProfile(blocks=4, transactions=(5, 10), payouts=1, payout_outputs=50, spend_chain_length=5)
+        data = ChainGenerator(source, profile, start_height=1000, amount=json_amount).generate_data()
+        with tempfile.TemporaryDirectory() as directory:
+            data.save(directory)
+            report_path = Path(directory) / "report.json"
+            with redirect_stdout(io.StringIO()) as stdout:
+                call_command("benchmark_indexer", fixture_dir=directory, source=source, output=str(report_path))
+            report = json.loads(report_path.read_text())
+
+        self.assertIn("blocks/s", stdout.getvalue())
+        self.assertEqual(report["blocks"], 4)
+        self.assertEqual(report["transactions"], sum(len(block["tx"]) for block in data.blocks.values()))
+        self.assertEqual(report["transactions"], UtxoTransaction.objects.count())
+        self.assertEqual(report["inputs"], sum(len(tx["vin"]) for block in data.blocks.values() for tx in block["tx"]))
+        self.assertEqual(UtxoBlock.objects.count(), 4)
+        self.assertGreater(report["blocks_per_second"], 0)
+        self.assertLessEqual(report["block_latency_seconds"]["p50"], report["block_latency_seconds"]["p99"])
+        self.assertTrue({"fetch", "structure", "resolve", "hash", "write"} <= set(report["stage_seconds"]))
+        self.assertGreater(report["peak_rss_mb"], 0)
+        return report
+
+    def test_btc(self):
+        self.run_benchmark("btc")
+
+    def test_doge(self):
+        report = self.run_benchmark("doge")
+        # Prevouts of inputs are resolved from the mock node, block outputs or db
+        self.assertEqual(TransactionInput.objects.count(), report["inputs"] - 4)
+        self.assertEqual(report["node"]["injected_errors"], 0)
+
+    def test_node_client(self):
+        """Clients are built with the block format and decoder of the config that is reported"""
+        doge_config = attrs.evolve(
+            get_testing_config("DOGE", "doge"), NODE_RPC_URL="node", BLOCK_FORMAT="raw", JSON_DECODER="msgspec"
+        )
+        doge_client = node_client(doge_config)
+        assert isinstance(doge_client, DogeClient)
+        self.assertEqual(
+            (doge_client.url, doge_client.block_format, doge_client.json_decoder), ("node", "raw", "msgspec")
+        )
+
+        btc_config = attrs.evolve(get_testing_config("TEST_BTC_V3", "btc"), NODE_RPC_URL="node", JSON_DECODER="msgspec")
+        btc_client = node_client(btc_config)
+        assert isinstance(btc_client, BtcClient)
+        self.assertEqual((btc_client.url, btc_client.json_decoder), ("node", "msgspec"))
+
+    def test_needs_empty_database(self):
+        UtxoBlock.object_from_node_response(block_example_bitcoin).save()
+        with self.assertRaises(CommandError):
+            call_command("benchmark_indexer", fixture_dir="unused")
+
+
+class MicrobenchmarkTest(SimpleTestCase):
+    def test_recorded_inputs(self):
+        inputs = HotPathInputs.recorded()
+        self.assertEqual(len(inputs.raw_btc_transactions), 1)
+        self.assertEqual(len(inputs.raw_doge_transactions), 5)
+        # Btc input has a prevout, doge block inputs spend outputs of the recorded doge transactions
+        self.assertEqual(len(inputs.inputs), 3)
+        self.assertEqual(inputs.address_lists[0], ["tb1ql3u9666hjn28m0v2rulaqtwvqg3ewd543y66dy"])
+        self.assertEqual(len(inputs.address_lists[1]), 2)
+        self.assertIn(block_example_bitcoin_dict["tx"][0]["txid"], inputs.hex_candidates)
+
+    def test_generated_inputs_resolve_prevouts(self):
+        data = ChainGenerator("doge", ChainProfile(blocks=3, transactions=(5, 5))).generate_data()
+        inputs = HotPathInputs.from_transactions(list(data.transactions.values()))
+        non_coinbase_inputs = sum(len(tx["vin"]) for block in data.blocks.values() for tx in block["tx"][1:])
+        self.assertEqual(len(inputs.inputs), non_coinbase_inputs)
+
+    def test_run(self):
+        inputs = HotPathInputs.recorded()
+        for benchmark in MICROBENCHMARKS:
+            result = benchmark.run(inputs, repeat=2, scale=0.01)
+            assert result is not None
+            self.assertEqual(len(result["samples_ns"]), 2)
+            self.assertLessEqual(result["best_ns"], result["median_ns"])
+            # Number of calls does not depend on timing
+            self.assertEqual(result["calls"], benchmark.run(inputs, repeat=1, scale=0.01)["calls"])
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "results.json"
+            with redirect_stdout(io.StringIO()) as stdout:
+                call_command("benchmark_hot_paths", repeat=2, scale=0.01, filter="reference", output=str(path))
+            results = json.loads(path.read_text())
+        self.assertIn("extract_payment_reference", stdout.getvalue())
+        self.assertEqual(list(results["benchmarks"]), ["extract_payment_reference"])
+        self.assertEqual(results["commit"], "local")
+
+
+def hot_paths_run(samples: list[float]) -> dict:
+    return {"inputs": {"transactions": 6}, "benchmarks": {"extract_payment_reference": {"samples_ns": samples}}}
+
+
+class BenchmarkComparisonTest(SimpleTestCase):
+    def test_mann_whitney(self):
+        base = [10.0, 11.0, 12.0, 13.0, 14.0, 15.0, 16.0]
+        # All head samples larger, only one of C(14, 7) orderings is as extreme
+        self.assertAlmostEqual(mann_whitney_greater(base, [20.0 + i for i in range(7)]), 1 / 3432)
+        self.assertAlmostEqual(mann_whitney_greater(base, [i - 20.0 for i in range(7)]), 1.0)
+        # Same samples give no evidence of a difference
+        self.assertGreater(mann_whitney_greater(base, list(base)), 0.4)
+        self.assertIsNone(mann_whitney_greater([1.0, 2.0], [3.0, 4.0]))
+
+    def test_compare_samples(self):
+        base = [100.0, 101.0, 99.0, 100.5, 99.5, 100.2, 99.8]
+        slower = [sample * 1.2 for sample in base]
+        self.assertTrue(compare_samples("f", base, slower).regression)
+        self.assertFalse(compare_samples("f", slower, base).regression)
+        # Slowdown under the threshold
+        self.assertFalse(compare_samples("f", base, [sample * 1.03 for sample in base]).regression)
+        # Slowdown within noise of the samples
+        noisy = [50.0, 150.0, 80.0, 120.0, 100.0, 60.0, 140.0]
+        self.assertFalse(compare_samples("f", noisy, [sample * 1.2 for sample in noisy]).regression)
+        # Throughput is better when higher
+        self.assertTrue(compare_samples("f", slower, base, higher_is_better=True).regression)
+        # Single runs are not tested, only large slowdowns are flagged
+        self.assertFalse(compare_samples("f", [100.0], [107.0]).regression)
+        self.assertTrue(compare_samples("f", [100.0], [111.0]).regression)
+        # Three runs of each can not reach the default significance level
+        self.assertFalse(compare_samples("f", base[:3], slower[:3]).tested)
+        self.assertTrue(compare_samples("f", base[:5], slower[:5]).tested)
+        self.assertEqual(min_test_samples(0.01), 5)
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = BenchmarkStore(directory)
+            self.assertEqual(store.load("abc", "hot_paths"), [])
+            store.save("abc", "hot_paths", hot_paths_run([1.0]))
+            store.save("abc", "hot_paths", hot_paths_run([2.0]))
+            self.assertEqual(len(store.load("abc", "hot_paths")), 2)
+            self.assertEqual(store.commits(), ["abc"])
+
+    def test_compare_command(self):
+        base = [100.0, 101.0, 99.0, 100.5, 99.5, 100.2, 99.8]
+        with tempfile.TemporaryDirectory() as directory:
+            store = BenchmarkStore(directory)
+            store.save("base", "hot_paths", hot_paths_run(base))
+            store.save("same", "hot_paths", hot_paths_run([sample + 0.1 for sample in base]))
+            store.save("slower", "hot_paths", hot_paths_run([sample * 1.5 for sample in base]))
+
+            with redirect_stdout(io.StringIO()) as stdout:
+                call_command("benchmark_compare", "base", "same", results_dir=directory)
+            self.assertIn("No regressions", stdout.getvalue())
+
+            with redirect_stdout(io.StringIO()), self.assertRaisesMessage(CommandError, "1 regressions"):
+                call_command("benchmark_compare", "base", "slower", results_dir=directory)
+
+            # Result files can be compared directly
+            with redirect_stdout(io.StringIO()), self.assertRaises(CommandError):
+                call_command(
+                    "benchmark_compare",
+                    str(store.path("base", "hot_paths")),
+                    str(store.path("slower", "hot_paths")),
+                )
+
+            with self.assertRaisesMessage(CommandError, "No runs"):
+                call_command("benchmark_compare", "base", "missing", results_dir=directory)
+
+            # Few single sample runs are reported as untested
+            for sample in base[:3]:
+                store.save("few_base", "hot_paths", hot_paths_run([sample]))
+                store.save("few_head", "hot_paths", hot_paths_run([sample + 0.1]))
+            with redirect_stdout(io.StringIO()) as stdout:
+                call_command("benchmark_compare", "few_base", "few_head", results_dir=directory)
+            self.assertIn("too few samples for the rank test at alpha 0.01 (at least 5 samples", stdout.getvalue())
+            self.assertIn("No regressions in 1 compared values, 1 of them untested", stdout.getvalue())
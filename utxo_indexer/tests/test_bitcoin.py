@@ -1,15 +1,24 @@
+import copy
 import logging
+import os
+from unittest import skipIf
 from unittest.mock import patch
 
-from django.test import TestCase
+import attrs
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from requests.models import HTTPBasicAuth
 from requests.sessions import Session
 
 from client.btc_client import BtcClient
-from configuration.config import get_testing_config
+from configuration.config import config, get_testing_config
 from configuration.types import Config
+from utxo_indexer.chain_generator import ChainGenerator, ChainProfile
+from utxo_indexer.indexer.backfill import backfill_block_range
 from utxo_indexer.indexer.bitcoin import BtcIndexerClient
 from utxo_indexer.indexer.indexer_client import IndexerClient
+from utxo_indexer.metrics import prometheus_client
+from utxo_indexer.mock_node import MockNode, MockNodeServer, json_amount
 from utxo_indexer.models import (
     TipSyncState,
     TipSyncStateChoices,
@@ -19,13 +28,24 @@ from utxo_indexer.models import (
     UtxoBlock,
     UtxoTransaction,
 )
-from utxo_indexer.tests.data_for_testing.testing_process_block_bitcoin_data import block_example_bitcoin
+from utxo_indexer.models.partitions import range_partitions
+from utxo_indexer.tests.data_for_testing.testing_process_block_bitcoin_data import (
+    bitcoin_block_at,
+    block_example_bitcoin,
+    block_example_bitcoin_dict,
+    block_hash_at,
+)
 from utxo_indexer.utils import merkle_tree_from_address_strings
 
 # DISABLE LOGGING
 logging.disable(logging.CRITICAL)
 
 
+def backfill_indexer_client() -> IndexerClient:
+    """Indexer of backfill worker processes, module level so it can be pickled for spawned processes"""
+    return BtcIndexerClient(BtcClient(config.NODE_RPC_URL), 600, config)
+
+
 class BtcIndexerClientTest(TestCase):
     def setUp(self):
         self.configBTC = get_testing_config("TEST_BTC_V3", "btc")
@@ -244,6 +264,39 @@ class BtcIndexerClientTest(TestCase):
         self.assertEqual(tip_state.sync_state, TipSyncStateChoices.syncing)
         # self.assertGreater(tip_state.timestamp, timestamp_0)
 
+    @skipIf(prometheus_client is None, "prometheus_client is not installed")
+    @patch("client.btc_client.BtcClient.get_raw_block_by_hash")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    def test_process_block_metrics(self, mock_get_block_hash_from_height, mock_get_raw_block_by_hash):
+        """Processed blocks are counted and time of every stage is observed"""
+        assert prometheus_client is not None
+        registry = prometheus_client.REGISTRY
+        mock_get_block_hash_from_height.return_value = None
+        mock_get_raw_block_by_hash.return_value = copy.deepcopy(block_example_bitcoin_dict)
+
+        def sample(name, **labels):
+            return registry.get_sample_value(name, labels) or 0
+
+        stages = ["fetch", "structure", "resolve", "hash", "write"]
+        blocks = sample("utxo_indexer_blocks_total")
+        transactions = sample("utxo_indexer_transactions_total")
+        inputs = sample("utxo_indexer_inputs_total")
+        observations = [sample("utxo_indexer_stage_seconds_count", stage=stage) for stage in stages]
+
+        TipSyncState.instance().delete()
+        indexerBTC = BtcIndexerClient(self.clientBTC, 60, self.configBTC)
+        indexerBTC.update_tip_state_indexing(33240)
+        indexerBTC.process_block(33232)
+
+        self.assertEqual(sample("utxo_indexer_blocks_total"), blocks + 1)
+        self.assertEqual(sample("utxo_indexer_transactions_total"), transactions + 2)
+        self.assertEqual(sample("utxo_indexer_inputs_total"), inputs + 2)
+        for stage, count in zip(stages, observations):
+            self.assertEqual(sample("utxo_indexer_stage_seconds_count", stage=stage), count + 1, stage)
+        self.assertEqual(sample("utxo_indexer_indexed_height"), 33232)
+        self.assertEqual(sample("utxo_indexer_tip_height"), 33240)
+        self.assertEqual(sample("utxo_indexer_lag_blocks"), 8)
+
     @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
     @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
     def test_process_block(self, mock_get_block_by_hash, mock_get_block_hash_from_height):
@@ -262,6 +315,12 @@ class BtcIndexerClientTest(TestCase):
         tip_state = TipSyncState.instance()
         self.assertEqual(tip_state.latest_indexed_height, 33232)
 
+        # Partitions are created ahead of the processed block
+        self.assertEqual(indexerBTC.partitioned_up_to_height, 60000)
+        self.assertEqual(
+            [first for _, first, _ in range_partitions(UtxoTransaction._meta.db_table)], [30000, 40000, 50000]
+        )
+
         tx1 = UtxoTransaction.objects.get(pk="ea57078c1ec6f4670fa3eb49c6486257ba36f9c49a0ad94d3b6cf631a2e92ae5")
         assert tx1 is not None
         self.assertEqual(tx1.source_addresses_root, "0000000000000000000000000000000000000000000000000000000000000000")
@@ -276,6 +335,160 @@ class BtcIndexerClientTest(TestCase):
         # object_from_node_response and update_tip_state_done_block_process
         # have been tested already.
 
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    def test_process_block_db_writers(self, mock_get_block_by_hash, mock_get_block_hash_from_height):
+        """Copy and bulk_create writers should store the same rows"""
+        mock_get_block_by_hash.return_value = block_example_bitcoin
+        mock_get_block_hash_from_height.return_value = None
+
+        def stored_rows():
+            return [
+                list(model.objects.order_by(*order).values_list(*fields))
+                for model, order, fields in [
+                    (UtxoBlock, ["block_hash"], [f.attname for f in UtxoBlock._meta.concrete_fields]),
+                    (UtxoTransaction, ["transaction_id"], [f.attname for f in UtxoTransaction._meta.concrete_fields]),
+                    (
+                        TransactionInputCoinbase,
+                        ["transaction_link", "vin_n"],
+                        ["transaction_link", "vin_n", "vin_coinbase", "vin_sequence"],
+                    ),
+                    (
+                        TransactionInput,
+                        ["transaction_link", "vin_n"],
+                        [
+                            "transaction_link",
+                            "vin_n",
+                            "value",
+                            "script_key_address",
+                            "vin_previous_txid",
+                            "vin_vout_index",
+                        ],
+                    ),
+                    (
+                        TransactionOutput,
+                        ["transaction_link", "n"],
+                        [
+                            "transaction_link",
+                            "n",
+                            "value",
+                            "script_key_asm",
+                            "script_key_req_sigs",
+                            "script_key_address",
+                        ],
+                    ),
+                ]
+            ]
+
+        rows = {}
+        for db_writer in ["copy", "bulk_create"]:
+            TipSyncState.instance().delete()
+            for model in [TransactionInputCoinbase, TransactionInput, TransactionOutput, UtxoTransaction, UtxoBlock]:
+                model.objects.all().delete()
+            indexerBTC = BtcIndexerClient(self.clientBTC, 60, attrs.evolve(self.configBTC, DB_WRITER=db_writer))
+            indexerBTC.process_block(33232)
+            self.assertEqual(TipSyncState.instance().latest_indexed_height, 33232)
+            rows[db_writer] = stored_rows()
+
+        self.assertEqual(rows["copy"], rows["bulk_create"])
+        self.assertEqual([len(model_rows) for model_rows in rows["copy"]], [1, 2, 1, 1, 4])
+
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_raw_block_by_hash")
+    def test_process_block_range_pipelined(self, mock_get_raw_block_by_hash, mock_get_block_hash_from_height):
+        """Test for process_block_range method with prefetching enabled"""
+
+        mock_get_block_hash_from_height.side_effect = lambda height, worker: block_hash_at(height)
+        mock_get_raw_block_by_hash.side_effect = lambda block_hash, worker: bitcoin_block_at(int(block_hash, 16))
+        TipSyncState.instance().delete()
+        indexerBTC = BtcIndexerClient(self.clientBTC, 60, attrs.evolve(self.configBTC, PREFETCH_DEPTH=2))
+        indexerBTC.process_block_range(100, 109)
+
+        self.assertEqual(UtxoBlock.objects.count(), 10)
+        self.assertEqual(UtxoTransaction.objects.count(), 20)
+        self.assertEqual(
+            list(UtxoBlock.objects.order_by("block_number").values_list("block_number", flat=True)),
+            list(range(100, 110)),
+        )
+        self.assertEqual(TipSyncState.instance().latest_indexed_height, 109)
+        self.assertEqual(indexerBTC.latest_indexed_block_height, 109)
+
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    def test_backfill_block_range(self, mock_get_block_by_hash, mock_get_block_hash_from_height):
+        """Backfilled blocks are stored out of order, tip state only advances over contiguous blocks"""
+
+        mock_get_block_hash_from_height.side_effect = lambda height, worker: block_hash_at(height)
+        mock_get_block_by_hash.side_effect = lambda block_hash, worker: self.clientBTC.structure_block(
+            bitcoin_block_at(int(block_hash, 16))
+        )
+        TipSyncState.instance().delete()
+        indexerBTC = BtcIndexerClient(self.clientBTC, 60, self.configBTC)
+
+        # Later shard finished first
+        for height in [105, 106, 100, 101, 103]:
+            indexerBTC.backfill_block(height)
+        self.assertEqual(UtxoBlock.contiguous_height(100), 101)
+        self.assertEqual(UtxoBlock.contiguous_height(105), 106)
+        self.assertEqual(UtxoBlock.contiguous_height(102), 101)
+        self.assertEqual(UtxoBlock.indexed_heights(101, 105), {101, 103, 105})
+        self.assertEqual(TipSyncState.advance_indexed_height(), 101)
+        self.assertEqual(TipSyncState.instance().latest_indexed_height, 101)
+        self.assertEqual(indexerBTC.extract_initial_block_height(), 101)
+
+        # Indexer clients created by the factory are closed once the range is done
+        latest_indexed_height = backfill_block_range(
+            100, 107, 1, 3, lambda: BtcIndexerClient(self.clientBTC, 60, self.configBTC)
+        )
+        self.assertEqual(latest_indexed_height, 107)
+        self.assertEqual(UtxoBlock.objects.count(), 8)
+        self.assertEqual(TipSyncState.instance().latest_indexed_height, 107)
+
+        # Regular indexing skips blocks that are already stored and advances the tip over them
+        for height in [109, 110]:
+            indexerBTC.backfill_block(height)
+        indexerBTC.latest_indexed_block_height = 107
+        indexerBTC.process_block_range(108, 110)
+        self.assertEqual(
+            list(UtxoBlock.objects.order_by("block_number").values_list("block_number", flat=True)),
+            list(range(100, 111)),
+        )
+        self.assertEqual(indexerBTC.latest_indexed_block_height, 110)
+        self.assertEqual(TipSyncState.instance().latest_indexed_height, 110)
+
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    def test_process_block_range_catch_up_batches(self, mock_get_block_by_hash, mock_get_block_hash_from_height):
+        """Blocks far behind the tip are committed in batches, blocks close to the tip one by one"""
+
+        mock_get_block_hash_from_height.side_effect = lambda height, worker: block_hash_at(height)
+        mock_get_block_by_hash.side_effect = lambda block_hash, worker: self.clientBTC.structure_block(
+            bitcoin_block_at(int(block_hash, 16))
+        )
+        TipSyncState.instance().delete()
+        # Every example block has 9 rows, so batches are committed after 3 blocks
+        indexerBTC = BtcIndexerClient(
+            self.clientBTC,
+            60,
+            attrs.evolve(self.configBTC, CATCH_UP_LAG_BLOCKS=5, CATCH_UP_BATCH_ROWS=25, CATCH_UP_BATCH_SECONDS=60),
+        )
+        indexerBTC.latest_tip_block_height = 112
+
+        with patch.object(indexerBTC, "save_processed_blocks", wraps=indexerBTC.save_processed_blocks) as save:
+            indexerBTC.process_block_range(100, 109)
+
+        # Blocks up to 107 are at least 5 blocks behind the tip, pending blocks are committed once lag drops
+        self.assertEqual(
+            [[height for height, _ in call.args[0]] for call in save.call_args_list],
+            [[100, 101, 102], [103, 104, 105], [106, 107, 108], [109]],
+        )
+        self.assertEqual(UtxoBlock.objects.count(), 10)
+        self.assertEqual(UtxoTransaction.objects.count(), 20)
+        self.assertEqual(TransactionOutput.objects.count(), 40)
+        self.assertEqual(TipSyncState.instance().latest_indexed_height, 109)
+        self.assertEqual(indexerBTC.latest_indexed_block_height, 109)
+        self.assertEqual(indexerBTC.pending_blocks, [])
+
     def test_process_block_real_example(self):
         """Test for process_block method"""
         """This time we use real block and no mock functions"""
@@ -319,3 +532,36 @@ class BtcIndexerClientRealBTCTest(TestCase):
 
         tx = UtxoTransaction.objects.get(pk="f5d78b32b1684f040c5142bd6a814f391a216dc39848c4c3e4cfd3f02336b1c9")
         self.assertEqual(tx.source_addresses_root, "23699dbbba39d81c44489afe2da832f67038c710fbfb04a2be5a1a0e663da6be")
+
+
+class BackfillProcessPoolTest(TransactionTestCase):
+    """Worker processes commit blocks with their own db connections, so the test can not run in a transaction"""
+
+    def test_backfill_block_range_processes(self):
+        """Blocks are indexed by spawned worker processes, which read config and db settings from the environment"""
+        profile = ChainProfile(blocks=6, transactions=(2, 5))
+        data = ChainGenerator("btc", profile, start_height=100, amount=json_amount).generate_data()
+        server = MockNodeServer(MockNode(data))
+        environ = {
+            "SOURCE_NAME": "btc",
+            "NODE_RPC_URL": server.start(),
+            "INITIAL_BLOCK_HEIGHT": "100",
+            "DB_NAME": connection.settings_dict["NAME"],
+        }
+        try:
+            with patch.dict(os.environ, environ):
+                latest_indexed_height = backfill_block_range(100, 105, 2, 2, backfill_indexer_client)
+        finally:
+            server.stop()
+
+        self.assertEqual(latest_indexed_height, 105)
+        self.assertEqual(TipSyncState.instance().latest_indexed_height, 105)
+        self.assertEqual(
+            list(UtxoBlock.objects.order_by("block_number").values_list("block_number", flat=True)),
+            list(range(100, 106)),
+        )
+        self.assertEqual(UtxoTransaction.objects.count(), sum(len(block["tx"]) for block in data.blocks.values()))
+
+        # Worker processes import the factory by its path
+        with self.assertRaises(ValueError):
+            backfill_block_range(100, 105, 2, 2, lambda: backfill_indexer_client())
@@ -0,0 +1,194 @@
+import logging
+import threading
+from functools import partial
+from unittest.mock import patch
+
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+
+from utxo_indexer.management.commands.block_pruning import Command
+from utxo_indexer.models import TransactionOutput, UtxoBlock, UtxoTransaction
+from utxo_indexer.models.partitions import (
+    PARTITIONED_MODELS,
+    create_block_partitions,
+    drop_block_partitions_below,
+    range_partitions,
+)
+from utxo_indexer.models.sync_state import PruneSyncState
+from utxo_indexer.tests.data_for_testing.testing_models_data import vout_example
+
+logging.disable(logging.CRITICAL)
+
+
+def index_blocks():
+    # Blocks 0-9 in range partitions, blocks 10-14 in default partitions
+    create_block_partitions(0, 10, 5)
+    for block_number in range(15):
+        UtxoBlock(
+            block_hash=f"{block_number:064x}",
+            block_number=block_number,
+            timestamp=block_number,
+            previous_block_hash=f"{max(block_number - 1, 0):064x}",
+            transactions=1,
+            confirmed=True,
+        ).save()
+        transaction = UtxoTransaction(
+            transaction_id=f"{block_number + 100:064x}",
+            block_number=block_number,
+            timestamp=block_number,
+            payment_reference=None,
+            is_native_payment=True,
+            transaction_type="full_payment",
+        )
+        transaction.save()
+        TransactionOutput.object_from_node_response(vout_example, transaction).save()
+
+
+def in_other_connection(function):
+    """Runs the function in a thread, which uses its own db connection, and returns its result"""
+    result = {}
+
+    def run():
+        try:
+            result["value"] = function()
+        except Exception as e:
+            result["error"] = e
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def read_and_write_blocks() -> int:
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = 1000")
+        count = UtxoBlock.objects.count()
+        block = UtxoBlock(
+            block_hash="f" * 64,
+            block_number=100,
+            timestamp=100,
+            previous_block_hash="0" * 64,
+            transactions=0,
+            confirmed=True,
+        )
+        block.save()
+        block.delete()
+    return count
+
+
+class BlockPruningTest(TestCase):
+    def setUp(self):
+        index_blocks()
+
+    @patch("utxo_indexer.management.commands.block_pruning.time.sleep")
+    def test_prune_below(self, mock_sleep):
+        prune_state = PruneSyncState.instance()
+        tail_heights = []
+        with patch.object(Command, "update_prune_state", autospec=True) as mock_update_prune_state:
+            mock_update_prune_state.side_effect = lambda command, state: tail_heights.append(
+                UtxoBlock.objects.order_by("block_number").first().block_number
+            )
+            Command().prune_below(prune_state, 13, chunk_blocks=3, pause_seconds=1)
+
+        # Chunks [0, 3), [3, 6), [6, 9), [9, 12), [12, 13), rows of partitions that are not expired yet are deleted
+        self.assertEqual(tail_heights, [3, 6, 9, 12, 13])
+        self.assertEqual(
+            list(UtxoBlock.objects.order_by("block_number").values_list("block_number", flat=True)), [13, 14]
+        )
+        self.assertEqual(
+            list(UtxoTransaction.objects.values_list("block_number", flat=True).order_by("block_number")), [13, 14]
+        )
+        self.assertEqual(TransactionOutput.objects.count(), 2)
+        for model in PARTITIONED_MODELS:
+            self.assertEqual(range_partitions(model._meta.db_table), [])
+        # Pause between chunks
+        self.assertEqual(mock_sleep.call_count, 4)
+
+    @patch("utxo_indexer.management.commands.block_pruning.time.sleep")
+    @patch("utxo_indexer.management.commands.block_pruning.PRUNE_CHUNKS")
+    def test_prune_below_skips_empty_chunks(self, mock_prune_chunks, mock_sleep):
+        """Chunks without blocks are not counted and not followed by a pause"""
+        for model in (TransactionOutput, UtxoTransaction, UtxoBlock):
+            model.objects.filter(block_number__gte=5, block_number__lt=9).delete()
+        prune_state = PruneSyncState.instance()
+        Command().prune_below(prune_state, 13, chunk_blocks=3, pause_seconds=1)
+
+        # Chunk [6, 9) is empty, chunk [3, 6) dropped the partition of blocks [0, 5)
+        self.assertEqual(mock_prune_chunks.inc.call_count, 4)
+        self.assertEqual(mock_sleep.call_count, 3)
+        self.assertEqual(PruneSyncState.instance().latest_indexed_tail_height, 13)
+
+    @patch("utxo_indexer.management.commands.block_pruning.time.sleep")
+    def test_prune_below_updates_prune_state(self, mock_sleep):
+        prune_state = PruneSyncState.instance()
+        Command().prune_below(prune_state, 7, chunk_blocks=100, pause_seconds=0)
+
+        self.assertEqual(PruneSyncState.instance().latest_indexed_tail_height, 7)
+        self.assertEqual(mock_sleep.call_count, 0)
+
+
+class BlockPruningLockTest(TransactionTestCase):
+    def setUp(self):
+        # Partitions created by other test cases outlive their truncated rows
+        drop_block_partitions_below(2**31)
+        index_blocks()
+
+    @patch("utxo_indexer.management.commands.block_pruning.time.sleep")
+    def test_prune_below_keeps_parents_available(self, mock_sleep):
+        """Tables stay readable and writable while the rest of a chunk is pruned after dropping partitions"""
+        prune_state = PruneSyncState.instance()
+        counts = []
+        with patch.object(Command, "update_prune_state", autospec=True) as mock_update_prune_state:
+            mock_update_prune_state.side_effect = lambda command, state: counts.append(
+                in_other_connection(read_and_write_blocks)
+            )
+            Command().prune_below(prune_state, 10, chunk_blocks=10, pause_seconds=0)
+
+        self.assertEqual(counts, [5])
+        self.assertEqual(in_other_connection(read_and_write_blocks), 5)
+
+    @patch("utxo_indexer.management.commands.block_pruning.time.sleep")
+    def test_prune_below_lock_timeout(self, mock_sleep):
+        """
+        Lock timeout on the block table, whose partitions are detached last, keeps the partitions of the range in all
+        tables, their rows are still deleted, so the tables stay pruned to the same height, and the empty partitions
+        are dropped by a later run
+        """
+        locked = threading.Event()
+        release = threading.Event()
+
+        def lock_blocks():
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {UtxoBlock._meta.db_table} IN ACCESS SHARE MODE")
+                locked.set()
+                release.wait(10)
+
+        prune_state = PruneSyncState.instance()
+        thread = threading.Thread(target=in_other_connection, args=(lock_blocks,))
+        thread.start()
+        try:
+            locked.wait(10)
+            with patch(
+                "utxo_indexer.management.commands.block_pruning.drop_block_partitions_below",
+                partial(drop_block_partitions_below, lock_timeout_ms=100),
+            ):
+                Command().prune_below(prune_state, 10, chunk_blocks=10, pause_seconds=0)
+        finally:
+            release.set()
+            thread.join()
+
+        for model in PARTITIONED_MODELS:
+            self.assertEqual([first for _, first, _ in range_partitions(model._meta.db_table)], [0, 5])
+        self.assertEqual(PruneSyncState.instance().latest_indexed_tail_height, 10)
+        self.assertEqual(UtxoTransaction.objects.count(), 5)
+
+        Command().prune_below(prune_state, 10, chunk_blocks=10, pause_seconds=0)
+        for model in PARTITIONED_MODELS:
+            self.assertEqual(range_partitions(model._meta.db_table), [])
+        self.assertEqual(PruneSyncState.instance().latest_indexed_tail_height, 10)
+        self.assertEqual(UtxoBlock.objects.count(), 5)
@@ -1,12 +1,17 @@
+import copy
+import json
 import logging
-from unittest.mock import patch
+import re
+from unittest.mock import Mock, patch
 
+import requests
 from django.test import TestCase
 from requests.models import HTTPBasicAuth
 from requests.sessions import Session
 
 from client.btc_client import BtcClient
 from configuration.config import get_testing_config
+from utxo_indexer.indexer.decorators import RetryPolicy, retry
 from utxo_indexer.models.types import (
     BlockResponse,
     CoinbaseVinResponse,
@@ -18,11 +23,18 @@ from utxo_indexer.models.types import (
     VoutResponse,
 )
 from utxo_indexer.tests.data_for_testing.testing_addresses_data import tx_example_adress
+from utxo_indexer.tests.data_for_testing.testing_process_block_bitcoin_data import block_example_bitcoin_dict
 
 # DISABLE LOGGING
 logging.disable(logging.CRITICAL)
 
 
+def node_response_body(result, request_id: int | str = "rpc") -> bytes:
+    """Serializes the result as a node response body, amounts are sent as json numbers like the node sends them"""
+    body = json.dumps({"result": result, "error": None, "id": request_id})
+    return re.sub(r'"value": "(-?[0-9.]+)"', r'"value": \1', body).encode()
+
+
 class BtcClientTest(TestCase):
     def setUp(self):
         self.config = get_testing_config("TEST_BTC_V3", "btc")
@@ -91,6 +103,58 @@ class BtcClientTest(TestCase):
         self.assertEqual(vins[2]["prevout"]["scriptPubKey"]["address"], "address1")
         self.assertEqual(vins[3]["prevout"]["scriptPubKey"]["address"], "")
 
+    def test_structure_block_msgspec(self):
+        """Blocks decoded with msgspec are the same as blocks decoded with json and structured with cattrs"""
+        tx = copy.deepcopy(tx_example_adress)
+        tx["txid"] = "ab" * 32
+        for i, vin in enumerate(tx["vin"]):
+            vin["txid"] = "cd" * 32
+            vin["prevout"]["value"] = f"{i}.0000000{i}"
+        for i, vout in enumerate(tx["vout"]):
+            vout["n"] = i
+            vout["value"] = f"{i}.10000000"
+        block = copy.deepcopy(block_example_bitcoin_dict)
+        block["tx"].append(tx)
+
+        client = BtcClient(self.config.NODE_RPC_URL, "msgspec")
+        response = Mock()
+        response.content = node_response_body(block)
+        response.json.side_effect = lambda parse_float: json.loads(response.content, parse_float=parse_float)
+        with patch.object(client, "_post", return_value=response):
+            raw_block = client.get_raw_block_by_hash(self.session, block["hash"])
+        self.assertEqual(raw_block, response.content)
+
+        res_block = client.structure_block(raw_block)
+        self.assertEqual(res_block, self.clientBTC.structure_block(response.json(parse_float=str)["result"]))
+        # Amounts keep their exact representation
+        self.assertEqual(res_block.tx[0].vout[1].value, "0.00000000")
+        vin = res_block.tx[-1].vin[1]
+        assert isinstance(vin, VinResponse) and vin.prevout is not None
+        self.assertEqual(vin.prevout.value, "1.00000001")
+        # Addresses are normalized while decoding
+        self.assertEqual([vout.scriptPubKey.address for vout in res_block.tx[-1].vout], ["", "address", "address1", ""])
+        self.assertEqual([vout.scriptPubKey.reqSigs for vout in res_block.tx[-1].vout][:2], [100, None])
+
+    def test_get_raw_block_by_hash_overloaded(self):
+        """Busy node answers with a plain text 503, which is retried instead of failing to decode"""
+        client = BtcClient(self.config.NODE_RPC_URL, "msgspec")
+        overloaded = requests.Response()
+        overloaded.status_code = 503
+        overloaded._content = b"Work queue depth exceeded"
+        response = Mock()
+        response.content = node_response_body(block_example_bitcoin_dict)
+
+        with patch.object(client, "_post", return_value=overloaded):
+            with self.assertRaises(requests.HTTPError) as context:
+                client.get_raw_block_by_hash(self.session, block_example_bitcoin_dict["hash"])
+        self.assertTrue(RetryPolicy().is_retryable(context.exception))
+
+        get_raw_block_by_hash = retry(3, policy=RetryPolicy(base_delay=0))(client.get_raw_block_by_hash)
+        with patch.object(client, "_post", side_effect=[overloaded, response]) as mock_post:
+            raw_block = get_raw_block_by_hash(self.session, block_example_bitcoin_dict["hash"])
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(raw_block, response.content)
+
     def test_get_block_hash_from_height(self):
         """Test for get_block_hash_from_height method"""
         response = self.clientBTC.get_block_hash_from_height(self.session, 3127876)
@@ -0,0 +1,101 @@
+import logging
+import tempfile
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from client.btc_client import BtcClient
+from client.doge_client import DogeClient
+from utxo_indexer.chain_generator import ChainGenerator, ChainProfile
+from utxo_indexer.mock_node import MockNodeData, json_amount
+
+# DISABLE LOGGING
+logging.disable(logging.CRITICAL)
+
+PROFILE = ChainProfile(
+    blocks=4,
+    transactions=(5, 10),
+    consolidations=1,
+    consolidation_inputs=1500,
+    payouts=1,
+    payout_outputs=300,
+    spend_chain_length=20,
+    op_return_share=0.5,
+    addresses=50,
+)
+
+
+class ChainGeneratorTest(SimpleTestCase):
+    def assert_consistent(self, blocks: list[dict]) -> None:
+        """Every input spends an unspent output of an earlier transaction, amounts of inputs and outputs add up"""
+        unspent = {}
+        previous = None
+        for block in blocks:
+            if previous is not None:
+                self.assertEqual(block["height"], previous["height"] + 1)
+                self.assertEqual(block["previousblockhash"], previous["hash"])
+                self.assertGreater(block["mediantime"], previous["mediantime"])
+            coinbase_outputs = {}
+            for i, tx in enumerate(block["tx"]):
+                outputs = {(tx["txid"], vout["n"]): Decimal(vout["value"]) for vout in tx["vout"]}
+                if i == 0:
+                    self.assertIn("coinbase", tx["vin"][0])
+                    coinbase_outputs = outputs
+                    continue
+                spent = [unspent.pop((vin["txid"], vin["vout"])) for vin in tx["vin"]]
+                self.assertEqual(sum(spent), sum(outputs.values()))
+                unspent.update(outputs)
+            unspent.update(coinbase_outputs)
+            previous = block
+
+    def test_btc_chain(self):
+        blocks = list(ChainGenerator("btc", PROFILE, start_height=100).generate())
+        self.assertEqual([block["height"] for block in blocks], [100, 101, 102, 103])
+        self.assert_consistent(blocks)
+
+        # Worst case transactions are generated in every block after the first one
+        block = blocks[-1]
+        self.assertTrue(any(len(tx["vin"]) == 1500 for tx in block["tx"]))
+        self.assertTrue(any(len(tx["vout"]) == 300 for tx in block["tx"]))
+        in_block = {tx["txid"] for tx in block["tx"]}
+        self.assertGreaterEqual(sum(vin.get("txid") in in_block for tx in block["tx"] for vin in tx["vin"]), 19)
+
+        op_returns = [
+            vout
+            for block in blocks
+            for tx in block["tx"]
+            for vout in tx["vout"]
+            if vout["scriptPubKey"]["type"] == "nulldata"
+        ]
+        self.assertTrue(any(vout["scriptPubKey"]["hex"].startswith("6a20") for vout in op_returns))
+
+        # Prevouts match the spent outputs
+        vin = block["tx"][1]["vin"][0]
+        self.assertEqual(set(vin["prevout"]), {"value", "scriptPubKey"})
+        # Blocks are shaped like node responses, so clients structure them
+        self.assertEqual(len(BtcClient("").structure_block(block).tx), len(block["tx"]))
+
+    def test_doge_chain(self):
+        blocks = list(ChainGenerator("doge", PROFILE).generate())
+        self.assert_consistent(blocks)
+        self.assertTrue(all("prevout" not in vin for block in blocks for tx in block["tx"] for vin in tx["vin"]))
+        self.assertEqual(blocks[0]["tx"][0]["vout"][0]["scriptPubKey"]["addresses"][0][0], "D")
+        self.assertEqual(len(DogeClient("").structure_block(blocks[-1]).tx), len(blocks[-1]["tx"]))
+
+    def test_same_seed_same_chain(self):
+        profile = ChainProfile(blocks=3, transactions=(1, 5))
+        first = list(ChainGenerator("btc", profile, seed=7).generate())
+        self.assertEqual(first, list(ChainGenerator("btc", profile, seed=7).generate()))
+        self.assertNotEqual(first, list(ChainGenerator("btc", profile, seed=8).generate()))
+
+    def test_save_fixtures(self):
+        data = ChainGenerator("doge", ChainProfile(blocks=3, transactions=(1, 5)), amount=json_amount).generate_data()
+        with tempfile.TemporaryDirectory() as directory:
+            data.save(directory)
+            loaded = MockNodeData.from_directory(directory)
+
+        self.assertEqual(set(loaded.blocks), set(data.blocks))
+        self.assertEqual(set(loaded.transactions), set(data.transactions))
+        self.assertEqual(loaded.chain_info["chain"], "regtest")
+        tip = loaded.blocks[loaded.tip_height]["tx"][0]["vout"][0]["value"]
+        self.assertEqual(bytes(tip), b"10000.00000000")
@@ -1,15 +1,26 @@
+import asyncio
+import copy
+import json
 import logging
+import threading
 from unittest.mock import patch
 
+import attrs
+import cattrs
+import httpx
 from django.test import TestCase
 from requests.models import HTTPBasicAuth
 from requests.sessions import Session
 
+from client.async_rpc import AsyncRpcEngine
 from client.doge_client import DogeClient
 from configuration.config import get_testing_config
 from configuration.types import Config
+from utxo_indexer.indexer.cache import OutpointCache, _entry_size
+from utxo_indexer.indexer.decorators import RetryError
 from utxo_indexer.indexer.doge import DogeIndexerClient
 from utxo_indexer.indexer.indexer_client import IndexerClient
+from utxo_indexer.indexer.types import BlockProcessorMemory
 from utxo_indexer.models import (
     TipSyncState,
     TipSyncStateChoices,
@@ -19,9 +30,12 @@ from utxo_indexer.models import (
     UtxoBlock,
     UtxoTransaction,
 )
+from utxo_indexer.models.types import BlockResponse, TransactionResponse
 from utxo_indexer.tests.data_for_testing.testing_process_block_doge_data import (
     block_example_doge,
+    block_example_doge_dict,
     tx_example1_doge,
+    tx_example1_doge_dict,
     tx_example2_doge,
 )
 from utxo_indexer.utils import merkle_tree_from_address_strings
@@ -30,6 +44,11 @@ from utxo_indexer.utils import merkle_tree_from_address_strings
 logging.disable(logging.CRITICAL)
 
 
+def get_example_transactions(txids, worker):
+    transactions = {tx.txid: tx for tx in [tx_example1_doge, tx_example2_doge]}
+    return {txid: transactions[txid] for txid in txids}
+
+
 class DogeIndexerClientTest(TestCase):
     def setUp(self):
         self.configDoge = get_testing_config("DOGE", "doge")
@@ -77,6 +96,19 @@ class DogeIndexerClientTest(TestCase):
         self.assertEqual(indexerDoge.latest_indexed_block_height, 7)
         self.assertEqual(indexerDoge.latest_tip_block_height, 0)
 
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient.extract_initial_block_height")
+    def test_connect_workers(self, mock_extract_initial_block_height):
+        """Worker sessions are sized by the rpc engine in use"""
+        mock_extract_initial_block_height.return_value = 7
+        for changes, number_of_workers in [
+            ({"NUMBER_OF_WORKERS": 3}, 3),
+            ({"NUMBER_OF_WORKERS": 3, "RPC_CONCURRENCY_MAX": 8}, 8),
+            ({"NUMBER_OF_WORKERS": 3, "RPC_CONCURRENCY_MAX": 8, "RPC_ENGINE": "asyncio"}, 1),
+        ]:
+            indexerDoge = DogeIndexerClient(self.clientDoge, 9, attrs.evolve(self.configDoge, **changes))
+            self.assertEqual(len(indexerDoge.workers), number_of_workers, changes)
+            indexerDoge.close()
+
     def test_default(self):
         """Test for default"""
         # Nothing to test, we have tested IndexerClient.new and DogeClient.default() already.
@@ -257,11 +289,11 @@ class DogeIndexerClientTest(TestCase):
 
     @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
     @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
-    @patch("utxo_indexer.indexer.doge.DogeIndexerClient._get_transaction")
-    def test_process_block(self, mock_get_transaction, mock_get_block_by_hash, mock_get_block_hash_from_height):
+    @patch("utxo_indexer.indexer.doge.DogeIndexerClient._get_transactions")
+    def test_process_block(self, mock_get_transactions, mock_get_block_by_hash, mock_get_block_hash_from_height):
         mock_get_block_by_hash.return_value = block_example_doge
         mock_get_block_hash_from_height.return_value = None
-        mock_get_transaction.side_effect = [tx_example1_doge, tx_example2_doge]
+        mock_get_transactions.side_effect = get_example_transactions
         TipSyncState.instance().delete()
         indexerDoge = DogeIndexerClient(self.clientDoge, 60, self.configDoge)
         indexerDoge.process_block(33232)
@@ -290,6 +322,197 @@ class DogeIndexerClientTest(TestCase):
         # object_from_node_response and update_tip_state_done_block_process
         # have been tested already.
 
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    def test_process_block_asyncio_engine(self, mock_get_block_by_hash, mock_get_block_hash_from_height):
+        """Prevout transactions are fetched by the asyncio engine, limited to max in flight requests"""
+        mock_get_block_by_hash.return_value = block_example_doge
+        mock_get_block_hash_from_height.return_value = None
+        transactions = {tx.txid: cattrs.unstructure(tx) for tx in [tx_example1_doge, tx_example2_doge]}
+        in_flight = []
+        requested = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            in_flight.append(request)
+            max_in_flight = len(in_flight)
+            await asyncio.sleep(0.01)
+            in_flight.remove(request)
+            batch = json.loads(request.content)
+            requested.extend(r["params"][0] for r in batch)
+            self.assertEqual(max_in_flight, 1)
+            return httpx.Response(200, json=[{"id": r["id"], "result": transactions[r["params"][0]]} for r in batch])
+
+        config = attrs.evolve(self.configDoge, RPC_ENGINE="asyncio", RPC_BATCH_SIZE=1, RPC_MAX_IN_FLIGHT=1)
+        indexerDoge = DogeIndexerClient(self.clientDoge, 60, config)
+        assert indexerDoge.rpc_engine is not None
+        indexerDoge.rpc_engine.close()
+        indexerDoge.rpc_engine = AsyncRpcEngine(
+            self.clientDoge.url, ("", ""), config.RPC_MAX_IN_FLIGHT, transport=httpx.MockTransport(handler)
+        )
+        try:
+            indexerDoge.process_block(33232)
+        finally:
+            indexerDoge.close()
+        self.assertTrue(indexerDoge.rpc_engine._loop.is_closed())
+        self.assertEqual(indexerDoge.workers, [])
+
+        self.assertEqual(sorted(requested), sorted(transactions.keys()))
+        self.assertEqual(TransactionInput.objects.count(), 2)
+        tx2 = UtxoTransaction.objects.get(pk="cb09112278043f486e0e1b649d58c08e962958f2115d210f82f1ca9a13484ea2")
+        root = merkle_tree_from_address_strings(
+            ["DPgQ2fAm2VGKHmFAWi1WiyitfNZMbwKbc6", "DPgQ2fAm2VGKHmFAWi1WiyitfNZMbwKbc6"]
+        ).root
+        assert root is not None
+        self.assertEqual(tx2.source_addresses_root, root[2:])
+
+    @patch("utxo_indexer.indexer.doge.DogeIndexerClient._get_transactions")
+    def test_fetch_pre_vout_transactions_threaded_error(self, mock_get_transactions):
+        """Failed batch is raised to the caller after all workers finish, instead of leaving the queue unfinished"""
+        mock_get_transactions.side_effect = RetryError([ConnectionError("node unavailable")])
+        config = attrs.evolve(self.configDoge, NUMBER_OF_WORKERS=2)
+        indexerDoge = DogeIndexerClient(self.clientDoge, 60, config)
+        batches = [{f"{i:064x}": []} for i in range(5)]
+        result = {}
+
+        def fetch():
+            try:
+                indexerDoge._fetch_pre_vout_transactions_threaded(batches, BlockProcessorMemory())
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=fetch, daemon=True)
+        thread.start()
+        thread.join(10)
+        indexerDoge.close()
+
+        self.assertFalse(thread.is_alive())
+        self.assertIsInstance(result["error"], RetryError)
+        # Remaining batches are not requested after the first failure
+        self.assertLessEqual(mock_get_transactions.call_count, 2)
+
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    @patch("utxo_indexer.indexer.doge.DogeIndexerClient._get_transactions")
+    def test_process_block_prevouts_from_db(
+        self, mock_get_transactions, mock_get_block_by_hash, mock_get_block_hash_from_height
+    ):
+        """Prevouts already stored in db should not be fetched from the node"""
+        mock_get_block_by_hash.return_value = block_example_doge
+        mock_get_block_hash_from_height.return_value = None
+        mock_get_transactions.side_effect = get_example_transactions
+        TipSyncState.instance().delete()
+
+        parent = UtxoTransaction.object_from_node_response(tx_example1_doge, 33231, 1729575000)
+        parent.save()
+        TransactionOutput.object_from_node_response(tx_example1_doge.vout[0], parent).save()
+
+        indexerDoge = DogeIndexerClient(self.clientDoge, 60, self.configDoge)
+        indexerDoge.process_block(33232)
+
+        self.assertEqual(mock_get_transactions.call_count, 1)
+        self.assertEqual(mock_get_transactions.call_args.args[0], [tx_example2_doge.txid])
+        self.assertEqual(TransactionInput.objects.count(), 2)
+        db_input = TransactionInput.objects.get(vin_previous_txid=tx_example1_doge.txid)
+        self.assertEqual(db_input.value, tx_example1_doge.vout[0].value)
+        self.assertEqual(db_input.script_key_address, tx_example1_doge.vout[0].scriptPubKey.address)
+
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    @patch("utxo_indexer.indexer.doge.DogeIndexerClient._get_transactions")
+    def test_process_block_prevouts_from_same_block(
+        self, mock_get_transactions, mock_get_block_by_hash, mock_get_block_hash_from_height
+    ):
+        """Prevouts created in the same block should be resolved without db or node"""
+        block_dict = copy.deepcopy(block_example_doge_dict)
+        parent = block_dict["tx"][1]
+        child = copy.deepcopy(parent)
+        child["txid"] = "c" * 64
+        child["vin"] = [
+            {
+                "txid": parent["txid"],
+                "vout": 1,
+                "scriptSig": {"asm": "", "hex": ""},
+                "prevout": None,
+                "sequence": 4294967293,
+            }
+        ]
+        block_dict["tx"].append(child)
+        mock_get_block_by_hash.return_value = cattrs.structure(block_dict, BlockResponse)
+        mock_get_block_hash_from_height.return_value = None
+        mock_get_transactions.side_effect = get_example_transactions
+        TipSyncState.instance().delete()
+
+        indexerDoge = DogeIndexerClient(self.clientDoge, 60, self.configDoge)
+        indexerDoge.process_block(33232)
+
+        self.assertEqual(mock_get_transactions.call_count, 1)
+        self.assertEqual(mock_get_transactions.call_args.args[0], [tx_example1_doge.txid, tx_example2_doge.txid])
+        self.assertEqual(TransactionInput.objects.count(), 3)
+        child_input = TransactionInput.objects.get(transaction_link_id="c" * 64)
+        self.assertEqual(child_input.value, parent["vout"][1]["value"])
+        self.assertEqual(child_input.script_key_address, parent["vout"][1]["scriptPubKey"]["address"])
+
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    @patch("utxo_indexer.indexer.doge.DogeIndexerClient._get_transactions")
+    def test_process_block_prevouts_deduplicated(
+        self, mock_get_transactions, mock_get_block_by_hash, mock_get_block_hash_from_height
+    ):
+        """Prevout transaction spent by multiple inputs should be fetched only once"""
+        parent_dict = copy.deepcopy(tx_example1_doge_dict)
+        second_vout = copy.deepcopy(parent_dict["vout"][0])
+        second_vout["n"] = 1
+        second_vout["value"] = "1.00000000"
+        parent_dict["vout"].append(second_vout)
+        parent = cattrs.structure(parent_dict, TransactionResponse)
+
+        block_dict = copy.deepcopy(block_example_doge_dict)
+        block_dict["tx"][1]["vin"][0]["vout"] = 1
+        block_dict["tx"][1]["vin"][1]["txid"] = parent.txid
+        mock_get_block_by_hash.return_value = cattrs.structure(block_dict, BlockResponse)
+        mock_get_block_hash_from_height.return_value = None
+        mock_get_transactions.return_value = {parent.txid: parent}
+        TipSyncState.instance().delete()
+
+        indexerDoge = DogeIndexerClient(self.clientDoge, 60, self.configDoge)
+        indexerDoge.process_block(33232)
+
+        self.assertEqual(mock_get_transactions.call_count, 1)
+        self.assertEqual(mock_get_transactions.call_args.args[0], [parent.txid])
+        self.assertEqual(
+            sorted(TransactionInput.objects.values_list("vin_n", "n", "value")),
+            [(0, 1, "1.00000000"), (1, 0, "399.52283620")],
+        )
+
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_hash_from_height")
+    @patch("utxo_indexer.indexer.indexer_client.IndexerClient._get_block_by_hash")
+    @patch("utxo_indexer.indexer.doge.DogeIndexerClient._get_transactions")
+    def test_process_block_prevouts_from_cache(
+        self, mock_get_transactions, mock_get_block_by_hash, mock_get_block_hash_from_height
+    ):
+        """Cached prevouts should be resolved without db or node and unspent outputs should be cached"""
+        mock_get_block_by_hash.return_value = block_example_doge
+        mock_get_block_hash_from_height.return_value = None
+        mock_get_transactions.side_effect = get_example_transactions
+        TipSyncState.instance().delete()
+
+        indexerDoge = DogeIndexerClient(self.clientDoge, 60, self.configDoge)
+        indexerDoge.utxo_cache.put((tx_example1_doge.txid, 0), tx_example1_doge.vout[0])
+        indexerDoge.process_block(33232)
+
+        self.assertEqual(mock_get_transactions.call_count, 1)
+        self.assertEqual(mock_get_transactions.call_args.args[0], [tx_example2_doge.txid])
+        self.assertEqual(TransactionInput.objects.count(), 2)
+        self.assertEqual(indexerDoge.utxo_cache.hits, 1)
+        self.assertEqual(indexerDoge.utxo_cache.misses, 1)
+
+        # Spent outputs are removed, outputs of the processed block are added
+        cached = indexerDoge.utxo_cache.take_many([(tx_example1_doge.txid, 0)])
+        self.assertEqual(cached, {})
+        outpoints = [(tx.txid, vout.n) for tx in block_example_doge.tx for vout in tx.vout]
+        cached = indexerDoge.utxo_cache.take_many(outpoints)
+        self.assertEqual(len(cached), len(outpoints))
+
     def test_process_block_real_example(self):
         """Test for process_block method"""
         """This time we use real block and no mock functions"""
@@ -307,3 +530,36 @@ class DogeIndexerClientTest(TestCase):
         # Nothing else needs to be tested here,
         # object_from_node_response and update_tip_state_done_block_process
         # have been tested already.
+
+
+class OutpointCacheTest(TestCase):
+    def test_take_many(self):
+        cache = OutpointCache(1024 * 1024)
+        cache.put_many([(("a" * 64, 0), tx_example1_doge.vout[0]), (("b" * 64, 1), tx_example2_doge.vout[0])])
+
+        found = cache.take_many([("a" * 64, 0), ("c" * 64, 0)])
+        self.assertEqual(found, {("a" * 64, 0): tx_example1_doge.vout[0]})
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+        # An output can only be spent once
+        self.assertEqual(cache.take_many([("a" * 64, 0)]), {})
+
+    def test_eviction(self):
+        vout = tx_example1_doge.vout[0]
+        cache = OutpointCache(3 * _entry_size(vout))
+        cache.put_many([((str(i) * 64, 0), vout) for i in range(5)])
+
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.evictions, 2)
+        self.assertLessEqual(cache.size_bytes, cache.max_size_bytes)
+        # Least recently added outputs are evicted first
+        self.assertEqual(cache.take_many([("0" * 64, 0), ("1" * 64, 0)]), {})
+        self.assertEqual(len(cache.take_many([(str(i) * 64, 0) for i in range(2, 5)])), 3)
+        self.assertEqual(cache.size_bytes, 0)
+
+    def test_disabled(self):
+        cache = OutpointCache(0)
+        cache.put(("a" * 64, 0), tx_example1_doge.vout[0])
+        self.assertEqual(len(cache), 0)
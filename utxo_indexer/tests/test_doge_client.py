@@ -1,11 +1,17 @@
+import copy
+import json
 import logging
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
-from django.test import TestCase
+import requests
+from django.test import SimpleTestCase, TestCase
 from requests.models import HTTPBasicAuth
 from requests.sessions import Session
 
+from client.concurrency import AimdConcurrencyController
 from client.doge_client import DogeClient
+from client.errors import RpcError
+from client.raw_block import DOGE_ADDRESS_VERSIONS, RawBlockError
 from configuration.config import get_testing_config
 from utxo_indexer.models.types import (
     BlockResponse,
@@ -17,6 +23,16 @@ from utxo_indexer.models.types import (
     VoutResponse,
 )
 from utxo_indexer.tests.data_for_testing.testing_addresses_data import tx_example_adress
+from utxo_indexer.tests.data_for_testing.testing_process_block_doge_data import (
+    block_example_doge,
+    block_example_doge_dict,
+    tx_example1_doge,
+    tx_example1_doge_dict,
+    tx_example2_doge,
+    tx_example2_doge_dict,
+)
+from utxo_indexer.tests.test_btc_client import node_response_body
+from utxo_indexer.tests.test_raw_block import GENESIS_BLOCK_HEX
 
 # DISABLE LOGGING
 logging.disable(logging.CRITICAL)
@@ -48,7 +64,7 @@ class DogeClientTest(TestCase):
 
     def test_check_adress_reqSigs_prevout(self):
         """Test for address logic in  aget_block_by_hash method"""
-        tx = self.clientDoge._check_address_reqSigs_prevout(tx_example_adress)
+        tx = self.clientDoge._check_address_reqSigs_prevout(copy.deepcopy(tx_example_adress))
 
         vouts = tx["vout"]
         self.assertEqual(vouts[0]["scriptPubKey"]["address"], "")
@@ -115,6 +131,66 @@ class DogeClientTest(TestCase):
         )
         self.assertEqual(tx.vin[0].sequence, 4294967295)
 
+    def test_get_transactions(self):
+        """Test for get_transactions method, responses are matched to requests by id"""
+        tx1 = copy.deepcopy(tx_example1_doge_dict)
+        tx2 = copy.deepcopy(tx_example2_doge_dict)
+        response = Mock()
+        response.json.return_value = [
+            {"jsonrpc": "2.0", "id": 1, "result": tx2, "error": None},
+            {"jsonrpc": "2.0", "id": 0, "result": tx1, "error": None},
+        ]
+        with patch.object(self.clientDoge, "_post", return_value=response) as mock_post:
+            transactions = self.clientDoge.get_transactions(self.session, [tx1["txid"], tx2["txid"]])
+
+        batch = mock_post.call_args.args[1]
+        self.assertEqual([request["id"] for request in batch], [0, 1])
+        self.assertEqual([request["params"] for request in batch], [[tx1["txid"], True], [tx2["txid"], True]])
+        self.assertEqual(transactions[tx1["txid"]], tx_example1_doge)
+        self.assertEqual(transactions[tx2["txid"]], tx_example2_doge)
+
+        # Error in any of the responses fails the whole batch
+        response.json.return_value = [
+            {"jsonrpc": "2.0", "id": 0, "result": None, "error": {"code": -5, "message": "No such transaction"}},
+        ]
+        with patch.object(self.clientDoge, "_post", return_value=response):
+            with self.assertRaisesRegex(Exception, "No such transaction"):
+                self.clientDoge.get_transactions(self.session, [tx1["txid"]])
+
+        self.assertEqual(self.clientDoge.get_transactions(self.session, []), {})
+
+    def test_msgspec_decoder(self):
+        """Blocks and transactions decoded with msgspec are the same as the ones structured from json"""
+        client = DogeClient(self.config.NODE_RPC_URL, json_decoder="msgspec")
+        response = Mock()
+        response.content = node_response_body(block_example_doge_dict)
+        with patch.object(client, "_post", return_value=response):
+            raw_block = client.get_raw_block_by_hash(self.session, block_example_doge_dict["hash"])
+        self.assertEqual(client.structure_block(raw_block), block_example_doge)
+
+        response.content = node_response_body(tx_example1_doge_dict)
+        with patch.object(client, "_post", return_value=response):
+            self.assertEqual(client.get_transaction(self.session, tx_example1_doge_dict["txid"]), tx_example1_doge)
+
+        response.content = (
+            b"["
+            + node_response_body(tx_example2_doge_dict, 1)
+            + b","
+            + node_response_body(tx_example1_doge_dict, 0)
+            + b"]"
+        )
+        txids = [tx_example1_doge_dict["txid"], tx_example2_doge_dict["txid"]]
+        with patch.object(client, "_post", return_value=response):
+            transactions = client.get_transactions(self.session, txids)
+        self.assertEqual(transactions, {txids[0]: tx_example1_doge, txids[1]: tx_example2_doge})
+
+        response.content = json.dumps(
+            [{"id": 0, "result": None, "error": {"code": -5, "message": "No such transaction"}}]
+        ).encode()
+        with patch.object(client, "_post", return_value=response):
+            with self.assertRaisesRegex(Exception, "No such transaction"):
+                client.get_transactions(self.session, txids[:1])
+
     def test_get_block_by_hash(self):
         """Test for get_block_by_hash method"""
         hash = "f4128c693d2dfd0fb8d020c69831e45e9a8b68f58b3e7bf60d1deca12d0b1e60"
@@ -137,6 +213,70 @@ class DogeClientTest(TestCase):
         self.assertEqual(isinstance(block.tx[1].vout[0], VoutResponse), True)
         self.assertEqual(isinstance(block.tx[1].vout[0].scriptPubKey, ScriptPubKeyResponse), True)
 
+    def test_get_block_by_hash_raw(self):
+        """Test for get_block_by_hash method with serialized blocks decoded locally"""
+        client = DogeClient(self.config.NODE_RPC_URL, "raw")
+        block_hash = "1a91e3dace36e2be3bf030a65679fe821aa1d6ef92e7c9902eb318182c355691"
+        chain_info = Mock()
+        chain_info.json.return_value = {"result": {"chain": "main"}}
+        block = Mock()
+        block.json.return_value = [
+            {"jsonrpc": "2.0", "id": 1, "result": {"hash": block_hash, "height": 0, "mediantime": 1386325540}},
+            {"jsonrpc": "2.0", "id": 0, "result": GENESIS_BLOCK_HEX, "error": None},
+        ]
+        with patch.object(client, "_post", side_effect=[chain_info, block, block]) as mock_post:
+            res_block = client.get_block_by_hash(self.session, block_hash)
+            # Chain is detected only once
+            client.get_block_by_hash(self.session, block_hash)
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(mock_post.call_args_list[0].args[1]["method"], "getblockchaininfo")
+        batch = mock_post.call_args_list[1].args[1]
+        self.assertEqual([request["method"] for request in batch], ["getblock", "getblockheader"])
+        self.assertEqual(client.address_versions, DOGE_ADDRESS_VERSIONS["main"])
+        self.assertEqual(res_block.hash, block_hash)
+        self.assertEqual(res_block.height, 0)
+        self.assertEqual(res_block.mediantime, 1386325540)
+        self.assertEqual(res_block.tx[0].txid, "5b2a3f53f605d62c53e62932dac6925e3d74afa5a4b459745c36d42d0ed26a69")
+
+        # Decoded block has to match the requested block
+        block.json.return_value[0]["result"]["hash"] = "00" * 32
+        with patch.object(client, "_post", return_value=block):
+            with self.assertRaises(RawBlockError):
+                client.get_block_by_hash(self.session, "00" * 32)
+
+    def test_get_block_by_hash_raw_errors(self):
+        """Batch responses without JSON-RPC results are raised as http or node errors"""
+        client = DogeClient(self.config.NODE_RPC_URL, "raw")
+        client.address_versions = DOGE_ADDRESS_VERSIONS["main"]
+        block_hash = "1a91e3dace36e2be3bf030a65679fe821aa1d6ef92e7c9902eb318182c355691"
+
+        overloaded = requests.Response()
+        overloaded.status_code = 503
+        overloaded._content = b"Work queue depth exceeded"
+        with patch.object(client, "_post", return_value=overloaded):
+            with self.assertRaises(requests.HTTPError) as http_error:
+                client.get_raw_block_by_hash(self.session, block_hash)
+        self.assertEqual(http_error.exception.response.status_code, 503)
+
+        unauthorized = requests.Response()
+        unauthorized.status_code = 401
+        unauthorized._content = b""
+        with patch.object(client, "_post", return_value=unauthorized):
+            with self.assertRaises(requests.HTTPError):
+                client.get_raw_block_by_hash(self.session, block_hash)
+
+        # Error of the whole batch is sent as a single response
+        batch_error = requests.Response()
+        batch_error.status_code = 500
+        batch_error._content = json.dumps(
+            {"result": None, "error": {"code": -32700, "message": "Parse error"}, "id": None}
+        ).encode()
+        with patch.object(client, "_post", return_value=batch_error):
+            with self.assertRaises(RpcError) as rpc_error:
+                client.get_raw_block_by_hash(self.session, block_hash)
+        self.assertEqual(rpc_error.exception.code, -32700)
+
     def test_get_block_hash_from_height(self):
         """Test for get_block_hash_from_height method"""
         hash = self.clientDoge.get_block_hash_from_height(self.session, 5424181)
@@ -154,3 +294,66 @@ class DogeClientTest(TestCase):
         if current_block_count is not None:
             height = self.clientDoge.get_block_height(self.session)
             self.assertEqual(height, current_block_count)
+
+
+class AimdConcurrencyControllerTest(SimpleTestCase):
+    def test_increase_while_latency_is_stable(self):
+        """Limit is increased by one after every round of requests with stable latency"""
+        controller = AimdConcurrencyController(2, 4)
+        for _ in range(2):
+            controller.on_success(0.1)
+        self.assertEqual(controller.limit, 3)
+        for _ in range(3):
+            controller.on_success(0.1)
+        self.assertEqual(controller.limit, 4)
+        for _ in range(10):
+            controller.on_success(0.1)
+        self.assertEqual(controller.limit, 4)
+        self.assertEqual(controller.increases, 2)
+
+    def test_slow_request_restarts_round(self):
+        """Limit is not increased while requests are slower than the average latency"""
+        controller = AimdConcurrencyController(2, 10)
+        controller.on_success(0.1)
+        controller.on_success(1.0)
+        controller.on_success(0.1)
+        self.assertEqual(controller.limit, 2)
+        controller.on_success(0.1)
+        self.assertEqual(controller.limit, 3)
+
+    def test_backoff_on_overload(self):
+        """Timeouts and 5xx responses halve the limit once for requests in flight at the same time"""
+        controller = AimdConcurrencyController(8, 10)
+        response = requests.Response()
+        response.status_code = 503
+
+        with self.assertRaises(requests.HTTPError):
+            with controller.track():
+                raise requests.HTTPError(response=response)
+        self.assertEqual(controller.limit, 4)
+
+        # Request that was sent before the backoff does not back off again
+        controller.on_overload(0.0)
+        self.assertEqual(controller.limit, 4)
+
+        with self.assertRaises(requests.Timeout):
+            with controller.track():
+                raise requests.Timeout()
+        self.assertEqual(controller.limit, 2)
+
+        # Other errors are not caused by overload
+        response.status_code = 404
+        with self.assertRaises(requests.HTTPError):
+            with controller.track():
+                raise requests.HTTPError(response=response)
+        with self.assertRaises(ValueError):
+            with controller.track():
+                raise ValueError()
+        self.assertEqual(controller.limit, 2)
+        self.assertEqual(controller.backoffs, 2)
+
+        for _ in range(5):
+            with self.assertRaises(requests.Timeout):
+                with controller.track():
+                    raise requests.Timeout()
+        self.assertEqual(controller.limit, 1)
@@ -1,13 +1,19 @@
+import json
 import logging
+import time
 
+import httpx
+import requests
 from django.test import TestCase
 from requests.models import HTTPBasicAuth
 from requests.sessions import Session
 
+from client.errors import RpcError
 from configuration.config import get_testing_config
-from utxo_indexer.indexer.decorators import retry
+from utxo_indexer.indexer.decorators import CircuitBreaker, CircuitOpenError, RetryError, RetryPolicy, retry
 from utxo_indexer.indexer.doge import DogeClient
 from utxo_indexer.indexer.indexer_client import IndexerClient, new_session
+from utxo_indexer.indexer.pipeline import Pipeline
 from utxo_indexer.indexer.types import PostProcessingMemoryElement
 from utxo_indexer.models import (
     TransactionInput,
@@ -55,6 +61,91 @@ class DecoratorRetryTest(TestCase):
         else:
             raise AssertionError("retry should return exception, because" "error_until returns Exception 5 times")
 
+    def test_retry_policy(self):
+        """Only errors that can succeed on another attempt are retried"""
+        policy = RetryPolicy(base_delay=0)
+        calls = []
+
+        def failing(error):
+            def inner():
+                calls.append(error)
+                raise error
+
+            return inner
+
+        # Unknown transaction is returned again for the same request
+        with self.assertRaises(RpcError):
+            retry(5, policy=policy)(failing(RpcError(-5, "No such mempool or blockchain transaction")))()
+        self.assertEqual(len(calls), 1)
+
+        with self.assertRaises(json.JSONDecodeError):
+            retry(5, policy=policy)(failing(json.JSONDecodeError("Expecting value", "", 0)))()
+        self.assertEqual(len(calls), 2)
+
+        with self.assertRaises(RetryError) as context:
+            retry(5, policy=policy)(failing(RpcError(-28, "Loading block index...")))()
+        self.assertEqual(len(calls), 7)
+        self.assertEqual(len(context.exception.errors), 5)
+
+        with self.assertRaises(RetryError):
+            retry(3, policy=policy)(failing(requests.ConnectionError()))()
+        self.assertEqual(len(calls), 10)
+
+        # Overloaded node is retried, wrong credentials fail fast
+        overloaded = requests.Response()
+        overloaded.status_code = 503
+        with self.assertRaises(RetryError):
+            retry(2, policy=policy)(failing(requests.HTTPError(response=overloaded)))()
+        self.assertEqual(len(calls), 12)
+        unauthorized = requests.Response()
+        unauthorized.status_code = 401
+        with self.assertRaises(requests.HTTPError):
+            retry(5, policy=policy)(failing(requests.HTTPError(response=unauthorized)))()
+        self.assertEqual(len(calls), 13)
+
+        # Delays grow exponentially up to max delay
+        policy = RetryPolicy(base_delay=1, max_delay=4)
+        self.assertLessEqual(policy.delay(0), 1)
+        self.assertLessEqual(max(policy.delay(10) for _ in range(100)), 4)
+
+    def test_circuit_breaker(self):
+        """Circuit is opened after consecutive transport errors and closed by a successful trial request"""
+        circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        policy = RetryPolicy(base_delay=0)
+        calls = []
+
+        def unreachable():
+            calls.append(None)
+            raise requests.ConnectionError()
+
+        with self.assertRaises(RetryError) as context:
+            retry(3, policy=policy, circuit_breaker=circuit_breaker)(unreachable)()
+        # Requests are not sent while the circuit is open
+        self.assertTrue(circuit_breaker.is_open)
+        self.assertEqual(len(calls), 2)
+        self.assertIsInstance(context.exception.errors[-1], CircuitOpenError)
+
+        # Node answers with an error once it is reachable again
+        time.sleep(0.05)
+        self.assertTrue(circuit_breaker.allow_request())
+        self.assertFalse(circuit_breaker.allow_request())
+        circuit_breaker.record_success()
+        self.assertFalse(circuit_breaker.is_open)
+        self.assertEqual(retry(4, policy=policy, circuit_breaker=circuit_breaker)(lambda: "All good!")(), "All good!")
+
+        # Responses to requests with wrong credentials are not counted as transport errors
+        response = httpx.Response(403, request=httpx.Request("POST", "http://node"))
+
+        def forbidden():
+            calls.append(None)
+            raise httpx.HTTPStatusError("Forbidden", request=response.request, response=response)
+
+        for _ in range(3):
+            with self.assertRaises(httpx.HTTPStatusError):
+                retry(3, policy=policy, circuit_breaker=circuit_breaker)(forbidden)()
+        self.assertFalse(circuit_breaker.is_open)
+        self.assertEqual(circuit_breaker.failures, 0)
+
 
 class IndexerClientAuxiliaryFunctionTest(TestCase):
     """Tests for auxuliary functions in indexer_client.py"""
@@ -157,3 +248,32 @@ class IndexerClientTest(TestCase):
         root = merkle_tree_from_address_strings(["11tb1qq5yf3rn3dwsnjyt4h3npuqg4hedgsd56sc0jqz"]).root
         assert root is not None
         self.assertEqual(tx.source_addresses_root, root[2:])
+
+
+class PipelineTest(TestCase):
+    """Tests for pipeline.py file"""
+
+    def test_run_keeps_order(self):
+        """Items should reach the sink in input order, regardless of stage timing"""
+
+        def slow_on_even(item):
+            if item % 2 == 0:
+                time.sleep(0.01)
+            return item
+
+        results = []
+        Pipeline([slow_on_even, lambda item: item * 10], depth=2).run(range(20), results.append)
+        self.assertEqual(results, [i * 10 for i in range(20)])
+
+    def test_run_reraises_stage_error(self):
+        """Error in any stage should stop the pipeline and be raised to the caller"""
+
+        def fail_on_five(item):
+            if item == 5:
+                raise ValueError("stage failed")
+            return item
+
+        results = []
+        with self.assertRaises(ValueError):
+            Pipeline([fail_on_five], depth=1).run(range(100), results.append)
+        self.assertEqual(results, [0, 1, 2, 3, 4])
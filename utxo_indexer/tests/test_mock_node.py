@@ -0,0 +1,120 @@
+import logging
+import tempfile
+from pathlib import Path
+
+import cattrs
+import requests
+from django.test import SimpleTestCase
+from requests.sessions import Session
+
+from client.btc_client import BtcClient
+from client.doge_client import DogeClient
+from client.errors import RpcError
+from utxo_indexer.mock_node import MockNode, MockNodeData, MockNodeServer
+from utxo_indexer.models.types import BlockResponse
+from utxo_indexer.tests.data_for_testing.testing_process_block_bitcoin_data import block_example_bitcoin_dict
+from utxo_indexer.tests.data_for_testing.testing_process_block_doge_data import (
+    block_example_doge_dict,
+    tx_example1_doge_dict,
+)
+from utxo_indexer.tests.test_btc_client import node_response_body
+
+# DISABLE LOGGING
+logging.disable(logging.CRITICAL)
+
+
+def write_fixtures(directory: Path, blocks: list[dict], transactions: tuple[dict, ...]) -> None:
+    """Saves blocks and transactions the way responses of a real node are recorded"""
+    (directory / "blocks").mkdir()
+    (directory / "transactions").mkdir()
+    for block in blocks:
+        (directory / "blocks" / f"{block['height']}.json").write_bytes(node_response_body(block))
+    for tx in transactions:
+        (directory / "transactions" / f"{tx['txid']}.json").write_bytes(node_response_body(tx))
+
+
+class MockNodeTest(SimpleTestCase):
+    def setUp(self):
+        self.session = Session()
+        self.addCleanup(self.session.close)
+
+    def start(self, blocks: list[dict], transactions: tuple[dict, ...] = (), **kwargs) -> tuple[MockNode, str]:
+        """Starts a node serving the given blocks and transactions, recorded to a temporary directory"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        write_fixtures(Path(directory.name), blocks, transactions)
+        self.data = MockNodeData.from_directory(directory.name)
+        node = MockNode(self.data, **kwargs)
+        server = MockNodeServer(node)
+        url = server.start()
+        self.addCleanup(server.stop)
+        return node, url
+
+    def call(self, url: str, method: str, params: list) -> requests.Response:
+        return self.session.post(url, json={"jsonrpc": "1.0", "id": "rpc", "method": method, "params": params})
+
+    def test_btc_client(self):
+        _, url = self.start([block_example_bitcoin_dict])
+        client = BtcClient(url)
+        height = block_example_bitcoin_dict["height"]
+        block_hash = block_example_bitcoin_dict["hash"]
+
+        self.assertEqual(client.get_block_height(self.session), self.data.tip_height)
+        self.assertEqual(client.get_block_hash_from_height(self.session, height), block_hash)
+        block = client.get_block_by_hash(self.session, block_hash)
+        self.assertEqual(block, cattrs.structure(block_example_bitcoin_dict, BlockResponse))
+
+    def test_doge_client(self):
+        _, url = self.start([block_example_doge_dict], (tx_example1_doge_dict,))
+        client = DogeClient(url)
+        block_hash = block_example_doge_dict["hash"]
+
+        block = client.get_block_by_hash(self.session, block_hash)
+        self.assertEqual(block.hash, block_hash)
+        self.assertEqual(len(block.tx), len(block_example_doge_dict["tx"]))
+
+        # Transactions of recorded blocks and recorded prevout transactions are both served
+        txids = [tx_example1_doge_dict["txid"], block_example_doge_dict["tx"][0]["txid"]]
+        transactions = client.get_transactions(self.session, txids)
+        self.assertEqual(set(transactions), set(txids))
+        self.assertEqual(
+            [vout.value for vout in transactions[txids[0]].vout],
+            [vout["value"] for vout in tx_example1_doge_dict["vout"]],
+        )
+
+        with self.assertRaises(RpcError) as e:
+            client.get_transaction(self.session, "00" * 32)
+        self.assertEqual(e.exception.code, -5)
+
+    def test_getblock_verbosity(self):
+        _, url = self.start([block_example_bitcoin_dict])
+        block_hash = block_example_bitcoin_dict["hash"]
+
+        txids = self.call(url, "getblock", [block_hash, 1]).json()["result"]["tx"]
+        self.assertEqual(txids, [tx["txid"] for tx in block_example_bitcoin_dict["tx"]])
+        # Prevouts are only in verbosity 3
+        verbose = self.call(url, "getblock", [block_hash, 2]).json()["result"]
+        self.assertTrue(all("prevout" not in vin for tx in verbose["tx"] for vin in tx["vin"]))
+        # Nothing was recorded in serialized form
+        self.assertEqual(self.call(url, "getblock", [block_hash, 0]).status_code, 500)
+        self.assertEqual(self.call(url, "getblockhash", [1]).json()["error"]["code"], -8)
+        self.assertEqual(self.call(url, "getblock", ["00" * 32, 3]).json()["error"]["code"], -5)
+        self.assertEqual(self.call(url, "sendtoaddress", []).status_code, 404)
+
+    def test_info(self):
+        _, url = self.start([block_example_bitcoin_dict])
+        self.assertEqual(self.call(url, "getnetworkinfo", []).json()["result"]["version"], 270000)
+        self.assertEqual(self.call(url, "getinfo", []).json()["result"]["blocks"], self.data.tip_height)
+        self.assertEqual(self.call(url, "getblockchaininfo", []).json()["result"]["chain"], "main")
+
+    def test_injected_errors(self):
+        node, url = self.start([block_example_bitcoin_dict], error_rate=1.0, seed=1)
+        with self.assertRaises(requests.HTTPError) as e:
+            BtcClient(url).get_block_height(self.session)
+        self.assertEqual(e.exception.response.status_code, 503)
+        self.assertEqual(node.stats(), {"requests": 1, "calls": 0, "injected_errors": 1})
+
+    def test_injected_latency(self):
+        _, url = self.start([block_example_bitcoin_dict], latency=0.05)
+        response = self.call(url, "getblockcount", [])
+        self.assertGreaterEqual(response.elapsed.total_seconds(), 0.05)
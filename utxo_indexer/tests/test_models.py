@@ -1,22 +1,43 @@
 import logging
 
-from django.db.utils import DataError
-from django.test import TestCase
+import cattrs
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase
 
 from utxo_indexer.models.block import UtxoBlock
+from utxo_indexer.models.converter import structure_block, structure_transaction
+from utxo_indexer.models.partitions import (
+    PARTITIONED_MODELS,
+    create_block_partitions,
+    default_partition_name,
+    delete_blocks_below,
+    drop_block_partitions_below,
+    range_partitions,
+)
 from utxo_indexer.models.sync_state import PruneSyncState, TipSyncState, TipSyncStateChoices
 from utxo_indexer.models.transaction import UtxoTransaction
 from utxo_indexer.models.transaction_outputs import TransactionInput, TransactionInputCoinbase, TransactionOutput
+from utxo_indexer.models.types import (
+    BlockResponse,
+    CoinbaseVinResponse,
+    PrevoutResponse,
+    ScriptSigResponse,
+    VinResponse,
+)
 from utxo_indexer.tests.data_for_testing.testing_models_data import (
     block_example,
+    block_example_dict,
     tx_example1,
+    tx_example1_dict,
     tx_example2,
     tx_example_coinbase,
+    tx_example_coinbase_dict,
     vin_example,
     vin_example_coinbase,
     vout_example,
     vout_example2,
 )
+from utxo_indexer.tests.data_for_testing.testing_process_block_bitcoin_data import block_example_bitcoin_dict
 
 logging.disable(logging.CRITICAL)
 
@@ -49,9 +70,31 @@ class BlockTest(TestCase):
             confirmed=True,
         )
         block_normal_hash.save()
+
+        # Stored as 32 bytes, returned as hex string
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT octet_length(block_hash) FROM {UtxoBlock._meta.db_table} WHERE block_number = 1")
+            self.assertEqual(cursor.fetchone(), (32,))
+        self.assertEqual(
+            UtxoBlock.objects.get(block_hash="0x" + block_normal_hash.block_hash.upper()).block_hash,
+            block_normal_hash.block_hash,
+        )
+
+        block_33_bytes_hash = UtxoBlock(
+            block_hash="ab" * 33,
+            block_number=1,
+            timestamp=0,
+            previous_block_hash="",
+            transactions=0,
+            confirmed=True,
+        )
+        with self.assertRaisesRegex(ValueError, "at most 32 bytes"):
+            with transaction.atomic():
+                block_33_bytes_hash.save()
+
         try:
             block_long_hash.save()
-        except DataError:
+        except ValueError:
             pass
         else:
             raise ValueError("block_hash of block_long_hash is too long")
@@ -155,6 +198,21 @@ class TransactionOutputTest(TestCase):
         self.assertEqual(tx_out1.script_key_address, "11tb1qq5yf3rn3dwsnjyt4h3npuqg4hedgsd56sc0jqz")
         self.assertEqual(tx_out1.transaction_link, self.transaction)
 
+    def test_vout_responses_for_outpoints(self):
+        TransactionOutput.object_from_node_response(vout_example, self.transaction).save()
+        txid = self.transaction.transaction_id
+        missing_txid = "1" * 64
+
+        resolved = TransactionOutput.vout_responses_for_outpoints(
+            [(txid, 0), (txid, 1), (missing_txid, 0)], batch_size=2
+        )
+        self.assertEqual(list(resolved.keys()), [(txid, 0)])
+        vout = resolved[(txid, 0)]
+        self.assertEqual(vout.n, 0)
+        self.assertEqual(vout.value, "1.13428769")
+        self.assertEqual(vout.scriptPubKey.address, "11tb1qq5yf3rn3dwsnjyt4h3npuqg4hedgsd56sc0jqz")
+        self.assertEqual(TransactionOutput.vout_responses_for_outpoints([]), {})
+
 
 class TransactionInputCoinbaseTest(TestCase):
     def setUp(self):
@@ -237,3 +295,107 @@ class PruneSyncStateTest(TestCase):
 
         instance2 = PruneSyncState.instance()
         self.assertEqual(instance1, instance2)
+
+
+class PartitionsTest(TestCase):
+    def save_transaction(self, txid: str, block_number: int) -> UtxoTransaction:
+        transaction = UtxoTransaction(
+            transaction_id=txid,
+            block_number=block_number,
+            timestamp=1,
+            payment_reference=None,
+            is_native_payment=True,
+            transaction_type="",
+        )
+        transaction.save()
+        TransactionOutput.object_from_node_response(vout_example, transaction).save()
+        return transaction
+
+    def partition_of(self, model, block_number: int) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {model._meta.db_table} WHERE block_number = %s", [block_number]
+            )
+            return cursor.fetchone()[0]
+
+    def test_create_block_partitions(self):
+        # Rows without a range partition are stored in default partition
+        self.save_transaction("1" * 64, 15)
+        table = UtxoTransaction._meta.db_table
+        self.assertEqual(self.partition_of(UtxoTransaction, 15), default_partition_name(table))
+
+        created = create_block_partitions(12, 25, 10)
+        self.assertEqual(len(created), 2 * len(PARTITIONED_MODELS))
+        self.assertEqual(range_partitions(table), [(f"{table}_p10", 10, 20), (f"{table}_p20", 20, 30)])
+
+        # Existing rows are moved into the new partition
+        self.assertEqual(self.partition_of(UtxoTransaction, 15), f"{table}_p10")
+        output_table = TransactionOutput._meta.db_table
+        self.assertEqual(self.partition_of(TransactionOutput, 15), f"{output_table}_p10")
+
+        # Covered ranges are skipped, gaps are filled
+        self.assertEqual(create_block_partitions(10, 30, 10), [])
+        create_block_partitions(0, 40, 20)
+        self.assertEqual([first for _, first, _ in range_partitions(table)], [0, 10, 20, 30])
+
+    def test_drop_block_partitions_below(self):
+        create_block_partitions(0, 30, 10)
+        self.save_transaction("1" * 64, 5)
+        self.save_transaction("2" * 64, 15)
+        self.save_transaction("3" * 64, 25)
+
+        dropped = drop_block_partitions_below(20)
+        self.assertEqual(len(dropped), 2 * len(PARTITIONED_MODELS))
+        self.assertEqual(list(UtxoTransaction.objects.values_list("block_number", flat=True)), [25])
+        self.assertEqual(list(TransactionOutput.objects.values_list("block_number", flat=True)), [25])
+
+        # Partition containing the block is kept
+        self.assertEqual(drop_block_partitions_below(29), [])
+
+    def test_delete_blocks_below(self):
+        create_block_partitions(10, 20, 10)
+        self.save_transaction("1" * 64, 5)
+        self.save_transaction("2" * 64, 12)
+        self.save_transaction("3" * 64, 15)
+        self.save_transaction("4" * 64, 25)
+
+        # Transactions and their outputs from the default partition and from the partial range partition
+        self.assertEqual(delete_blocks_below(15), 4)
+        self.assertEqual(
+            list(UtxoTransaction.objects.order_by("block_number").values_list("block_number", flat=True)), [15, 25]
+        )
+        # Partition containing the block is kept
+        self.assertEqual(len(range_partitions(UtxoTransaction._meta.db_table)), 1)
+
+
+class ConverterTest(SimpleTestCase):
+    def test_structure_block(self):
+        """Precompiled converter structures blocks the same way as the generic cattrs.structure"""
+        for block in [block_example_dict, block_example_bitcoin_dict]:
+            self.assertEqual(structure_block(block), cattrs.structure(block, BlockResponse))
+
+        res_block = structure_block(block_example_bitcoin_dict)
+        self.assertIsInstance(res_block.tx[0].vin[0], CoinbaseVinResponse)
+        vin = res_block.tx[1].vin[0]
+        assert isinstance(vin, VinResponse)
+        self.assertIsInstance(vin.prevout, PrevoutResponse)
+
+    def test_structure_transaction(self):
+        """Inputs are discriminated on the presence of the coinbase key"""
+        self.assertEqual(structure_transaction(tx_example_coinbase_dict), tx_example_coinbase)
+        self.assertEqual(structure_transaction(tx_example1_dict), tx_example1)
+
+        tx = {
+            "txid": "ab" * 32,
+            "vin": [
+                {"coinbase": "00", "sequence": 1},
+                {"txid": "cd" * 32, "vout": 2, "sequence": 3, "scriptSig": {"asm": "", "hex": ""}, "prevout": None},
+            ],
+            "vout": [],
+        }
+        res_tx = structure_transaction(tx)
+        self.assertEqual(res_tx.vin[0], CoinbaseVinResponse(coinbase="00", sequence=1))
+        self.assertEqual(
+            res_tx.vin[1],
+            VinResponse(txid="cd" * 32, sequence=3, scriptSig=ScriptSigResponse(asm="", hex=""), vout=2, prevout=None),
+        )
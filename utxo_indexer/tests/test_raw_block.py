@@ -0,0 +1,179 @@
+import struct
+
+from django.test import SimpleTestCase
+
+from client.raw_block import (
+    DOGE_ADDRESS_VERSIONS,
+    RawBlockError,
+    base58check,
+    decode_block,
+    hash160,
+    script_pub_key_response,
+    script_to_asm,
+    sha256d,
+    solve_script,
+)
+from utxo_indexer.models.types import CoinbaseVinResponse, VinResponse
+
+# Dogecoin mainnet genesis block
+GENESIS_BLOCK_HEX = (
+    "010000000000000000000000000000000000000000000000000000000000000000000000696ad20e2dd4365c7459b4a4a5af743d5e92c6"
+    "da3229e6532cd605f6533f2a5b24a6a152f0ff0f1e67860100010100000001000000000000000000000000000000000000000000000000"
+    "0000000000000000ffffffff1004ffff001d0104084e696e746f6e646fffffffff010058850c020000004341040184710fa689ad502369"
+    "0c80f3a49c8f13f8d45b8c857fbcbc8bc4a8e4d3eb4b10f4d4604fa08dce601aaf0f470216fe1b51850b4acf21b179c45070ac7b03a9ac"
+    "00000000"
+)
+GENESIS_PUBKEY = (
+    "040184710fa689ad5023690c80f3a49c8f13f8d45b8c857fbcbc8bc4a8e4d3eb4b10f4d4604fa08dce601aaf0f470216fe1b51850b4acf"
+    "21b179c45070ac7b03a9"
+)
+
+MAINNET = DOGE_ADDRESS_VERSIONS["main"]
+
+PUBKEY_1 = bytes.fromhex("02" + "11" * 32)
+PUBKEY_2 = bytes.fromhex("03" + "22" * 32)
+# Strict DER signature with SIGHASH_ALL
+SIGNATURE = bytes.fromhex("3044" + "0220" + "01" * 32 + "0220" + "02" * 32 + "01")
+
+
+def push(data: bytes) -> bytes:
+    return bytes([len(data)]) + data
+
+
+def serialize_transaction(inputs: list[tuple[bytes, int, bytes]], outputs: list[tuple[int, bytes]]) -> bytes:
+    tx = struct.pack("<i", 1) + bytes([len(inputs)])
+    for txid, vout, script_sig in inputs:
+        tx += txid + struct.pack("<I", vout) + push(script_sig) + b"\xff\xff\xff\xff"
+    tx += bytes([len(outputs)])
+    for value, script in outputs:
+        tx += struct.pack("<q", value) + push(script)
+    return tx + bytes(4)
+
+
+def serialize_header(version: int, previous_block_hash: bytes) -> bytes:
+    return struct.pack("<i", version) + previous_block_hash + bytes(32) + struct.pack("<III", 0, 0, 0)
+
+
+class RawBlockTest(SimpleTestCase):
+    def test_decode_genesis_block(self):
+        """Block and transaction hashes are computed from the serialized data"""
+        block = decode_block(bytes.fromhex(GENESIS_BLOCK_HEX), 0, 1386325540, MAINNET)
+
+        self.assertEqual(block.hash, "1a91e3dace36e2be3bf030a65679fe821aa1d6ef92e7c9902eb318182c355691")
+        self.assertEqual(block.height, 0)
+        self.assertEqual(block.mediantime, 1386325540)
+        self.assertEqual(block.previousblockhash, "0" * 64)
+        self.assertEqual(len(block.tx), 1)
+
+        tx = block.tx[0]
+        self.assertEqual(tx.txid, "5b2a3f53f605d62c53e62932dac6925e3d74afa5a4b459745c36d42d0ed26a69")
+        self.assertEqual(
+            tx.vin, [CoinbaseVinResponse(coinbase="04ffff001d0104084e696e746f6e646f", sequence=4294967295)]
+        )
+        self.assertEqual(len(tx.vout), 1)
+        self.assertEqual(tx.vout[0].n, 0)
+        self.assertEqual(tx.vout[0].value, "88.00000000")
+        script_pub_key = tx.vout[0].scriptPubKey
+        self.assertEqual(script_pub_key.type, "pubkey")
+        self.assertEqual(script_pub_key.reqSigs, 1)
+        self.assertEqual(script_pub_key.asm, f"{GENESIS_PUBKEY} OP_CHECKSIG")
+        self.assertEqual(script_pub_key.hex, f"41{GENESIS_PUBKEY}ac")
+        self.assertEqual(script_pub_key.address, base58check(0x1E, hash160(bytes.fromhex(GENESIS_PUBKEY))))
+        self.assertEqual(script_pub_key.address[0], "D")
+
+    def test_decode_auxpow_block(self):
+        """Auxpow data of merge mined blocks is skipped"""
+        previous_block_hash = bytes(range(32))
+        coinbase = serialize_transaction([(bytes(32), 0xFFFFFFFF, b"\x03\x01\x02\x03")], [(1000, b"\x51")])
+        spend = serialize_transaction(
+            [(bytes([7]) * 32, 3, push(SIGNATURE) + push(PUBKEY_1))],
+            [(150_000_000, b"\x76\xa9" + push(bytes(20)) + b"\x88\xac")],
+        )
+        parent_coinbase = serialize_transaction([(bytes(32), 0xFFFFFFFF, b"\x00")], [(0, b"\x6a")])
+        auxpow = (
+            parent_coinbase
+            + bytes(32)
+            + b"\x02"
+            + bytes(64)  # coinbase merkle branch
+            + bytes(4)
+            + b"\x01"
+            + bytes(32)  # chain merkle branch
+            + bytes(4)
+            + serialize_header(2, bytes(32))  # parent block header
+        )
+        header = serialize_header(0x00620104, previous_block_hash)
+        raw_block = header + auxpow + b"\x02" + coinbase + spend
+
+        block = decode_block(raw_block, 123, 456, MAINNET)
+        self.assertEqual(block.hash, sha256d(header)[::-1].hex())
+        self.assertEqual(block.previousblockhash, previous_block_hash[::-1].hex())
+        self.assertEqual([tx.txid for tx in block.tx], [sha256d(coinbase)[::-1].hex(), sha256d(spend)[::-1].hex()])
+
+        vin = block.tx[1].vin[0]
+        assert isinstance(vin, VinResponse)
+        self.assertEqual(vin.txid, "07" * 32)
+        self.assertEqual(vin.vout, 3)
+        self.assertEqual(vin.prevout, None)
+        self.assertEqual(vin.scriptSig.asm, f"{SIGNATURE[:-1].hex()}[ALL] {PUBKEY_1.hex()}")
+        self.assertEqual(vin.scriptSig.hex, (push(SIGNATURE) + push(PUBKEY_1)).hex())
+        self.assertEqual(block.tx[1].vout[0].value, "1.50000000")
+        self.assertEqual(block.tx[1].vout[0].scriptPubKey.type, "pubkeyhash")
+
+        with self.assertRaises(RawBlockError):
+            decode_block(raw_block[:-1], 123, 456, MAINNET)
+        with self.assertRaises(RawBlockError):
+            decode_block(raw_block + b"\x00", 123, 456, MAINNET)
+
+    def test_script_to_asm(self):
+        """Scripts are rendered the same way as the node renders them"""
+        self.assertEqual(script_to_asm(b""), "")
+        self.assertEqual(script_to_asm(b"\x00\x4f\x51\x60"), "0 -1 1 16")
+        self.assertEqual(
+            script_to_asm(push(b"\x81") + push(b"\xff\x00") + push(b"\x01\x02\x03\x84")), "-1 255 -67305985"
+        )
+        self.assertEqual(script_to_asm(b"\x4c\x05" + bytes(5)), "0000000000")
+        self.assertEqual(script_to_asm(b"\x6a" + push(b"hello")), "OP_RETURN 68656c6c6f")
+        self.assertEqual(script_to_asm(b"\xb1\xba\xff"), "OP_CHECKLOCKTIMEVERIFY OP_UNKNOWN OP_INVALIDOPCODE")
+        self.assertEqual(script_to_asm(b"\x76\x05\x01"), "OP_DUP [error]")
+
+        # Sighash type is decoded only for script sigs and valid signatures
+        self.assertEqual(script_to_asm(push(SIGNATURE)), SIGNATURE.hex())
+        self.assertEqual(script_to_asm(push(SIGNATURE), decode_sighash=True), SIGNATURE[:-1].hex() + "[ALL]")
+        anyone_can_pay = SIGNATURE[:-1] + b"\x83"
+        self.assertEqual(
+            script_to_asm(push(anyone_can_pay), decode_sighash=True), SIGNATURE[:-1].hex() + "[SINGLE|ANYONECANPAY]"
+        )
+        undefined_sighash = SIGNATURE[:-1] + b"\x04"
+        self.assertEqual(script_to_asm(push(undefined_sighash), decode_sighash=True), undefined_sighash.hex())
+
+    def test_script_pub_key_response(self):
+        """Output types and addresses of standard scripts"""
+        key_hash = bytes(range(20))
+        p2pkh = script_pub_key_response(b"\x76\xa9" + push(key_hash) + b"\x88\xac", MAINNET)
+        self.assertEqual((p2pkh.type, p2pkh.reqSigs, p2pkh.address), ("pubkeyhash", 1, base58check(0x1E, key_hash)))
+        self.assertEqual(p2pkh.asm, f"OP_DUP OP_HASH160 {key_hash.hex()} OP_EQUALVERIFY OP_CHECKSIG")
+
+        p2sh = script_pub_key_response(b"\xa9" + push(key_hash) + b"\x87", MAINNET)
+        self.assertEqual((p2sh.type, p2sh.reqSigs, p2sh.address), ("scripthash", 1, base58check(0x16, key_hash)))
+        testnet_p2sh = script_pub_key_response(b"\xa9" + push(key_hash) + b"\x87", DOGE_ADDRESS_VERSIONS["test"])
+        self.assertEqual(testnet_p2sh.address, base58check(0xC4, key_hash))
+
+        multisig = script_pub_key_response(b"\x51" + push(PUBKEY_1) + push(PUBKEY_2) + b"\x52\xae", MAINNET)
+        self.assertEqual(
+            (multisig.type, multisig.reqSigs, multisig.address), ("multisig", 1, base58check(0x1E, hash160(PUBKEY_1)))
+        )
+        self.assertEqual(solve_script(b"\x53" + push(PUBKEY_1) + push(PUBKEY_2) + b"\x52\xae")[0], "nonstandard")
+
+        nulldata = script_pub_key_response(b"\x6a" + push(b"data"), MAINNET)
+        self.assertEqual((nulldata.type, nulldata.reqSigs, nulldata.address), ("nulldata", None, ""))
+        self.assertEqual(solve_script(b"\x6a\xac")[0], "nonstandard")
+
+        # Invalid public key has no address
+        invalid_pubkey = script_pub_key_response(push(b"\x05" + bytes(32)) + b"\xac", MAINNET)
+        self.assertEqual((invalid_pubkey.type, invalid_pubkey.reqSigs, invalid_pubkey.address), ("pubkey", None, ""))
+
+        witness = script_pub_key_response(b"\x00" + push(key_hash), MAINNET)
+        self.assertEqual((witness.type, witness.reqSigs, witness.address), ("witness_v0_keyhash", None, ""))
+
+        nonstandard = script_pub_key_response(b"\x51", MAINNET)
+        self.assertEqual((nonstandard.type, nonstandard.address, nonstandard.asm), ("nonstandard", "", "1"))
@@ -1,5 +1,6 @@
 from django.test import TestCase
 
+from utxo_indexer.hashing import COINBASE_SOURCE_ADDRESS_ROOT, AddressHasher, merkle_root
 from utxo_indexer.utils import ZERO_BYTES_32, is_valid_bytes_32_hex, merkle_tree_from_address_strings, un_prefix_0x
 
 
@@ -111,6 +112,28 @@ class UtilsTest(TestCase):
             "0x48f4493ad2d00a2b8d46e4a6621227a50b97963c4c57fa06128348bfa386f608",
             "0x34ebcebade7a8a928d55b49fffb29d60ed442e1d35080a653d1325d249c7fc30",
         ]
+        hasher = AddressHasher(5)
         for i in range(len(data)):
             root = merkle_tree_from_address_strings(data[: i + 1]).root
             self.assertEqual(root, expected[i])
+            self.assertEqual(hasher.source_addresses_root(data[: i + 1]), expected[i][2:])
+
+    def test_address_hasher(self):
+        """Test for AddressHasher cache and roots with repeated and missing addresses"""
+        addresses = ["DH5yaieqoZN36fDVciNyRueRGvGLR3mr7L", None, "DH5yaieqoZN36fDVciNyRueRGvGLR3mr7L", "nXMSrjEQXUJ"]
+        hasher = AddressHasher(2)
+        root = hasher.source_addresses_root(addresses)
+        self.assertEqual(root, merkle_tree_from_address_strings(addresses).root[2:])
+        self.assertEqual(hasher.stats(), {"entries": 2, "hits": 1, "misses": 2, "evictions": 0})
+
+        roots = hasher.source_addresses_roots([addresses, ["x"], []])
+        self.assertEqual(roots, [root, merkle_tree_from_address_strings(["x"]).root[2:], ZERO_BYTES_32])
+        self.assertEqual(hasher.stats(), {"entries": 2, "hits": 4, "misses": 3, "evictions": 1})
+
+        # Disabled cache hashes every address
+        disabled = AddressHasher(0)
+        self.assertEqual(disabled.source_addresses_root(addresses), root)
+        self.assertEqual(len(disabled), 0)
+
+        self.assertEqual(merkle_root([]), None)
+        self.assertEqual(COINBASE_SOURCE_ADDRESS_ROOT, merkle_tree_from_address_strings([None]).root[2:])